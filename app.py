@@ -13,7 +13,7 @@ load_dotenv()
 
 from config import SECRET_KEY, SIZES, COLORS, BRAND_NAME
 from models import init_db, Product
-from jobs import submit_job, get_job, get_all_jobs, job_to_dict, start_workers
+from jobs import submit_job, get_job, get_all_jobs, job_to_dict, start_workers, cancel_job, resume_job
 from auth import login_manager, User, init_users_table, init_admin_user, admin_required
 
 app = Flask(__name__)
@@ -646,6 +646,7 @@ HTML_TEMPLATE = '''
     
     <script>
         let products = [];
+        let qaPreviews = {};  // m_number -> preview data URL from the QA batch
         let chatHistory = [];
         
         // Chat memory storage - persists per category
@@ -980,9 +981,27 @@ HTML_TEMPLATE = '''
             const resp = await fetch('/api/products');
             products = await resp.json();
             debugLog(`Loaded ${products.length} products`, 'success');
+            // Render all thumbnails in one batch (spread across the render slots) and
+            // draw the grid from its results, so no thumbnail is rendered twice
+            qaPreviews = {};
+            try {
+                const batchResp = await fetch('/api/preview/batch', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({m_numbers: products.map(p => p.m_number)})
+                });
+                qaPreviews = (await batchResp.json()).previews || {};
+            } catch (e) {
+                debugLog(`Preview batch failed: ${e}`, 'error');
+            }
             renderQAGrid();
         }
         
+        function qaPreviewSrc(mNumber) {
+            // Products missing from the batch are rendered one by one
+            return qaPreviews[mNumber] || `/api/preview/${mNumber}?t=${Date.now()}`;
+        }
+        
         function renderQAGrid() {
             const grid = document.getElementById('qa-grid');
             // Group products by size and description to show variants together
@@ -1008,7 +1027,7 @@ HTML_TEMPLATE = '''
                     
                     <!-- Large Silver Preview -->
                     <div style="padding: 15px; background: #e8e8e8; text-align: center;">
-                        <img id="main-preview-${p.m_number}" src="/api/preview/${p.m_number}?t=${Date.now()}" alt="${p.m_number}" style="max-width: 100%; max-height: 250px; border-radius: 6px; box-shadow: 0 2px 8px rgba(0,0,0,0.15);">
+                        <img id="main-preview-${p.m_number}" data-preview="${p.m_number}" src="${qaPreviewSrc(p.m_number)}" alt="${p.m_number}" style="max-width: 100%; max-height: 250px; border-radius: 6px; box-shadow: 0 2px 8px rgba(0,0,0,0.15);">
                         <div style="margin-top: 8px; font-size: 11px;">
                             <strong>${p.m_number}</strong> - Silver
                             <button onclick="setQAStatus('${p.m_number}', 'rejected')" style="font-size: 9px; padding: 2px 6px; margin-left: 6px; cursor: pointer; background: #dc3545; color: white; border: none; border-radius: 3px;">✗ Reject</button>
@@ -1058,7 +1077,7 @@ HTML_TEMPLATE = '''
                     <div style="display: flex; gap: 10px; padding: 10px; background: #f8f8f8; justify-content: center; flex-wrap: wrap;">
                         ${goldVariant ? `
                         <div style="text-align: center;">
-                            <img src="/api/preview/${goldVariant.m_number}?t=${Date.now()}" alt="${goldVariant.m_number}" style="width: 80px; height: 80px; object-fit: contain; border-radius: 4px; border: 1px solid #ddd; background: white;">
+                            <img data-preview="${goldVariant.m_number}" src="${qaPreviewSrc(goldVariant.m_number)}" alt="${goldVariant.m_number}" style="width: 80px; height: 80px; object-fit: contain; border-radius: 4px; border: 1px solid #ddd; background: white;">
                             <div style="font-size: 8px; margin-top: 3px;">
                                 <strong>${goldVariant.m_number}</strong> Gold
                                 <button onclick="setQAStatus('${goldVariant.m_number}', 'rejected')" style="font-size: 7px; padding: 1px 3px; margin-left: 2px; cursor: pointer; background: #dc3545; color: white; border: none; border-radius: 2px;">✗</button>
@@ -1067,7 +1086,7 @@ HTML_TEMPLATE = '''
                         ` : ''}
                         ${whiteVariant ? `
                         <div style="text-align: center;">
-                            <img src="/api/preview/${whiteVariant.m_number}?t=${Date.now()}" alt="${whiteVariant.m_number}" style="width: 80px; height: 80px; object-fit: contain; border-radius: 4px; border: 1px solid #ddd; background: white;">
+                            <img data-preview="${whiteVariant.m_number}" src="${qaPreviewSrc(whiteVariant.m_number)}" alt="${whiteVariant.m_number}" style="width: 80px; height: 80px; object-fit: contain; border-radius: 4px; border: 1px solid #ddd; background: white;">
                             <div style="font-size: 8px; margin-top: 3px;">
                                 <strong>${whiteVariant.m_number}</strong> White
                                 <button onclick="setQAStatus('${whiteVariant.m_number}', 'rejected')" style="font-size: 7px; padding: 1px 3px; margin-left: 2px; cursor: pointer; background: #dc3545; color: white; border: none; border-radius: 2px;">✗</button>
@@ -1945,8 +1964,9 @@ HTML_TEMPLATE = '''
         }
         
         function refreshProductImage(mNumber) {
-            const img = document.querySelector(`img[src*="/api/preview/${mNumber}"]`);
+            const img = document.querySelector(`img[data-preview="${mNumber}"], img[src*="/api/preview/${mNumber}"]`);
             if (img) {
+                delete qaPreviews[mNumber];
                 img.src = `/api/preview/${mNumber}?t=${Date.now()}`;
             }
         }
@@ -3492,6 +3512,8 @@ def delete_icon(filename):
     
     try:
         icon_path.unlink()
+        from icon_derivatives import remove_derivatives
+        remove_derivatives(icon_path.name)
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -3500,7 +3522,10 @@ def delete_icon(filename):
 @app.route('/api/icons/upload', methods=['POST'])
 @login_required
 def upload_icon():
-    """Upload an SVG icon file."""
+    """Upload an SVG icon file and build its render-ready derivatives."""
+    import logging
+    from image_generator import build_icon_derivatives
+    
     if 'file' not in request.files:
         return jsonify({"success": False, "error": "No file provided"}), 400
     
@@ -3525,6 +3550,13 @@ def upload_icon():
     
     file.save(save_path)
     
+    # Stripped SVG used for rendering; the upload itself is kept
+    # untouched for master design files. Renders fall back to it if this fails.
+    try:
+        build_icon_derivatives(save_path)
+    except Exception as e:
+        logging.warning(f"Could not build derivatives for icon {save_path.name}: {e}")
+    
     return jsonify({
         "success": True,
         "filename": save_path.name,
@@ -3535,6 +3567,22 @@ def upload_icon():
 # Simple in-memory cache for preview images
 _preview_cache = {}
 
+
+def _preview_cache_key(product):
+    """Cache key includes icon_files and updated_at to invalidate on changes."""
+    return f"{product['m_number']}_{product.get('icon_files', '')}_{product.get('updated_at', '')}"
+
+
+def _store_preview(cache_key, png_bytes):
+    """Cache a rendered preview (limit cache size)."""
+    if len(_preview_cache) > 100:
+        # Remove oldest entries
+        keys_to_remove = list(_preview_cache.keys())[:50]
+        for k in keys_to_remove:
+            del _preview_cache[k]
+    _preview_cache[cache_key] = png_bytes
+
+
 @app.route('/api/preview/<m_number>')
 @login_required
 def preview_product(m_number):
@@ -3543,8 +3591,7 @@ def preview_product(m_number):
     if not product:
         return "Not found", 404
     
-    # Check cache - key includes icon_files and updated_at to invalidate on changes
-    cache_key = f"{m_number}_{product.get('icon_files', '')}_{product.get('updated_at', '')}"
+    cache_key = _preview_cache_key(product)
     if cache_key in _preview_cache:
         return Response(_preview_cache[cache_key], mimetype='image/png')
     
@@ -3552,14 +3599,7 @@ def preview_product(m_number):
         from image_generator import generate_product_image_preview
         # Use low-res preview for thumbnails (scale=1 instead of scale=4)
         png_bytes = generate_product_image_preview(product)
-        
-        # Cache the result (limit cache size)
-        if len(_preview_cache) > 100:
-            # Remove oldest entries
-            keys_to_remove = list(_preview_cache.keys())[:50]
-            for k in keys_to_remove:
-                del _preview_cache[k]
-        _preview_cache[cache_key] = png_bytes
+        _store_preview(cache_key, png_bytes)
         
         return Response(png_bytes, mimetype='image/png')
     except Exception as e:
@@ -3573,6 +3613,44 @@ def preview_product(m_number):
         return Response(svg, mimetype='image/svg+xml')
 
 
+@app.route('/api/preview/batch', methods=['POST'])
+@login_required
+def preview_products_batch():
+    """Render previews for many products in one renderer batch.
+    
+    The QA grid waits for this and draws its thumbnails from the returned data
+    URLs, so each preview is rendered once, whichever web worker serves it.
+    Products left out (not found, failed, or beyond the batch limit) are
+    loaded one by one from /api/preview/<m_number>.
+    """
+    import base64
+    from image_generator import generate_product_image_previews
+    
+    data = request.json or {}
+    m_numbers = data.get('m_numbers', [])
+    
+    pngs = {}
+    pending = {}
+    for m_number in m_numbers[:100]:
+        product = Product.get(m_number)
+        if product:
+            cache_key = _preview_cache_key(product)
+            if cache_key in _preview_cache:
+                pngs[m_number] = _preview_cache[cache_key]
+            else:
+                pending[m_number] = (cache_key, product)
+    
+    rendered = generate_product_image_previews([product for _, product in pending.values()])
+    for m_number, png_bytes in rendered.items():
+        _store_preview(pending[m_number][0], png_bytes)
+    pngs.update(rendered)
+    
+    previews = {m_number: f"data:image/png;base64,{base64.b64encode(png_bytes).decode()}"
+                for m_number, png_bytes in pngs.items()}
+    return jsonify({"success": True, "previews": previews, "rendered": len(rendered),
+                    "requested": len(m_numbers)})
+
+
 @app.route('/api/analyze/products', methods=['POST'])
 @login_required
 def analyze_products():
@@ -3965,6 +4043,31 @@ def get_job_status(job_id):
     return jsonify(job_to_dict(job))
 
 
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job_route(job_id):
+    """Cancel a pending or running job (it stops between items)."""
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if not cancel_job(job_id):
+        return jsonify({"error": f"Job is {job.status.value} and cannot be cancelled"}), 409
+    return jsonify({"success": True, "job": job_to_dict(get_job(job_id))})
+
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+@login_required
+def resume_job_route(job_id):
+    """Resume a failed or cancelled job, skipping the items it already finished."""
+    if not get_job(job_id):
+        return jsonify({"error": "Job not found"}), 404
+    try:
+        job = resume_job(job_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"success": True, "job": job_to_dict(job)})
+
+
 @app.route('/api/generate/content', methods=['POST'])
 @login_required
 def generate_content():
@@ -4842,7 +4945,8 @@ def upload_images_to_r2():
     from PIL import Image
     
     try:
-        from image_generator import generate_product_image_preview
+        from image_generator import ProductRenderPlan, generate_product_image
+        from image_encoding import IMAGE_TIERS, to_jpeg
     except Exception as e:
         logging.error(f"Failed to import image_generator: {e}\n{traceback.format_exc()}")
         return jsonify({"success": False, "error": f"Image generator import failed: {e}"}), 500
@@ -4890,37 +4994,18 @@ def upload_images_to_r2():
     for product in products:
         m_number = product['m_number']
         product_results = {'m_number': m_number, 'images': []}
+        # Layout and icons are resolved once for every image and the master SVG
+        plan = ProductRenderPlan.from_product(product)
         
         for img_type, img_num in IMAGE_TYPES:
             try:
-                # Generate PNG image (preview for speed)
-                png_bytes = generate_product_image_preview(product)
-                
-                # Convert to JPEG for smaller file size
-                img = Image.open(BytesIO(png_bytes))
-                if img.mode == 'RGBA':
-                    # Add white background for transparency
-                    bg = Image.new('RGB', img.size, (255, 255, 255))
-                    bg.paste(img, mask=img.split()[3])
-                    img = bg
-                else:
-                    img = img.convert('RGB')
-                
-                # Resize if larger than Amazon's max (10000x10000) - use 2000px max for faster loading
-                MAX_DIMENSION = 2000
-                if img.width > MAX_DIMENSION or img.height > MAX_DIMENSION:
-                    ratio = min(MAX_DIMENSION / img.width, MAX_DIMENSION / img.height)
-                    new_size = (int(img.width * ratio), int(img.height * ratio))
-                    img = img.resize(new_size, Image.LANCZOS)
-                    logging.info(f"Resized {m_number} {img_type} to {new_size}")
-                
-                jpg_bytes = BytesIO()
-                img.save(jpg_bytes, 'JPEG', quality=85)
-                jpg_bytes.seek(0)
+                # Render once at 2000px max (well under Amazon's 10000x10000 limit); the
+                # JPEG and the Google Drive PNG both come from this render
+                png_bytes = generate_product_image(plan, img_type, target_px=IMAGE_TIERS["large"])
+                jpg_data = to_jpeg(png_bytes, quality=85)
                 
                 # Upload to R2
                 r2_key = f"{m_number} - {img_num}.jpg"
-                jpg_data = jpg_bytes.getvalue()
                 upload_to_r2(jpg_data, r2_key, content_type='image/jpeg')
                 
                 product_results['images'].append(r2_key)
@@ -4965,7 +5050,7 @@ def upload_images_to_r2():
                         with open(img_path, 'wb') as f:
                             f.write(jpg_data)
                         
-                        # Also save PNG to 002 Images
+                        # Also save the PNG render to 002 Images
                         png_path = folder_path / "002 Images" / f"{m_number} - {img_num}.png"
                         with open(png_path, 'wb') as f:
                             f.write(png_bytes)
@@ -4998,7 +5083,7 @@ def upload_images_to_r2():
                 folder_name = f"{m_number} {mounting_display} {description} aluminium sign {color_display} {size_display}"
                 folder_path = GDRIVE_EXPORTS_PATH / folder_name
                 
-                master_svg = generate_master_svg_for_product(product)
+                master_svg = generate_master_svg_for_product(plan)
                 svg_path = folder_path / "001 Design" / "001 MASTER FILE" / f"{m_number} MASTER FILE.svg"
                 with open(svg_path, 'w', encoding='utf-8') as f:
                     f.write(master_svg)
@@ -5025,81 +5110,141 @@ def upload_images_to_r2():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def _iter_async(make_agen, buffer_size=64):
+    """Run an async generator on a private event loop thread and yield its items.
+    
+    Bridges the asyncio render pipelines into Flask's synchronous streaming
+    responses: items are yielded as soon as the event loop produces them. At
+    most buffer_size items wait for the client; beyond that the pipeline waits.
+    If the client goes away (the response generator is closed), the pipeline
+    is cancelled so it stops rendering and uploading.
+    """
+    import asyncio
+    import threading
+    from contextlib import aclosing
+    
+    done = object()
+    ready = threading.Event()
+    state = {}
+    
+    async def produce(items):
+        try:
+            async with aclosing(make_agen()) as agen:
+                async for item in agen:
+                    await items.put(item)
+        except Exception as e:
+            await items.put(e)
+            return
+        await items.put(done)
+    
+    async def main():
+        state["loop"] = asyncio.get_running_loop()
+        state["items"] = asyncio.Queue(maxsize=buffer_size)
+        state["task"] = asyncio.current_task()
+        ready.set()
+        await produce(state["items"])
+        # Keep the loop alive until the client has taken everything
+        await state["items"].join()
+    
+    async def take(items):
+        item = await items.get()
+        items.task_done()
+        return item
+    
+    def runner():
+        try:
+            asyncio.run(main())
+        except asyncio.CancelledError:
+            pass
+    
+    threading.Thread(target=runner, daemon=True, name="stream-event-loop").start()
+    ready.wait()
+    loop, items = state["loop"], state["items"]
+    finished = False
+    try:
+        while True:
+            item = asyncio.run_coroutine_threadsafe(take(items), loop).result()
+            if item is done:
+                finished = True
+                return
+            if isinstance(item, Exception):
+                finished = True
+                raise item
+            yield item
+    finally:
+        if not finished:
+            # Client disconnected (or the consumer failed) - stop the pipeline
+            try:
+                loop.call_soon_threadsafe(state["task"].cancel)
+            except RuntimeError:
+                pass  # Loop already finished
+
+
 @app.route('/api/upload-images-to-r2-stream', methods=['POST'])
 @login_required
 def upload_images_to_r2_stream():
-    """Stream R2 upload with progress updates - one product at a time."""
+    """Stream R2 upload with progress updates - products are rendered, encoded
+    and uploaded concurrently on one event loop."""
+    import asyncio
     import json
     import logging
     import traceback
-    from io import BytesIO
-    from PIL import Image
     
-    def generate():
-        try:
-            from image_generator import generate_product_image
-            from r2_storage import upload_image as upload_to_r2
-            from config import R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY
-            
-            Image.MAX_IMAGE_PIXELS = None
-            
-            if not R2_ACCOUNT_ID or not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
-                yield json.dumps({"type": "error", "error": "R2 credentials not configured"}) + "\n"
-                return
-            
-            products = Product.all()
-            if not products:
-                yield json.dumps({"type": "error", "error": "No products found"}) + "\n"
-                return
-            
-            yield json.dumps({"type": "start", "total": len(products)}) + "\n"
+    async def pipeline():
+        from image_generator import generate_product_image_tiers_async
+        from svg_renderer import AsyncRenderer
+        from r2_storage import upload_image as upload_to_r2
+        from config import R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, RENDER_POOL_SIZE
+        
+        if not R2_ACCOUNT_ID or not R2_ACCESS_KEY_ID or not R2_SECRET_ACCESS_KEY:
+            yield json.dumps({"type": "error", "error": "R2 credentials not configured"}) + "\n"
+            return
+        
+        products = await asyncio.to_thread(Product.all)
+        if not products:
+            yield json.dumps({"type": "error", "error": "No products found"}) + "\n"
+            return
+        
+        yield json.dumps({"type": "start", "total": len(products)}) + "\n"
+        
+        # Enough products in flight to keep the render slots busy while others encode and upload
+        in_flight = asyncio.Semaphore(max(1, RENDER_POOL_SIZE) * 2)
+        
+        async with AsyncRenderer() as renderer:
+            async def process(product):
+                m_number = product['m_number']
+                async with in_flight:
+                    try:
+                        # Render once at 800px max for ecommerce, encoded straight to JPEG
+                        tiers = await generate_product_image_tiers_async(
+                            product, "main", renderer, tiers=("web",), fmt="JPEG", quality=75
+                        )
+                        r2_key = f"{m_number} - 001.jpg"
+                        await asyncio.to_thread(upload_to_r2, tiers["web"], r2_key, content_type='image/jpeg')
+                        return m_number, None
+                    except Exception as e:
+                        logging.error(f"R2 upload error: {m_number}: {e}\n{traceback.format_exc()}")
+                        return m_number, f"{m_number}: {str(e)}"
             
             total_uploaded = 0
+            completed = 0
             errors = []
             
-            for i, product in enumerate(products):
-                m_number = product['m_number']
-                
-                try:
-                    # Use preview function for faster rendering (scale=1)
-                    from image_generator import generate_product_image_preview
-                    png_bytes = generate_product_image_preview(product)
-                    
-                    # Convert to JPEG
-                    img = Image.open(BytesIO(png_bytes))
-                    if img.mode == 'RGBA':
-                        bg = Image.new('RGB', img.size, (255, 255, 255))
-                        bg.paste(img, mask=img.split()[3])
-                        img = bg
-                    else:
-                        img = img.convert('RGB')
-                    
-                    # Resize to 800px max for ecommerce (much faster)
-                    MAX_DIMENSION = 800
-                    if img.width > MAX_DIMENSION or img.height > MAX_DIMENSION:
-                        ratio = min(MAX_DIMENSION / img.width, MAX_DIMENSION / img.height)
-                        new_size = (int(img.width * ratio), int(img.height * ratio))
-                        img = img.resize(new_size, Image.LANCZOS)
-                    
-                    jpg_bytes = BytesIO()
-                    img.save(jpg_bytes, 'JPEG', quality=75)
-                    jpg_bytes.seek(0)
-                    
-                    # Upload to R2
-                    r2_key = f"{m_number} - 001.jpg"
-                    upload_to_r2(jpg_bytes.getvalue(), r2_key, content_type='image/jpeg')
-                    total_uploaded += 1
-                    
-                    yield json.dumps({"type": "progress", "current": i + 1, "m_number": m_number, "uploaded": total_uploaded}) + "\n"
-                    
-                except Exception as e:
-                    error_msg = f"{m_number}: {str(e)}"
+            for next_done in asyncio.as_completed([process(p) for p in products]):
+                m_number, error_msg = await next_done
+                completed += 1
+                if error_msg:
                     errors.append(error_msg)
-                    logging.error(f"R2 upload error: {error_msg}\n{traceback.format_exc()}")
                     yield json.dumps({"type": "error", "error": error_msg}) + "\n"
-            
-            yield json.dumps({"type": "complete", "uploaded": total_uploaded, "products": len(products), "errors": len(errors)}) + "\n"
-            
+                else:
+                    total_uploaded += 1
+                    yield json.dumps({"type": "progress", "current": completed, "m_number": m_number, "uploaded": total_uploaded}) + "\n"
+        
+        yield json.dumps({"type": "complete", "uploaded": total_uploaded, "products": len(products), "errors": len(errors)}) + "\n"
+    
+    def generate():
+        try:
+            yield from _iter_async(pipeline)
         except Exception as e:
             logging.error(f"R2 stream error: {e}\n{traceback.format_exc()}")
             yield json.dumps({"type": "error", "error": str(e)}) + "\n"
@@ -5115,10 +5260,11 @@ def download_m_folders_zip():
     import logging
     import traceback
     from io import BytesIO
-    from PIL import Image
     
     try:
-        from image_generator import generate_product_image, generate_master_svg_for_product
+        from image_generator import ProductRenderPlan, generate_product_image, generate_master_svg_for_product
+        from config import ENCODE_TIMEOUT
+        from image_encoding import EncodeSpec, submit_encode
         
         products = Product.all()
         if not products:
@@ -5130,6 +5276,7 @@ def download_m_folders_zip():
         with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
             for product in products:
                 m_number = product['m_number']
+                plan = ProductRenderPlan.from_product(product)
                 
                 # Format folder name
                 SIZE_DISPLAY = {'dracula': 'Dracula', 'saville': 'Saville', 'dick': 'Dick', 'barzan': 'Barzan', 'baby_jesus': 'Baby_Jesus'}
@@ -5172,32 +5319,28 @@ def download_m_folders_zip():
                     ("rear", "004"),
                 ]
                 
+                # JPEGs are encoded on the encode stage while the next image renders
+                jpeg_futures = []
                 for img_type, img_num in IMAGE_TYPES:
                     try:
-                        png_bytes = generate_product_image(product, img_type)
+                        png_bytes = generate_product_image(plan, img_type)
                         
                         # Add PNG
                         zf.writestr(f"{folder_name}/002 Images/{m_number} - {img_num}.png", png_bytes)
-                        
-                        # Convert to JPEG and add
-                        img = Image.open(BytesIO(png_bytes))
-                        if img.mode == 'RGBA':
-                            bg = Image.new('RGB', img.size, (255, 255, 255))
-                            bg.paste(img, mask=img.split()[3])
-                            img = bg
-                        else:
-                            img = img.convert('RGB')
-                        
-                        jpg_buffer = BytesIO()
-                        img.save(jpg_buffer, 'JPEG', quality=85)
-                        zf.writestr(f"{folder_name}/002 Images/{m_number} - {img_num}.jpg", jpg_buffer.getvalue())
-                        
+                        jpeg_futures.append((img_type, img_num, submit_encode(png_bytes, {"jpeg": EncodeSpec("JPEG", quality=85)})))
                     except Exception as img_err:
                         logging.warning(f"Failed to generate {img_type} for {m_number}: {img_err}")
                 
+                # Add JPEGs
+                for img_type, img_num, jpeg_future in jpeg_futures:
+                    try:
+                        zf.writestr(f"{folder_name}/002 Images/{m_number} - {img_num}.jpg", jpeg_future.result(timeout=ENCODE_TIMEOUT)["jpeg"])
+                    except Exception as img_err:
+                        logging.warning(f"Failed to encode {img_type} JPEG for {m_number}: {img_err}")
+                
                 # Generate and add master SVG
                 try:
-                    master_svg = generate_master_svg_for_product(product)
+                    master_svg = generate_master_svg_for_product(plan)
                     svg_bytes = master_svg.encode('utf-8') if isinstance(master_svg, str) else master_svg
                     zf.writestr(f"{folder_name}/001 Design/001 MASTER FILE/{m_number} MASTER FILE.svg", svg_bytes)
                 except Exception as svg_err:
@@ -5227,47 +5370,69 @@ def download_m_folders_zip():
 @app.route('/api/upload-to-gdrive-stream', methods=['POST'])
 @login_required
 def upload_to_gdrive_stream():
-    """Stream Google Drive folder creation with progress updates."""
+    """Stream Google Drive folder creation with progress updates.
+    
+    Products are processed concurrently on one event loop so rendering overlaps
+    with Drive uploads. Drive calls themselves are serialised because the shared
+    Drive client is not thread-safe.
+    """
+    import asyncio
     import json
     import logging
     import traceback
-    from io import BytesIO
-    from PIL import Image
+    from config import RENDER_POOL_SIZE
     
-    def generate():
-        try:
-            from image_generator import generate_product_image_preview
-            import gdrive_storage
-            
-            if not gdrive_storage.is_configured():
-                yield json.dumps({"type": "error", "error": "Google Drive not configured. Set GOOGLE_DRIVE_CREDENTIALS environment variable."}) + "\n"
-                return
-            
-            parent_folder_id = gdrive_storage.get_parent_folder_id()
-            if not parent_folder_id:
-                yield json.dumps({"type": "error", "error": "GOOGLE_DRIVE_PARENT_FOLDER_ID not set"}) + "\n"
-                return
-            
-            Image.MAX_IMAGE_PIXELS = None
-            
-            products = Product.all()
-            if not products:
-                yield json.dumps({"type": "error", "error": "No products found"}) + "\n"
-                return
-            
-            yield json.dumps({"type": "start", "total": len(products)}) + "\n"
-            
-            total_created = 0
-            errors = []
-            
-            for i, product in enumerate(products):
-                m_number = product['m_number']
-                
+    async def pipeline():
+        from image_generator import ProductRenderPlan, generate_product_image_async, generate_master_svg_for_product
+        from image_encoding import EncodeSpec, encode_async
+        from svg_renderer import AsyncRenderer
+        import gdrive_storage
+        
+        if not gdrive_storage.is_configured():
+            yield json.dumps({"type": "error", "error": "Google Drive not configured. Set GOOGLE_DRIVE_CREDENTIALS environment variable."}) + "\n"
+            return
+        
+        parent_folder_id = gdrive_storage.get_parent_folder_id()
+        if not parent_folder_id:
+            yield json.dumps({"type": "error", "error": "GOOGLE_DRIVE_PARENT_FOLDER_ID not set"}) + "\n"
+            return
+        
+        products = await asyncio.to_thread(Product.all)
+        if not products:
+            yield json.dumps({"type": "error", "error": "No products found"}) + "\n"
+            return
+        
+        yield json.dumps({"type": "start", "total": len(products)}) + "\n"
+        
+        IMAGE_TYPES = [
+            ("main", "001"),
+            ("dimensions", "002"),
+            ("peel_and_stick", "003"),
+            ("rear", "004"),
+        ]
+        
+        events = asyncio.Queue(maxsize=64)
+        drive_lock = asyncio.Lock()
+        in_flight = asyncio.Semaphore(max(1, RENDER_POOL_SIZE))
+        counts = {"completed": 0, "created": 0, "errors": 0}
+        
+        async def drive(func, *args, **kwargs):
+            async with drive_lock:
+                return await asyncio.to_thread(func, *args, **kwargs)
+        
+        async def status(message):
+            await events.put(json.dumps({"type": "status", "message": message}) + "\n")
+        
+        async def process(product):
+            m_number = product['m_number']
+            plan = ProductRenderPlan.from_product(product)
+            async with in_flight:
                 try:
-                    yield json.dumps({"type": "status", "message": f"Creating folders for {m_number}..."}) + "\n"
+                    await status(f"Creating folders for {m_number}...")
                     
                     # Create folder structure (simplified - just main + images folder)
-                    folders = gdrive_storage.create_m_number_folder_simple(
+                    folders = await drive(
+                        gdrive_storage.create_m_number_folder_simple,
                         m_number=m_number,
                         description=product.get('description', 'Sign'),
                         color=product.get('color', 'silver'),
@@ -5276,59 +5441,29 @@ def upload_to_gdrive_stream():
                         parent_folder_id=parent_folder_id
                     )
                     
-                    # Generate and upload all 4 image types
-                    from image_generator import generate_product_image
-                    IMAGE_TYPES = [
-                        ("main", "001"),
-                        ("dimensions", "002"),
-                        ("peel_and_stick", "003"),
-                        ("rear", "004"),
-                    ]
+                    # Render all 4 image types concurrently, then upload each as PNG + JPEG
+                    await status(f"Generating images for {m_number}...")
+                    renders = await asyncio.gather(
+                        *(generate_product_image_async(plan, img_type, renderer) for img_type, _ in IMAGE_TYPES),
+                        return_exceptions=True
+                    )
                     
-                    for img_type, img_num in IMAGE_TYPES:
-                        yield json.dumps({"type": "status", "message": f"Generating {img_type} image for {m_number}..."}) + "\n"
-                        
-                        try:
-                            png_bytes = generate_product_image(product, img_type)
-                        except Exception as img_err:
-                            logging.warning(f"Failed to generate {img_type} for {m_number}: {img_err}")
+                    for (img_type, img_num), png_bytes in zip(IMAGE_TYPES, renders):
+                        if isinstance(png_bytes, Exception):
+                            logging.warning(f"Failed to generate {img_type} for {m_number}: {png_bytes}")
                             continue
                         
-                        # Upload PNG
-                        gdrive_storage.upload_file(
-                            png_bytes, 
-                            f"{m_number} - {img_num}.png",
-                            folders['002_images'],
-                            'image/png'
-                        )
-                        
-                        # Convert to JPEG and upload
-                        img = Image.open(BytesIO(png_bytes))
-                        if img.mode == 'RGBA':
-                            bg = Image.new('RGB', img.size, (255, 255, 255))
-                            bg.paste(img, mask=img.split()[3])
-                            img = bg
-                        else:
-                            img = img.convert('RGB')
-                        
-                        jpg_bytes = BytesIO()
-                        img.save(jpg_bytes, 'JPEG', quality=85)
-                        jpg_bytes.seek(0)
-                        
-                        gdrive_storage.upload_file(
-                            jpg_bytes.getvalue(),
-                            f"{m_number} - {img_num}.jpg",
-                            folders['002_images'],
-                            'image/jpeg'
-                        )
+                        jpg_bytes = (await encode_async(png_bytes, {"jpeg": EncodeSpec("JPEG", quality=85)}))["jpeg"]
+                        await drive(gdrive_storage.upload_file, png_bytes, f"{m_number} - {img_num}.png", folders['002_images'], 'image/png')
+                        await drive(gdrive_storage.upload_file, jpg_bytes, f"{m_number} - {img_num}.jpg", folders['002_images'], 'image/jpeg')
                     
                     # Generate and upload master SVG to 001 MASTER FILE folder
-                    yield json.dumps({"type": "status", "message": f"Generating master SVG for {m_number}..."}) + "\n"
+                    await status(f"Generating master SVG for {m_number}...")
                     try:
-                        from image_generator import generate_master_svg_for_product
-                        master_svg = generate_master_svg_for_product(product)
+                        master_svg = await asyncio.to_thread(generate_master_svg_for_product, plan)
                         svg_bytes = master_svg.encode('utf-8') if isinstance(master_svg, str) else master_svg
-                        gdrive_storage.upload_file(
+                        await drive(
+                            gdrive_storage.upload_file,
                             svg_bytes,
                             f"{m_number} MASTER FILE.svg",
                             folders['design_001_master'],
@@ -5337,18 +5472,39 @@ def upload_to_gdrive_stream():
                     except Exception as svg_err:
                         logging.warning(f"Failed to generate master SVG for {m_number}: {svg_err}")
                     
-                    total_created += 1
-                    yield json.dumps({"type": "progress", "current": i + 1, "m_number": m_number, "created": total_created}) + "\n"
+                    counts["completed"] += 1
+                    counts["created"] += 1
+                    await events.put(json.dumps({"type": "progress", "current": counts["completed"], "m_number": m_number, "created": counts["created"]}) + "\n")
                     
                 except Exception as e:
                     tb = traceback.format_exc()
                     error_msg = f"{m_number}: {type(e).__name__}: {str(e) or 'No message'}"
-                    errors.append(error_msg)
+                    counts["completed"] += 1
+                    counts["errors"] += 1
                     logging.error(f"GDrive error: {error_msg}\n{tb}")
-                    yield json.dumps({"type": "error", "error": f"{error_msg} | {tb[-200:]}"}) + "\n"
-            
-            yield json.dumps({"type": "complete", "created": total_created, "products": len(products), "errors": len(errors)}) + "\n"
+                    await events.put(json.dumps({"type": "error", "error": f"{error_msg} | {tb[-200:]}"}) + "\n")
+        
+        async with AsyncRenderer() as renderer:
+            async def run_all():
+                try:
+                    await asyncio.gather(*(process(p) for p in products))
+                finally:
+                    await events.put(None)
             
+            runner = asyncio.ensure_future(run_all())
+            try:
+                while (event := await events.get()) is not None:
+                    yield event
+                await runner
+            finally:
+                # Stream closed early (client disconnected) - stop the remaining products
+                runner.cancel()
+        
+        yield json.dumps({"type": "complete", "created": counts["created"], "products": len(products), "errors": counts["errors"]}) + "\n"
+    
+    def generate():
+        try:
+            yield from _iter_async(pipeline)
         except Exception as e:
             logging.error(f"GDrive stream error: {e}\n{traceback.format_exc()}")
             yield json.dumps({"type": "error", "error": str(e)}) + "\n"
@@ -5580,6 +5736,69 @@ def debug_playwright():
     return jsonify(result)
 
 
+@app.route('/api/debug/render-pool')
+@login_required
+def debug_render_pool():
+    """Show render pool queue depth and per-slot health."""
+    from svg_renderer import get_render_pool_status
+    return jsonify(get_render_pool_status())
+
+
+@app.route('/api/admin/render-cache', methods=['GET'])
+@login_required
+@admin_required
+def render_cache_stats():
+    """Show render cache size and hit/miss counters."""
+    import render_cache
+    return jsonify(render_cache.stats())
+
+
+@app.route('/api/admin/render-cache', methods=['DELETE'])
+@login_required
+@admin_required
+def purge_render_cache():
+    """Delete all cached renders."""
+    import render_cache
+    removed = render_cache.purge()
+    return jsonify({"success": True, "removed": removed})
+
+
+@app.route('/api/admin/layouts/reload', methods=['POST'])
+@login_required
+@admin_required
+def reload_layouts():
+    """Re-read assets/layout_modes.csv without waiting for the change check."""
+    from image_generator import reload_layout_index
+    count = reload_layout_index()
+    return jsonify({"success": True, "layouts": count})
+
+
+@app.route('/api/admin/templates')
+@login_required
+@admin_required
+def template_report():
+    """Registered templates and a template check of every product."""
+    from image_generator import template_registry, validate_products
+    templates = template_registry()
+    return jsonify({
+        "success": True,
+        "templates": len(templates),
+        "by_type": {t: sum(1 for info in templates if info.template_type == t)
+                    for t in sorted({info.template_type for info in templates})},
+        "products": validate_products(Product.all()),
+    })
+
+
+@app.route('/api/admin/templates/reload', methods=['POST'])
+@login_required
+@admin_required
+def reload_templates():
+    """Re-scan assets/ for templates (after adding or removing template files)."""
+    from image_generator import reload_template_registry
+    count = reload_template_registry()
+    return jsonify({"success": True, "templates": count})
+
+
 @app.route('/api/debug/r2')
 @login_required  
 def debug_r2():
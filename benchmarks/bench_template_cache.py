@@ -0,0 +1,44 @@
+"""Benchmark: parsing templates on every render vs. the parsed template cache.
+
+Run from the repository root:
+    python benchmarks/bench_template_cache.py
+"""
+import sys
+import time
+from pathlib import Path
+
+from lxml import etree
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_generator import ASSETS_DIR, _load_template  # noqa: E402
+
+ROUNDS = 5
+
+
+def _time(func, templates) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for path in templates:
+            func(path)
+    return (time.perf_counter() - start) / (ROUNDS * len(templates)) * 1000
+
+
+def main():
+    templates = sorted(ASSETS_DIR.glob("*_main.svg")) + sorted(ASSETS_DIR.glob("*_peel_and_stick.svg"))
+    total_mb = sum(p.stat().st_size for p in templates) / 1e6
+    print(f"{len(templates)} templates, {total_mb:.1f} MB total, {ROUNDS} rounds")
+
+    parse_ms = _time(lambda p: etree.parse(str(p)).getroot(), templates)
+
+    for path in templates:
+        _load_template(path)  # warm the cache
+    cached_ms = _time(_load_template, templates)
+
+    print(f"etree.parse per render:  {parse_ms:7.2f} ms/template")
+    print(f"cached copy per render:  {cached_ms:7.2f} ms/template")
+    print(f"speedup:                 {parse_ms / cached_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
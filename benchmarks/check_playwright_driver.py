@@ -0,0 +1,48 @@
+"""Check that the render watchdog can find the Playwright driver process.
+
+svg_renderer reads the driver PID from a private Playwright attribute so the
+watchdog can kill hung browsers. Run this after upgrading Playwright: it fails
+if that attribute has moved, and checks that the /proc fallback finds the same
+process.
+
+Run from the repository root:
+    python benchmarks/check_playwright_driver.py
+"""
+import os
+import sys
+from importlib.metadata import version
+from pathlib import Path
+
+from playwright.sync_api import sync_playwright
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from svg_renderer import _driver_pid, _process_tree  # noqa: E402
+
+
+def main():
+    print(f"Playwright {version('playwright')}")
+    known_pids = set(_process_tree(os.getpid()))
+    playwright = sync_playwright().start()
+    try:
+        try:
+            direct = playwright._impl_obj._connection._transport._proc.pid
+        except AttributeError:
+            direct = None
+        fallback = _driver_pid(object(), known_pids)
+        print(f"driver PID from transport: {direct}")
+        print(f"driver PID from /proc:     {fallback}")
+    finally:
+        playwright.stop()
+    if direct is None:
+        print("FAIL: private driver PID path is gone - the watchdog relies on the /proc fallback")
+        return 1
+    if fallback != direct:
+        print("FAIL: /proc fallback does not find the driver")
+        return 1
+    print("ok")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
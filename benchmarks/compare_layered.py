@@ -0,0 +1,184 @@
+"""Pixel-diff and timing check: layered compositing vs. the single full render.
+
+Renders sample products both ways (into a fresh render cache) and reports the
+largest per-channel difference and the share of pixels that differ by more
+than TOLERANCE. Exits non-zero if any image exceeds MAX_DIFFERING_PIXELS.
+
+Run from the repository root (needs Chromium via Playwright):
+    python benchmarks/compare_layered.py
+
+Where Playwright's Chromium cannot be installed, two stand-ins render both
+sides instead; layered jobs are still composited with composite_layers():
+
+    --rasterizer kaleido   Chromium's SVG rasterizer (Skia) as bundled with
+                           kaleido: pip install kaleido==0.2.1 plotly. The SVG
+                           is drawn as an image, not loaded as a page
+    --rasterizer resvg     resvg (pip install resvg-py), with Arial swapped
+                           for DejaVu Sans
+
+Timings then measure the stand-in, not the render slots.
+"""
+import argparse
+import base64
+import math
+import os
+import re
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+from lxml import etree
+from PIL import Image, ImageChops
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Fresh render cache: nothing from earlier runs, but backgrounds still get cached
+os.environ["RENDER_CACHE_DIR"] = tempfile.mkdtemp(prefix="compare_layered_")
+
+import svg_renderer  # noqa: E402
+from image_encoding import composite_layers  # noqa: E402
+from image_generator import ProductRenderPlan, _svg_pixel_size  # noqa: E402
+from svg_renderer import close_browser, render_job  # noqa: E402
+
+# Per-channel difference treated as antialiasing noise
+TOLERANCE = 8
+# Fail if more than this share of pixels differs beyond TOLERANCE
+MAX_DIFFERING_PIXELS = 0.001
+
+TEMPLATE_TYPES = ["main", "dimensions", "peel_and_stick"]
+
+SAMPLE_PRODUCTS = [
+    {"m_number": "CMP1", "size": "saville", "color": "silver", "layout_mode": "A",
+     "icon_files": "keep_out.png", "text_line_1": ""},
+    {"m_number": "CMP2", "size": "dracula", "color": "gold", "layout_mode": "B",
+     "icon_files": "No Entry Without Permission.svg", "text_line_1": "NO ENTRY"},
+    {"m_number": "CMP3", "size": "baby_jesus", "color": "white", "layout_mode": "C",
+     "orientation": "portrait", "icon_files": "customers_only.png", "text_line_1": "PRIVATE"},
+    {"m_number": "CMP4", "size": "dick", "color": "silver", "layout_mode": "D",
+     "icon_files": "No Trespassing.svg", "text_line_1": "NO", "text_line_2": "TRESPASSING"},
+]
+
+
+def _diff(a: bytes, b: bytes) -> tuple[int, float]:
+    """Largest channel difference and share of pixels differing beyond TOLERANCE."""
+    img_a = Image.open(BytesIO(a)).convert("RGBA")
+    img_b = Image.open(BytesIO(b)).convert("RGBA")
+    if img_a.size != img_b.size:
+        return 255, 1.0
+    diff = ImageChops.difference(img_a, img_b)
+    max_diff = max(high for _, high in diff.getextrema())
+    # Per pixel: largest channel difference
+    channels = diff.split()
+    worst = channels[0]
+    for channel in channels[1:]:
+        worst = ImageChops.lighter(worst, channel)
+    histogram = worst.histogram()
+    differing = sum(histogram[TOLERANCE + 1:])
+    return max_diff, differing / (img_a.width * img_a.height)
+
+
+_ASSET_URL = re.compile(re.escape(svg_renderer.RENDER_ORIGIN) + r"/assets/[^\"')\s]+")
+_ARIAL = re.compile(r"font-family:Arial( Black)?")
+
+
+def _inline_assets(svg_content: str) -> str:
+    """Replace render-origin asset URLs with data URIs (the stand-ins do not fetch URLs)."""
+    def data_uri(match):
+        mime_type, data = svg_renderer._assets[match.group(0)[len(svg_renderer.RENDER_ORIGIN):]]
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode()}"
+    return _ASSET_URL.sub(data_uri, svg_content)
+
+
+def _composited(render_plain):
+    """render_job() equivalent on a stand-in rasterizer: layered jobs are composited as in svg_renderer."""
+    def render(job) -> bytes:
+        if job.background is not None:
+            return composite_layers(*(render_plain(layer) for layer in job.layers()))
+        return render_plain(job)
+    return render
+
+
+def _render_resvg(job) -> bytes:
+    import resvg_py
+
+    svg_content = _ARIAL.sub("font-family:DejaVu Sans", _inline_assets(job.svg_content))
+    return bytes(resvg_py.svg_to_bytes(svg_string=svg_content, zoom=job.scale, dpi=96.0,
+                                       background=None if job.transparent else "#ffffff"))
+
+
+_kaleido_scope = None
+
+
+def _render_kaleido(job) -> bytes:
+    """Draw the SVG as a full-bleed plotly layout image and export it at the job's scale."""
+    global _kaleido_scope
+    if _kaleido_scope is None:
+        import plotly
+        from kaleido.scopes.plotly import PlotlyScope
+        _kaleido_scope = PlotlyScope(plotlyjs=str(Path(plotly.__file__).parent / "package_data" / "plotly.min.js"))
+
+    svg_content = _inline_assets(job.svg_content)
+    # Same clip as the element screenshot: whole CSS pixels
+    width, height = (math.ceil(v) for v in _svg_pixel_size(etree.fromstring(svg_content.encode("utf-8"))))
+    source = f"data:image/svg+xml;base64,{base64.b64encode(svg_content.encode('utf-8')).decode()}"
+    figure = {"data": [], "layout": {
+        "margin": {"l": 0, "r": 0, "t": 0, "b": 0, "pad": 0},
+        "paper_bgcolor": "rgba(0,0,0,0)" if job.transparent else "#ffffff",
+        "plot_bgcolor": "rgba(0,0,0,0)",
+        "xaxis": {"visible": False}, "yaxis": {"visible": False},
+        "images": [{"source": source, "xref": "paper", "yref": "paper", "x": 0, "y": 1, "sizex": 1, "sizey": 1,
+                    "xanchor": "left", "yanchor": "top", "sizing": "stretch", "layer": "above"}],
+    }}
+    return _kaleido_scope.transform(figure, format="png", width=width, height=height, scale=job.scale)
+
+
+RASTERIZERS = {
+    "chromium": render_job,
+    "kaleido": _composited(_render_kaleido),
+    "resvg": _composited(_render_resvg),
+}
+
+
+def _timed(render, job) -> tuple[bytes, float]:
+    start = time.perf_counter()
+    png_bytes = render(job)
+    return png_bytes, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rasterizer", choices=list(RASTERIZERS), default="chromium")
+    args = parser.parse_args()
+    render = RASTERIZERS[args.rasterizer]
+
+    failures = 0
+    full_total = layered_total = 0.0
+    try:
+        for product in SAMPLE_PRODUCTS:
+            plan = ProductRenderPlan.from_product(product)
+            for template_type in TEMPLATE_TYPES:
+                full, full_ms = _timed(render, plan.compose(template_type, target_px=2000, layered=False))
+                layered_job = plan.compose(template_type, target_px=2000, layered=True)
+                render(layered_job.layers()[0])  # background render, paid once per template
+                layered, layered_ms = _timed(render, layered_job)
+                full_total += full_ms
+                layered_total += layered_ms
+
+                max_diff, share = _diff(full, layered)
+                ok = share <= MAX_DIFFERING_PIXELS
+                failures += not ok
+                print(f"{'ok  ' if ok else 'FAIL'} {product['m_number']} {template_type:15s} "
+                      f"max diff {max_diff:3d}, {share:.4%} px > {TOLERANCE}, "
+                      f"full {full_ms:6.0f} ms, layered {layered_ms:6.0f} ms"
+                      f"{'' if layered_job.background is not None else ' (not layered)'}")
+    finally:
+        close_browser()
+
+    print(f"total: full {full_total:.0f} ms, layered (warm background) {layered_total:.0f} ms")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
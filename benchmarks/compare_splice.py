@@ -0,0 +1,79 @@
+"""Equivalence and timing check: splice vs. lxml SVG composition.
+
+Composes sample products for every template with both engines, single and
+layered, and fails if any SVG differs. Byte-identical SVGs share a render
+cache key, so they render to the same PNG - no browser round trip is needed to
+compare them. Then times warm composition with each engine.
+
+Run from the repository root:
+    python benchmarks/compare_splice.py
+
+peel_and_stick templates need their full-page bbox in the template bbox index
+(render_cache/template_bboxes.json, measured with Chromium on first use).
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_generator import COLORS, ProductRenderPlan  # noqa: E402
+
+TEMPLATE_TYPES = ["main", "dimensions", "peel_and_stick", "rear"]
+TIMING_ROUNDS = 20
+
+SAMPLE_DESIGNS = [
+    {"size": "saville", "layout_mode": "A", "icon_files": "keep_out.png", "text_line_1": ""},
+    {"size": "dracula", "layout_mode": "B", "icon_files": "No Entry Without Permission.svg",
+     "text_line_1": "NO ENTRY"},
+    {"size": "baby_jesus", "layout_mode": "C", "orientation": "portrait", "icon_files": "customers_only.png",
+     "text_line_1": "STAFF & <VISITORS>", "font": "arial_bold"},
+    {"size": "dick", "layout_mode": "D", "icon_files": "No Trespassing.svg",
+     "text_line_1": "NO", "text_line_2": "TRESPASSING", "text_line_3": "  \"PRIVATE\"  "},
+    {"size": "barzan", "layout_mode": "E", "icon_files": "keep_out.png, No Trespassing.svg",
+     "text_line_1": "KEEP OUT", "icon_scale": 0.8, "icon_offset_x": 2.5, "icon_offset_y": -1},
+    {"size": "baby_jesus", "layout_mode": "A", "icon_files": "", "text_line_1": ""},
+]
+
+
+def _plans():
+    for number, design in enumerate(SAMPLE_DESIGNS, 1):
+        for color in COLORS:
+            yield ProductRenderPlan.from_product({**design, "m_number": f"CMP{number}", "color": color})
+
+
+def _compose_all(plans, engine: str, layered: bool) -> list:
+    return [plan.compose(template_type, target_px=2000, layered=layered, engine=engine)
+            for plan in plans for template_type in TEMPLATE_TYPES]
+
+
+def main():
+    plans = list(_plans())
+    failures = 0
+    for layered in (False, True):
+        lxml_jobs = _compose_all(plans, "lxml", layered)
+        splice_jobs = _compose_all(plans, "splice", layered)
+        differing = 0
+        for index, (expected, actual) in enumerate(zip(lxml_jobs, splice_jobs)):
+            plan = plans[index // len(TEMPLATE_TYPES)]
+            template_type = TEMPLATE_TYPES[index % len(TEMPLATE_TYPES)]
+            same = (expected.svg_content == actual.svg_content and expected.background == actual.background
+                    and (expected.scale, expected.transparent, expected.full_page, expected.static)
+                    == (actual.scale, actual.transparent, actual.full_page, actual.static))
+            if not same:
+                differing += 1
+                print(f"FAIL {plan.m_number} {plan.color} {template_type} (layered={layered})")
+        failures += differing
+        print(f"{'layered' if layered else 'single '}: {len(lxml_jobs) - differing} of {len(lxml_jobs)} identical")
+
+    for engine in ("lxml", "splice"):
+        start = time.perf_counter()
+        for _ in range(TIMING_ROUNDS):
+            jobs = _compose_all(plans, engine, False)
+        elapsed = (time.perf_counter() - start) / (TIMING_ROUNDS * len(jobs))
+        print(f"{engine:6s}: {elapsed * 1e6:8.0f} us per SVG")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -29,6 +29,42 @@ EBAY_RU_NAME = os.environ.get("EBAY_RU_NAME", "")
 EBAY_ENVIRONMENT = os.environ.get("EBAY_ENVIRONMENT", "production")
 EBAY_MERCHANT_LOCATION_KEY = os.environ.get("EBAY_MERCHANT_LOCATION_KEY", "default")
 
+# SVG rendering
+# Number of concurrent render slots (each slot owns one headless Chromium)
+RENDER_POOL_SIZE = int(os.environ.get("RENDER_POOL_SIZE", os.cpu_count() or 1))
+# Render slots that only take interactive renders (e.g. QA previews), so they stay
+# responsive while bulk exports keep the other slots busy (at most RENDER_POOL_SIZE - 1)
+RENDER_RESERVED_SLOTS = int(os.environ.get("RENDER_RESERVED_SLOTS", "0"))
+# Seconds a caller waits for a queued render before giving up
+RENDER_TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", "60"))
+# Restart a render slot's browser after this many renders / this much memory (0 = never)
+RENDER_RECYCLE_AFTER = int(os.environ.get("RENDER_RECYCLE_AFTER", "500"))
+RENDER_MAX_RSS_MB = int(os.environ.get("RENDER_MAX_RSS_MB", "1024"))
+# On-disk cache of rendered PNGs (set RENDER_CACHE_MAX_BYTES=0 to disable)
+RENDER_CACHE_DIR = Path(os.environ.get("RENDER_CACHE_DIR", BASE_DIR / "render_cache"))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+# In-memory budget for loaded icons (parsed SVGs / base64 PNG payloads)
+ICON_CACHE_MAX_BYTES = int(os.environ.get("ICON_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Layered rendering: rasterise each template background once and composite the
+# per-product icon/text overlay onto it with Pillow
+RENDER_LAYERED = os.environ.get("RENDER_LAYERED", "false").lower() in ("1", "true", "yes")
+# How product SVGs are composed: "lxml" edits and re-serialises a copy of the
+# template tree, "splice" joins cached template/icon markup as strings (same
+# SVGs, several times faster to compose - see benchmarks/compare_splice.py)
+SVG_COMPOSE_ENGINE = os.environ.get("SVG_COMPOSE_ENGINE", "lxml").lower()
+# Processes for CPU-bound image encoding (decode/resize/JPEG/PNG), shared by
+# requests and jobs in a process (0 = encode inline on the calling thread)
+ENCODE_WORKERS = int(os.environ.get("ENCODE_WORKERS", max(1, (os.cpu_count() or 1) // 2)))
+# Seconds to wait for an encode, including time queued behind other encodes
+ENCODE_TIMEOUT = float(os.environ.get("ENCODE_TIMEOUT", "120"))
+
+# Background jobs
+# Job threads per process (each runs one job at a time)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+# Threads per process for per-product subtasks of batch jobs, shared by all jobs.
+# More than the render pool, so composing and uploading overlap with rendering.
+JOB_SUBTASK_WORKERS = int(os.environ.get("JOB_SUBTASK_WORKERS", max(2, RENDER_POOL_SIZE * 2)))
+
 # Product sizes (internal name -> dimensions in cm, Amazon size code)
 SIZES = {
     "dracula": {"dimensions": (9.5, 9.5), "code": "XS", "display": "9.5 x 9.5 cm"},
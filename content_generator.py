@@ -8,7 +8,7 @@ from typing import Optional
 
 import anthropic
 
-from jobs import Job
+from jobs import Job, resumable_job, run_subtasks
 
 # Product size dimensions in cm
 SIZE_DIMENSIONS_CM = {
@@ -180,6 +180,7 @@ Respond in JSON format:
     )
 
 
+@resumable_job
 def generate_content_job(
     job: Job,
     products: list[dict],
@@ -203,27 +204,31 @@ def generate_content_job(
         raise ValueError("ANTHROPIC_API_KEY not set")
     
     job.total = len(products)
-    results = {}
     
-    for i, product in enumerate(products):
+    def generate(product: dict) -> dict:
+        content = generate_content_for_product(
+            product, api_key, theme=theme, use_cases=use_cases
+        )
+        return {
+            "success": True,
+            "title": content.title,
+            "description": content.description,
+            "bullet_points": content.bullet_points,
+            "search_terms": content.search_terms,
+        }
+    
+    # One API call per product, run as parallel subtasks
+    outcomes = run_subtasks(job, products, generate,
+                            describe=lambda product: f"Generated content for {product['m_number']}",
+                            key=lambda product: product["m_number"])
+    results = {}
+    for product, outcome in zip(products, outcomes):
         m_number = product["m_number"]
-        job.message = f"Generating content for {m_number}..."
-        job.progress = i
-        
-        try:
-            content = generate_content_for_product(
-                product, api_key, theme=theme, use_cases=use_cases
-            )
-            results[m_number] = {
-                "success": True,
-                "title": content.title,
-                "description": content.description,
-                "bullet_points": content.bullet_points,
-                "search_terms": content.search_terms,
-            }
-        except Exception as e:
-            logging.error(f"Failed to generate content for {m_number}: {e}")
-            results[m_number] = {"success": False, "error": str(e)}
+        if isinstance(outcome, Exception):
+            logging.error(f"Failed to generate content for {m_number}: {outcome}")
+            results[m_number] = {"success": False, "error": str(outcome)}
+        else:
+            results[m_number] = outcome
     
     job.progress = job.total
     job.message = f"Completed {len(products)} products"
@@ -14,9 +14,12 @@ Generates proper folder structure for staff use:
 import io
 import zipfile
 import logging
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
-from image_generator import generate_all_images_for_product, generate_master_svg_for_product
+from image_encoding import to_jpeg
+from image_generator import ProductRenderPlan, generate_all_images_for_product, generate_master_svg_for_product
 from jobs import Job
 
 
@@ -64,22 +67,29 @@ def _get_folder_name(product: dict) -> str:
     return f"{m_number} {mounting_display} {description} aluminium sign {color_display} {size_display}"
 
 
+# Recent JPEG conversions, by PNG object: static renders (e.g. rear images) are the
+# same bytes object for every product, so they are converted once per export
+_jpeg_memo: OrderedDict[int, tuple[bytes, bytes]] = OrderedDict()
+_jpeg_memo_lock = threading.Lock()
+_JPEG_MEMO_SIZE = 8
+
+
 def _png_to_jpeg(png_bytes: bytes) -> bytes:
-    """Convert PNG bytes to JPEG bytes."""
-    from PIL import Image
-    from io import BytesIO
+    """Convert PNG bytes to JPEG bytes (on the encode stage)."""
+    with _jpeg_memo_lock:
+        cached = _jpeg_memo.get(id(png_bytes))
+        if cached is not None and cached[0] is png_bytes:
+            _jpeg_memo.move_to_end(id(png_bytes))
+            return cached[1]
     
-    img = Image.open(BytesIO(png_bytes))
-    if img.mode == "RGBA":
-        background = Image.new("RGB", img.size, (255, 255, 255))
-        background.paste(img, mask=img.split()[3])
-        img = background
-    elif img.mode != "RGB":
-        img = img.convert("RGB")
+    jpeg_bytes = to_jpeg(png_bytes, quality=95)
     
-    jpeg_buffer = BytesIO()
-    img.save(jpeg_buffer, format="JPEG", quality=95)
-    return jpeg_buffer.getvalue()
+    # Holding png_bytes keeps its id from being reused while it is memoised
+    with _jpeg_memo_lock:
+        _jpeg_memo[id(png_bytes)] = (png_bytes, jpeg_bytes)
+        while len(_jpeg_memo) > _JPEG_MEMO_SIZE:
+            _jpeg_memo.popitem(last=False)
+    return jpeg_bytes
 
 
 def generate_m_number_folder_zip(products: list[dict], include_master_svg: bool = True) -> bytes:
@@ -113,9 +123,10 @@ def generate_m_number_folder_zip(products: list[dict], include_master_svg: bool
             logging.info(f"Processing {m_number} ({idx + 1}/{total_products})...")
             
             try:
-                # Generate images
+                # Generate images (layout and icons resolved once for images and master SVG)
                 logging.info(f"  Generating images for {m_number}...")
-                images = generate_all_images_for_product(product)
+                plan = ProductRenderPlan.from_product(product)
+                images = generate_all_images_for_product(plan)
                 logging.info(f"  Generated {len(images)} image types for {m_number}")
                 
                 # Add images to 002 Images folder
@@ -140,7 +151,7 @@ def generate_m_number_folder_zip(products: list[dict], include_master_svg: bool
                 # Add master SVG to 001 Design/001 MASTER FILE
                 if include_master_svg:
                     try:
-                        master_svg = generate_master_svg_for_product(product)
+                        master_svg = generate_master_svg_for_product(plan)
                         svg_path = f"{folder_name}/001 Design/001 MASTER FILE/{m_number} MASTER FILE.svg"
                         zf.writestr(svg_path, master_svg)
                     except Exception as e:
@@ -257,6 +268,7 @@ def generate_images_zip_job(job: Job, products: list[dict], full_structure: bool
     
     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
         for i, product in enumerate(products):
+            job.check_cancelled()
             m_number = product.get("m_number", "UNKNOWN")
             job.message = f"Generating images for {m_number}..."
             job.progress = i
@@ -0,0 +1,242 @@
+"""Icon derivatives - render-ready copies of the icons in icons/.
+
+Source icons are kept as uploaded (PNGs up to 14185 x 21260 px, Inkscape SVGs
+with editor metadata) because the master design SVG embeds them verbatim for
+manufacturing. Product images never need that much: an icon is drawn into a
+box a fraction of the sign's size, and the largest export tier caps the
+render size.
+
+For each icon this module writes into icons/derived/:
+  - PNG icons: downscaled copies at DERIVATIVE_SIZES, capped at the largest
+    pixel size any template needs (longest side)
+  - SVG icons: a copy with Inkscape/Sodipodi metadata, comments and
+    <metadata> stripped
+and records them with the icon's intrinsic size in icons/derived/index.json.
+select_derivative() picks the smallest derivative that covers a requested
+pixel size, falling back to the source icon.
+
+Backfill existing icons with:
+    python icon_derivatives.py [--force]
+"""
+import argparse
+import json
+import logging
+import threading
+from io import BytesIO
+from pathlib import Path
+
+from lxml import etree
+from PIL import Image
+
+from template_compiler import strip_editor_metadata
+
+# Disable PIL decompression bomb check for large icons
+Image.MAX_IMAGE_PIXELS = None
+
+BASE_DIR = Path(__file__).parent
+ICONS_DIR = BASE_DIR / "icons"
+DERIVED_DIR = ICONS_DIR / "derived"
+INDEX_PATH = DERIVED_DIR / "index.json"
+
+# Longest side in pixels of the PNG derivatives (the per-icon maximum is added on top)
+DERIVATIVE_SIZES = (256, 512, 1024, 2048)
+
+ICON_EXTENSIONS = (".svg", ".png")
+
+_index_lock = threading.Lock()
+_index: dict | None = None
+_index_mtime: float | None = None
+
+
+def _load_index() -> dict:
+    """Icon filename -> derivative record, reloaded when index.json changes on disk."""
+    global _index, _index_mtime
+    try:
+        mtime = INDEX_PATH.stat().st_mtime
+    except OSError:
+        mtime = None
+    with _index_lock:
+        if _index is None or mtime != _index_mtime:
+            try:
+                _index = json.loads(INDEX_PATH.read_text()) if mtime is not None else {}
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not read icon derivative index: {e}")
+                _index = {}
+            _index_mtime = mtime
+        return _index
+
+
+def _save_index(index: dict):
+    global _index, _index_mtime
+    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = INDEX_PATH.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(index, indent=2, sort_keys=True))
+    tmp_path.replace(INDEX_PATH)
+    with _index_lock:
+        _index = index
+        _index_mtime = INDEX_PATH.stat().st_mtime
+
+
+def _png_derivatives(icon_path: Path, max_px: int) -> tuple[dict, list[dict]]:
+    """Write downscaled PNG copies; returns (intrinsic size, derivative records)."""
+    img = Image.open(icon_path)
+    img.load()
+    intrinsic = {"width": img.width, "height": img.height}
+    longest = max(img.width, img.height)
+
+    derivatives = []
+    source = img
+    for size in sorted({s for s in DERIVATIVE_SIZES if s < max_px} | {max_px}, reverse=True):
+        if size >= longest:
+            continue  # Never upscale - the source itself covers this size
+        ratio = size / max(source.width, source.height)
+        source = source.resize((max(1, round(source.width * ratio)), max(1, round(source.height * ratio))),
+                               Image.LANCZOS, reducing_gap=3.0)
+        out_path = DERIVED_DIR / f"{icon_path.stem}_{size}.png"
+        buffer = BytesIO()
+        source.save(buffer, format="PNG", optimize=True)
+        out_path.write_bytes(buffer.getvalue())
+        derivatives.append({
+            "file": out_path.name,
+            "max_px": size,
+            "width": source.width,
+            "height": source.height,
+            "bytes": len(buffer.getvalue()),
+        })
+    derivatives.sort(key=lambda d: d["max_px"])
+    return intrinsic, derivatives
+
+
+def _svg_derivative(icon_path: Path) -> tuple[dict, list[dict]]:
+    """Write a metadata-stripped copy of an SVG icon."""
+    root = strip_editor_metadata(etree.parse(str(icon_path)).getroot())
+    data = etree.tostring(root, encoding="utf-8", xml_declaration=True)
+    out_path = DERIVED_DIR / f"{icon_path.stem}.svg"
+    out_path.write_bytes(data)
+    intrinsic = {"width": root.get("width"), "height": root.get("height"), "viewBox": root.get("viewBox")}
+    return intrinsic, [{"file": out_path.name, "max_px": None, "bytes": len(data)}]
+
+
+def build_derivatives(icon_path: Path, max_px: int) -> dict:
+    """
+    Generate the derivatives of one icon and record them in the index.
+
+    Args:
+        icon_path: Source icon in icons/
+        max_px: Largest icon size in pixels any template needs at the highest export tier
+
+    Returns:
+        The icon's index record
+    """
+    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+    remove_derivatives(icon_path.name, save=False)
+    suffix = icon_path.suffix.lower()
+    if suffix == ".png":
+        intrinsic, derivatives = _png_derivatives(icon_path, max_px)
+    elif suffix == ".svg":
+        intrinsic, derivatives = _svg_derivative(icon_path)
+    else:
+        raise ValueError(f"Unsupported icon type: {icon_path.name}")
+
+    stat = icon_path.stat()
+    record = {
+        "type": suffix[1:],
+        "source_mtime": stat.st_mtime,
+        "source_size": stat.st_size,
+        "max_px": max_px,
+        **intrinsic,
+        "derivatives": derivatives,
+    }
+    index = dict(_load_index())
+    index[icon_path.name] = record
+    _save_index(index)
+    return record
+
+
+def remove_derivatives(icon_filename: str, save: bool = True):
+    """Delete an icon's derivative files (and its index entry if save is True)."""
+    index = dict(_load_index())
+    record = index.pop(icon_filename, None)
+    if record is None:
+        return
+    for derivative in record["derivatives"]:
+        (DERIVED_DIR / derivative["file"]).unlink(missing_ok=True)
+    if save:
+        _save_index(index)
+
+
+def select_derivative(icon_path: Path, needed_px: float | None) -> Path:
+    """
+    Pick the smallest derivative of an icon that covers needed_px (longest side).
+
+    Falls back to the source icon when there are no up-to-date derivatives or
+    none is large enough. needed_px=None means the largest render size.
+    """
+    record = _load_index().get(icon_path.name)
+    if not record or not record["derivatives"]:
+        return icon_path
+    try:
+        stat = icon_path.stat()
+    except OSError:
+        return icon_path
+    if record["source_mtime"] != stat.st_mtime or record["source_size"] != stat.st_size:
+        return icon_path  # Source changed since the derivatives were built
+
+    if record["type"] == "svg":
+        candidate = DERIVED_DIR / record["derivatives"][0]["file"]
+        return candidate if candidate.exists() else icon_path
+
+    target = needed_px if needed_px is not None else record["max_px"]
+    for derivative in record["derivatives"]:
+        if derivative["max_px"] >= target:
+            candidate = DERIVED_DIR / derivative["file"]
+            return candidate if candidate.exists() else icon_path
+    return icon_path
+
+
+def backfill(max_px: int, force: bool = False) -> dict:
+    """
+    Build derivatives for every icon in icons/ that is missing or out of date.
+
+    Returns:
+        Dict with counts of built, skipped and failed icons
+    """
+    counts = {"built": 0, "skipped": 0, "failed": 0}
+    index = _load_index()
+    for icon_path in sorted(ICONS_DIR.iterdir()):
+        if not icon_path.is_file() or icon_path.suffix.lower() not in ICON_EXTENSIONS:
+            continue
+        record = index.get(icon_path.name)
+        stat = icon_path.stat()
+        if (not force and record and record["max_px"] == max_px
+                and record["source_mtime"] == stat.st_mtime and record["source_size"] == stat.st_size):
+            counts["skipped"] += 1
+            continue
+        try:
+            build_derivatives(icon_path, max_px)
+            counts["built"] += 1
+            logging.info("Built derivatives for %s", icon_path.name)
+        except Exception as e:
+            counts["failed"] += 1
+            logging.error("Failed to build derivatives for %s: %s", icon_path.name, e)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build render-ready icon derivatives")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if derivatives are up to date")
+    args = parser.parse_args()
+
+    # Imported here: image_generator imports this module
+    from image_generator import icon_max_px
+
+    max_px = icon_max_px()
+    logging.info("Largest icon size needed by any template: %d px", max_px)
+    counts = backfill(max_px, force=args.force)
+    logging.info("Completed: %d built, %d up to date, %d failed", counts["built"], counts["skipped"], counts["failed"])
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    raise SystemExit(main())
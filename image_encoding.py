@@ -0,0 +1,271 @@
+"""Image encoding utilities - derive resolution tiers from a single render.
+
+A product image is rendered once at the largest resolution any consumer
+needs, then every smaller tier (thumbnail, web, large) is derived here with
+Pillow from a single decode.
+
+Decoding, flattening, resizing and encoding are CPU-bound and hold the GIL,
+so they run as a shared encode stage on a process pool (ENCODE_WORKERS
+processes): encode() takes PNG bytes and EncodeSpecs and returns the encoded
+variants, so encoding spreads across cores while render slots keep Chromium
+busy. With ENCODE_WORKERS=0 variants are encoded in the calling process.
+If a worker process dies the pool is replaced and its pending encodes are
+retried once.
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from io import BytesIO
+
+from PIL import Image
+
+from config import ENCODE_TIMEOUT, ENCODE_WORKERS
+
+# Disable PIL decompression bomb check for large product images
+Image.MAX_IMAGE_PIXELS = None
+
+# Decoded layer backgrounds (see composite_layers): sha1 of PNG -> RGBA image.
+# One entry per template/scale in use; a large background is ~20 MB decoded.
+BACKGROUND_CACHE_SIZE = 8
+_backgrounds: OrderedDict[str, Image.Image] = OrderedDict()
+_backgrounds_lock = threading.Lock()
+
+# Named output tiers: longest side in pixels. The render is sized for the
+# largest tier requested, so there is no "native size" tier - callers that
+# want the template's own size render without a target instead.
+IMAGE_TIERS = {
+    "thumbnail": 300,
+    "web": 800,
+    "large": 2000,
+}
+
+
+def tier_max_dimension(tiers) -> int | None:
+    """Largest pixel size needed to satisfy all tiers (None if no tiers are given)."""
+    return max((IMAGE_TIERS[t] for t in tiers), default=None)
+
+
+def _flatten_to_rgb(img: Image.Image) -> Image.Image:
+    """Composite transparency onto white for formats without alpha."""
+    if img.mode == "RGBA":
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[3])
+        return background
+    if img.mode != "RGB":
+        return img.convert("RGB")
+    return img
+
+
+def _fit(img: Image.Image, max_dimension: int | None) -> Image.Image:
+    """Downscale so the longest side is at most max_dimension (never upscales)."""
+    if max_dimension is None or (img.width <= max_dimension and img.height <= max_dimension):
+        return img
+    ratio = min(max_dimension / img.width, max_dimension / img.height)
+    new_size = (max(1, int(img.width * ratio)), max(1, int(img.height * ratio)))
+    return img.resize(new_size, Image.LANCZOS)
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    buffer = BytesIO()
+    if fmt == "JPEG":
+        img.save(buffer, format="JPEG", quality=quality)
+    else:
+        img.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@dataclass(frozen=True)
+class EncodeSpec:
+    """One encoded variant of a rendered PNG."""
+    fmt: str = "PNG"  # 'PNG' or 'JPEG' (JPEG is flattened onto white)
+    max_dimension: int | None = None  # Longest side in pixels (None = native size)
+    quality: int = 95  # JPEG quality
+
+
+def encode_variants(png_bytes: bytes, specs: dict[str, EncodeSpec]) -> dict[str, bytes]:
+    """
+    Encode several variants of one PNG from a single decode, in this process.
+
+    Args:
+        png_bytes: Source PNG
+        specs: Variant name -> EncodeSpec
+
+    Returns:
+        Dict of variant name -> encoded image bytes
+    """
+    img = Image.open(BytesIO(png_bytes))
+    img.load()
+    # Per mode (as decoded / flattened): the smallest image resampled so far
+    sources = {"PNG": img}
+
+    results = {}
+    # Largest first, so each smaller variant is resampled from the closest larger one
+    ordered = sorted(specs, key=lambda name: specs[name].max_dimension or float("inf"), reverse=True)
+    for name in ordered:
+        spec = specs[name]
+        mode = "JPEG" if spec.fmt == "JPEG" else "PNG"
+        if mode not in sources:
+            sources[mode] = _flatten_to_rgb(sources["PNG"])
+        source = sources[mode] = _fit(sources[mode], spec.max_dimension)
+        if spec.fmt == "PNG" and source is img:
+            # Rendered at this size (or smaller) - no need to re-encode
+            results[name] = png_bytes
+        else:
+            results[name] = _encode(source, spec.fmt, spec.quality)
+    return results
+
+
+_encode_pool: ProcessPoolExecutor | None = None
+_encode_pool_lock = threading.Lock()
+
+
+def _get_encode_pool() -> ProcessPoolExecutor:
+    global _encode_pool
+    with _encode_pool_lock:
+        if _encode_pool is None:
+            # spawn, not fork: the parent runs browser, render and job threads
+            _encode_pool = ProcessPoolExecutor(max_workers=ENCODE_WORKERS,
+                                               mp_context=multiprocessing.get_context("spawn"))
+        return _encode_pool
+
+
+def _discard_encode_pool(pool: ProcessPoolExecutor):
+    """Drop a broken pool so the next submit starts a fresh one."""
+    global _encode_pool
+    with _encode_pool_lock:
+        if _encode_pool is pool:
+            _encode_pool = None
+
+
+def _submit_to_pool(result: Future, png_bytes: bytes, specs: dict[str, EncodeSpec], retries: int):
+    """Run encode_variants on the pool into result, retrying on a fresh pool if a worker dies."""
+    pool = _get_encode_pool()
+    try:
+        future = pool.submit(encode_variants, png_bytes, specs)
+    except BrokenProcessPool as e:
+        future = Future()
+        future.set_exception(e)
+
+    def done(future):
+        try:
+            result.set_result(future.result())
+        except BrokenProcessPool as e:
+            _discard_encode_pool(pool)
+            if retries > 0:
+                logging.warning(f"Encode worker died, retrying on a new pool: {e}")
+                _submit_to_pool(result, png_bytes, specs, retries - 1)
+            else:
+                result.set_exception(e)
+        except Exception as e:
+            result.set_exception(e)
+
+    future.add_done_callback(done)
+
+
+def submit_encode(png_bytes: bytes, specs: dict[str, EncodeSpec]) -> Future:
+    """Queue variants on the encode stage; the future resolves to a dict of variant name -> bytes."""
+    future = Future()
+    future.set_running_or_notify_cancel()
+    if ENCODE_WORKERS > 0:
+        _submit_to_pool(future, png_bytes, specs, retries=1)
+        return future
+    try:
+        future.set_result(encode_variants(png_bytes, specs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def encode(png_bytes: bytes, specs: dict[str, EncodeSpec]) -> dict[str, bytes]:
+    """Encode variants on the encode stage and wait for them (at most ENCODE_TIMEOUT seconds)."""
+    return submit_encode(png_bytes, specs).result(timeout=ENCODE_TIMEOUT)
+
+
+async def encode_async(png_bytes: bytes, specs: dict[str, EncodeSpec]) -> dict[str, bytes]:
+    """Async version of encode()."""
+    if ENCODE_WORKERS > 0:
+        return await asyncio.wait_for(asyncio.wrap_future(submit_encode(png_bytes, specs)), ENCODE_TIMEOUT)
+    return await asyncio.to_thread(encode_variants, png_bytes, specs)
+
+
+def to_jpeg(png_bytes: bytes, quality: int = 95, max_dimension: int | None = None) -> bytes:
+    """Encode one PNG as JPEG (flattened onto white) on the encode stage."""
+    return encode(png_bytes, {"jpeg": EncodeSpec("JPEG", max_dimension, quality)})["jpeg"]
+
+
+def tier_specs(tiers, fmt: str = "PNG", quality: int = 95) -> dict[str, EncodeSpec]:
+    """EncodeSpecs for IMAGE_TIERS tiers in one format."""
+    return {tier: EncodeSpec(fmt, IMAGE_TIERS[tier], quality) for tier in tiers}
+
+
+def derive_tiers(png_bytes: bytes, tiers, fmt: str = "PNG", quality: int = 95) -> dict[str, bytes]:
+    """
+    Derive several resolution tiers from one rendered PNG (on the encode stage).
+
+    Args:
+        png_bytes: Source PNG (rendered at or above the largest tier)
+        tiers: Tier names from IMAGE_TIERS
+        fmt: Output format, 'PNG' or 'JPEG' (JPEG is flattened onto white)
+        quality: JPEG quality
+
+    Returns:
+        Dict of tier name -> encoded image bytes
+    """
+    return encode(png_bytes, tier_specs(tiers, fmt, quality))
+
+
+async def derive_tiers_async(png_bytes: bytes, tiers, fmt: str = "PNG", quality: int = 95) -> dict[str, bytes]:
+    """Async version of derive_tiers()."""
+    return await encode_async(png_bytes, tier_specs(tiers, fmt, quality))
+
+
+def _decoded_background(png_bytes: bytes) -> Image.Image:
+    """Decode a background PNG to RGBA, reusing recently decoded backgrounds."""
+    key = hashlib.sha1(png_bytes).hexdigest()
+    with _backgrounds_lock:
+        img = _backgrounds.get(key)
+        if img is not None:
+            _backgrounds.move_to_end(key)
+            return img
+    img = Image.open(BytesIO(png_bytes))
+    mode = img.mode
+    img = img.convert("RGBA")
+    img.info["source_mode"] = mode
+    with _backgrounds_lock:
+        _backgrounds[key] = img
+        while len(_backgrounds) > BACKGROUND_CACHE_SIZE:
+            _backgrounds.popitem(last=False)
+    return img
+
+
+def composite_layers(background_png: bytes, overlay_png: bytes) -> bytes:
+    """
+    Alpha-composite a transparent overlay render onto a background render.
+
+    Both PNGs must come from SVGs with the same size and viewBox rendered at the
+    same scale. The result keeps the background's mode (RGB for opaque renders).
+    PNG compression is kept fast since most outputs are re-encoded downstream.
+
+    Args:
+        background_png: Rendered template background
+        overlay_png: Rendered product overlay (transparent)
+
+    Returns:
+        Composited PNG bytes
+    """
+    background = _decoded_background(background_png)
+    overlay = Image.open(BytesIO(overlay_png)).convert("RGBA")
+    if overlay.size != background.size:
+        raise ValueError(f"Layer size mismatch: background {background.size}, overlay {overlay.size}")
+    result = Image.alpha_composite(background, overlay)
+    if background.info.get("source_mode") == "RGB":
+        result = result.convert("RGB")
+    buffer = BytesIO()
+    result.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
@@ -2,13 +2,22 @@
 
 Uses Playwright for SVG rendering (replaces Inkscape dependency).
 """
+import asyncio
 import base64
+import copy
 import csv
+import hashlib
+import json
 import logging
+import os
+import re
+import threading
+import time
 import math
+from collections import OrderedDict
 from io import BytesIO
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
 from lxml import etree
@@ -17,9 +26,15 @@ from PIL import Image
 # Disable PIL decompression bomb check for large product images
 Image.MAX_IMAGE_PIXELS = None
 
-from svg_renderer import render_svg_to_bytes
+from svg_renderer import render_svgs_to_bytes, render_job, measure_svg_bbox, RenderJob, AsyncRenderer
 from r2_storage import upload_png_and_jpeg
-from jobs import Job
+from image_encoding import IMAGE_TIERS, derive_tiers, derive_tiers_async, tier_max_dimension
+from icon_derivatives import build_derivatives, select_derivative
+from template_compiler import compile_template
+from jobs import Job, resumable_job, run_subtasks
+from svg_splice import FragmentTemplate, namespace_key, serialise_children, split_root
+from config import ICON_CACHE_MAX_BYTES, RENDER_CACHE_DIR, RENDER_LAYERED, SVG_COMPOSE_ENGINE
+from priorities import Priority, priority_scope
 
 # Namespaces
 SVG_NS = "http://www.w3.org/2000/svg"
@@ -67,6 +82,26 @@ BASE_DIR = Path(__file__).parent
 ASSETS_DIR = BASE_DIR / "assets"
 ICONS_DIR = BASE_DIR / "icons"
 
+# Index of full-page bounding boxes for templates with content outside their
+# viewBox (peel_and_stick), keyed by template filename. Measured at runtime, so
+# it lives with the render cache rather than in the source tree.
+TEMPLATE_BBOX_INDEX = RENDER_CACHE_DIR / "template_bboxes.json"
+
+# Padding (user units) and output height (px) for full-page renders - these
+# match what svg_renderer does for full_page=True
+FULL_PAGE_PADDING = 5
+FULL_PAGE_HEIGHT_PX = 800
+
+# CSS pixels per SVG length unit (CSS reference pixel is 1/96 inch)
+CSS_PX_PER_UNIT = {
+    "": 1.0,
+    "px": 1.0,
+    "mm": 96 / 25.4,
+    "cm": 96 / 2.54,
+    "in": 96.0,
+    "pt": 96 / 72,
+}
+
 
 @dataclass
 class SignBounds:
@@ -114,32 +149,82 @@ class LayoutResult:
 
 
 # Layout bounds from CSV - reload on every app start
-LAYOUT_BOUNDS = {}
+LAYOUT_MODES_CSV = ASSETS_DIR / "layout_modes.csv"
+# How often (seconds) lookups check layout_modes.csv for changes
+LAYOUT_RELOAD_CHECK_INTERVAL = 2.0
 
-# Force reload on module import
-def _load_layout_bounds():
-    """Load layout bounding boxes from CSV file."""
-    global LAYOUT_BOUNDS
-    csv_path = ASSETS_DIR / "layout_modes.csv"
-    if not csv_path.exists():
-        return
-    
-    with open(csv_path, newline="", encoding="utf-8") as f:
+# (template, size, orientation, layout_mode) -> {element: bounds}, with main's
+# elements already merged under each template-specific entry
+_layout_index: dict[tuple[str, str, str, str], dict[str, dict]] = {}
+_layout_mtime: float | None = None
+_layout_checked_at = -math.inf  # First lookup always checks the file
+_layout_lock = threading.Lock()
+
+
+def _build_layout_index(csv_path: Path) -> dict[tuple[str, str, str, str], dict[str, dict]]:
+    """Parse layout_modes.csv into the lookup index, precomputing the main fallback."""
+    rows: dict[tuple[str, str, str, str], dict[str, dict]] = {}
+    # utf-8-sig: the CSV is saved with a byte order mark
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
         reader = csv.DictReader(f)
         for row in reader:
             key = (
-                row.get("template", "main"),
+                row.get("template") or "main",
                 row.get("size", ""),
-                row.get("orientation", "landscape"),
+                row.get("orientation") or "landscape",
                 row.get("layout_mode", ""),
-                row.get("element", ""),
             )
-            LAYOUT_BOUNDS[key] = {
+            rows.setdefault(key, {})[row.get("element", "")] = {
                 "x": float(row.get("x", 0)),
                 "y": float(row.get("y", 0)),
                 "width": float(row.get("width", 0)),
                 "height": float(row.get("height", 0)),
             }
+    
+    # Template-specific elements override main's, element by element
+    index = {}
+    for key, elements in rows.items():
+        if key[0] == "main":
+            index[key] = elements
+        else:
+            index[key] = {**rows.get(("main",) + key[1:], {}), **elements}
+    return index
+
+
+def reload_layout_index() -> int:
+    """Re-read layout_modes.csv now. Returns the number of layouts loaded."""
+    global _layout_index, _layout_mtime, _layout_checked_at
+    with _layout_lock:
+        try:
+            mtime = LAYOUT_MODES_CSV.stat().st_mtime
+        except OSError:
+            mtime = None
+        _layout_index = _build_layout_index(LAYOUT_MODES_CSV) if mtime is not None else {}
+        _layout_mtime = mtime
+        _layout_checked_at = time.monotonic()
+        return len(_layout_index)
+
+
+def _get_layout_bounds(template_type: str, size: str, orientation: str, layout_mode: str) -> dict[str, dict]:
+    """
+    CSV-defined element bounds for a layout (template-specific, falling back to main).
+    
+    The index is loaded once and reloaded when layout_modes.csv's mtime changes,
+    checked at most every LAYOUT_RELOAD_CHECK_INTERVAL seconds.
+    """
+    global _layout_checked_at
+    now = time.monotonic()
+    if now - _layout_checked_at > LAYOUT_RELOAD_CHECK_INTERVAL:
+        _layout_checked_at = now
+        try:
+            mtime = LAYOUT_MODES_CSV.stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime != _layout_mtime:
+            reload_layout_index()
+    return (_layout_index.get((template_type, size, orientation, layout_mode))
+            or _layout_index.get(("main", size, orientation, layout_mode))
+            or {})
 
 
 def _get_sign_bounds(size: str, orientation: str = "landscape", template_type: str = "main") -> SignBounds:
@@ -171,6 +256,106 @@ def _get_sign_bounds(size: str, orientation: str = "landscape", template_type: s
     )
 
 
+# Template files in assets/: {color}_{size}[_portrait]_{template_type}.svg
+TEMPLATE_TYPES = ("main", "dimensions", "peel_and_stick", "rear", "master_design_file")
+# Template types rendered as product images
+IMAGE_TEMPLATE_TYPES = ("main", "dimensions", "peel_and_stick", "rear")
+_TEMPLATE_FILENAME = re.compile(
+    r"^(?P<color>[a-z]+)_(?P<size>[a-z_]+?)(?P<portrait>_portrait)?_(?P<template_type>%s)\.svg$"
+    % "|".join(TEMPLATE_TYPES)
+)
+
+
+@dataclass(frozen=True)
+class TemplateInfo:
+    """A template SVG in assets/ with its page geometry and sign bounds."""
+    path: Path
+    color: str
+    size: str
+    orientation: str
+    template_type: str
+    view_box: tuple[float, float, float, float] | None
+    pixel_size: tuple[float, float] | None  # CSS pixels at scale=1
+    sign_bounds: SignBounds
+    
+    @property
+    def width_mm(self) -> float | None:
+        return self.pixel_size[0] / CSS_PX_PER_UNIT["mm"] if self.pixel_size else None
+    
+    @property
+    def height_mm(self) -> float | None:
+        return self.pixel_size[1] / CSS_PX_PER_UNIT["mm"] if self.pixel_size else None
+    
+    def pixels_at_dpi(self, dpi: float) -> int | None:
+        """Longest side in pixels of the template page at a print resolution."""
+        if not self.pixel_size:
+            return None
+        return round(max(self.width_mm, self.height_mm) / 25.4 * dpi)
+
+
+# (color, size, orientation, template_type) -> TemplateInfo, built from assets/ on first use
+_template_registry: dict[tuple[str, str, str, str], TemplateInfo] | None = None
+
+
+def _read_template_info(path: Path, color: str, size: str, orientation: str, template_type: str) -> TemplateInfo:
+    """Read a template's root geometry (only the first tag is parsed)."""
+    view_box = pixel_size = None
+    for _, root in etree.iterparse(str(path), events=("start",)):
+        values = (root.get("viewBox") or "").replace(",", " ").split()
+        if len(values) == 4:
+            view_box = tuple(float(v) for v in values)
+        pixel_size = _svg_pixel_size(root)
+        break
+    return TemplateInfo(
+        path=path,
+        color=color,
+        size=size,
+        orientation=orientation,
+        template_type=template_type,
+        view_box=view_box,
+        pixel_size=pixel_size,
+        sign_bounds=_get_sign_bounds(size, orientation, template_type),
+    )
+
+
+def reload_template_registry() -> int:
+    """Re-scan assets/ for templates. Returns the number of templates registered."""
+    global _template_registry, _icon_max_px
+    registry = {}
+    for path in sorted(ASSETS_DIR.glob("*.svg")):
+        match = _TEMPLATE_FILENAME.match(path.name)
+        if not match or match["color"] not in COLORS or match["size"] not in SIZES:
+            logging.warning(f"Ignoring unrecognised template file: {path.name}")
+            continue
+        orientation = "portrait" if match["portrait"] else "landscape"
+        key = (match["color"], match["size"], orientation, match["template_type"])
+        try:
+            registry[key] = _read_template_info(path, *key)
+        except (etree.XMLSyntaxError, ValueError) as e:
+            logging.error(f"Could not read template {path.name}: {e}")
+    _template_registry = registry
+    # Derived from the templates' sizes - recomputed on next use
+    _icon_max_px = None
+    return len(registry)
+
+
+def _get_template_registry() -> dict[tuple[str, str, str, str], TemplateInfo]:
+    """The template registry, scanning assets/ on first use."""
+    if _template_registry is None:
+        reload_template_registry()
+    return _template_registry
+
+
+def template_info(color: str, size: str, orientation: str, template_type: str) -> TemplateInfo | None:
+    """Registered template for a combination, or None if assets/ has no such file."""
+    return _get_template_registry().get((color, size, orientation, template_type))
+
+
+def template_registry() -> list[TemplateInfo]:
+    """All registered templates."""
+    return list(_get_template_registry().values())
+
+
 def _calculate_layout(
     bounds: SignBounds,
     layout_mode: str,
@@ -183,18 +368,13 @@ def _calculate_layout(
     template_type: str = "main",
 ) -> LayoutResult:
     """Calculate positions and sizes for icons and text based on layout mode."""
-    # Always reload CSV to pick up changes
-    _load_layout_bounds()
-    
     active_lines = [t for t in text_lines if t]
     
-    # Check CSV-defined bounds - try template-specific first, then fall back to main
-    icon_key = (template_type, size, orientation, layout_mode, "icon")
-    if icon_key not in LAYOUT_BOUNDS:
-        icon_key = ("main", size, orientation, layout_mode, "icon")
+    # Check CSV-defined bounds - template-specific first, then main
+    layout_bounds = _get_layout_bounds(template_type, size, orientation, layout_mode)
     
-    if icon_key in LAYOUT_BOUNDS:
-        icon_bounds = LAYOUT_BOUNDS[icon_key]
+    if "icon" in layout_bounds:
+        icon_bounds = layout_bounds["icon"]
         base_width = icon_bounds["width"]
         base_height = icon_bounds["height"]
         base_x = icon_bounds["x"]
@@ -207,11 +387,8 @@ def _calculate_layout(
         
         text_elements = []
         for idx, line in enumerate(active_lines):
-            text_key = (template_type, size, orientation, layout_mode, f"text_{idx + 1}")
-            if text_key not in LAYOUT_BOUNDS:
-                text_key = ("main", size, orientation, layout_mode, f"text_{idx + 1}")
-            if text_key in LAYOUT_BOUNDS:
-                tb = LAYOUT_BOUNDS[text_key]
+            tb = layout_bounds.get(f"text_{idx + 1}")
+            if tb:
                 num_chars = len(line) if line else 1
                 font_size = tb["width"] / (num_chars * 3.2)
                 max_by_height = tb["height"] / 3.0
@@ -286,8 +463,20 @@ def _calculate_layout(
     )
 
 
-def _load_icon(icon_filename: str) -> tuple[str, any]:
-    """Load an icon file (SVG or PNG)."""
+# Loaded icons: resolved path -> (mtime, size, icon type, icon data, cost in bytes),
+# least recently used first. Icons are 1.5-3.3 MB PNGs or SVGs of up to 2 MB and
+# every variant of a design uses the same ones.
+_icon_cache: OrderedDict[str, tuple[float, int, str, any, int]] = OrderedDict()
+_icon_cache_bytes = 0
+_icon_paths: dict[str, Path] = {}  # requested filename -> resolved path
+_icon_lock = threading.Lock()
+
+
+def _resolve_icon_path(icon_filename: str) -> Path | None:
+    """Find an icon file, trying alternative extensions if the exact name is missing."""
+    icon_path = _icon_paths.get(icon_filename)
+    if icon_path is not None and icon_path.exists():
+        return icon_path
     icon_path = ICONS_DIR / icon_filename
     if not icon_path.exists():
         # Try with different extensions
@@ -296,11 +485,14 @@ def _load_icon(icon_filename: str) -> tuple[str, any]:
             if alt_path.exists():
                 icon_path = alt_path
                 break
-    
     if not icon_path.exists():
-        logging.warning(f"Icon not found: {icon_filename}")
-        return None, None
-    
+        return None
+    _icon_paths[icon_filename] = icon_path
+    return icon_path
+
+
+def _read_icon(icon_path: Path) -> tuple[str, any]:
+    """Read an icon from disk: a parsed SVG root, or a base64 PNG payload with its size."""
     suffix = icon_path.suffix.lower()
     
     if suffix == ".svg":
@@ -310,53 +502,107 @@ def _load_icon(icon_filename: str) -> tuple[str, any]:
         with open(icon_path, "rb") as f:
             data = f.read()
         b64 = base64.b64encode(data).decode("ascii")
-        img = Image.open(icon_path)
+        img = Image.open(BytesIO(data))
         return "png", (b64, img.width, img.height, "image/png")
     
     return None, None
 
 
-def _inject_icon(root: etree._Element, icon_root: etree._Element, x: float, y: float, width: float, height: float):
-    """Inject an SVG icon into the template."""
-    icon_w = float(icon_root.get("width", "100").replace("mm", "").replace("px", ""))
-    icon_h = float(icon_root.get("height", "100").replace("mm", "").replace("px", ""))
+def _load_icon(icon_filename: str, needed_px: float | None = None, derived: bool = True) -> tuple[str, any]:
+    """
+    Load an icon file (SVG or PNG), cached in memory.
+    
+    Entries are keyed by resolved path and invalidated when the file's mtime or
+    size changes. The returned data is shared - callers must not modify it.
     
-    scale_x = width / icon_w if icon_w else 1
-    scale_y = height / icon_h if icon_h else 1
+    Args:
+        icon_filename: Icon filename in icons/
+        needed_px: Longest side the icon is drawn at, in pixels; picks the smallest
+            sufficient derivative (None = largest render size)
+        derived: If False, always load the original upload (for manufacturing files)
+    """
+    global _icon_cache_bytes
+    icon_path = _resolve_icon_path(icon_filename)
+    if icon_path is None:
+        logging.warning(f"Icon not found: {icon_filename}")
+        return None, None
+    if derived:
+        icon_path = select_derivative(icon_path, needed_px)
+    
+    key = str(icon_path)
+    stat = icon_path.stat()
+    with _icon_lock:
+        cached = _icon_cache.get(key)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            _icon_cache.move_to_end(key)
+            return cached[2], cached[3]
+    
+    icon_type, icon_data = _read_icon(icon_path)
+    if icon_type is None:
+        return None, None
+    # Parsed SVG trees take a few times their file size; the PNG payload is the b64 string
+    cost = stat.st_size * 3 if icon_type == "svg" else len(icon_data[0])
+    
+    with _icon_lock:
+        old = _icon_cache.pop(key, None)
+        if old:
+            _icon_cache_bytes -= old[4]
+        if cost <= ICON_CACHE_MAX_BYTES:
+            _icon_cache[key] = (stat.st_mtime, stat.st_size, icon_type, icon_data, cost)
+            _icon_cache_bytes += cost
+            while _icon_cache_bytes > ICON_CACHE_MAX_BYTES:
+                _, evicted = _icon_cache.popitem(last=False)
+                _icon_cache_bytes -= evicted[4]
+    return icon_type, icon_data
+
+
+def _fit_box(item_w: float, item_h: float, x: float, y: float, width: float, height: float) -> tuple:
+    """Scale an item to fit a box, centered: (offset_x, offset_y, scale, scaled_w, scaled_h)."""
+    scale_x = width / item_w if item_w else 1
+    scale_y = height / item_h if item_h else 1
     scale = min(scale_x, scale_y)
     
-    scaled_w = icon_w * scale
-    scaled_h = icon_h * scale
+    scaled_w = item_w * scale
+    scaled_h = item_h * scale
     offset_x = x + (width - scaled_w) / 2
     offset_y = y + (height - scaled_h) / 2
+    return offset_x, offset_y, scale, scaled_w, scaled_h
+
+
+def _svg_icon_size(icon_root: etree._Element) -> tuple[float, float]:
+    """Nominal width and height of an SVG icon (unit suffixes ignored)."""
+    icon_w = float(icon_root.get("width", "100").replace("mm", "").replace("px", ""))
+    icon_h = float(icon_root.get("height", "100").replace("mm", "").replace("px", ""))
+    return icon_w, icon_h
+
+
+def _icon_children(icon_root: etree._Element):
+    """Drawable children of an SVG icon (no defs, editor views, metadata or comments)."""
+    for child in icon_root:
+        # Skip non-element nodes (comments, processing instructions)
+        if not isinstance(child.tag, str):
+            continue
+        if etree.QName(child).localname not in ("defs", "namedview", "metadata"):
+            yield child
+
+
+def _inject_icon(root: etree._Element, icon_root: etree._Element, x: float, y: float, width: float, height: float):
+    """Inject an SVG icon into the template."""
+    offset_x, offset_y, scale, _, _ = _fit_box(*_svg_icon_size(icon_root), x, y, width, height)
     
     icon_group = etree.SubElement(root, f"{{{SVG_NS}}}g")
     icon_group.set("id", "injected_icon")
     icon_group.set("transform", f"translate({offset_x},{offset_y}) scale({scale})")
     
-    for child in icon_root:
-        # Skip non-element nodes (comments, processing instructions)
-        if not isinstance(child.tag, str):
-            continue
-        tag_local = etree.QName(child).localname
-        if tag_local not in ("defs", "namedview", "metadata"):
-            # Deep copy the child to avoid modifying the original
-            import copy
-            icon_group.append(copy.deepcopy(child))
+    for child in _icon_children(icon_root):
+        # Deep copy the child to avoid modifying the original
+        icon_group.append(copy.deepcopy(child))
 
 
 def _inject_png_icon(root: etree._Element, png_data: tuple, x: float, y: float, width: float, height: float):
     """Inject a PNG icon as embedded image."""
     b64_data, orig_w, orig_h, mime = png_data
-    
-    scale_x = width / orig_w if orig_w else 1
-    scale_y = height / orig_h if orig_h else 1
-    scale = min(scale_x, scale_y)
-    
-    scaled_w = orig_w * scale
-    scaled_h = orig_h * scale
-    offset_x = x + (width - scaled_w) / 2
-    offset_y = y + (height - scaled_h) / 2
+    offset_x, offset_y, _, scaled_w, scaled_h = _fit_box(orig_w, orig_h, x, y, width, height)
     
     img_elem = etree.SubElement(root, f"{{{SVG_NS}}}image")
     img_elem.set("x", str(offset_x))
@@ -366,6 +612,49 @@ def _inject_png_icon(root: etree._Element, png_data: tuple, x: float, y: float,
     img_elem.set(f"{{{XLINK_NS}}}href", f"data:{mime};base64,{b64_data}")
 
 
+# Icon markup for the splice engine, serialised once per icon and namespace context:
+# (id(icon data), namespace key) -> (icon data, fragment). Holding the icon data keeps
+# its id from being reused while the entry exists.
+ICON_FRAGMENT_CACHE_SIZE = 64
+_icon_fragments: OrderedDict[tuple, tuple[any, FragmentTemplate]] = OrderedDict()
+_icon_fragments_lock = threading.Lock()
+
+
+def _icon_fragment(root: etree._Element, icon_type: str, icon_data) -> FragmentTemplate:
+    """
+    Markup of an injected icon as it serialises inside root, with placeholders
+    for its placement: 'transform' for SVG icons, x/y/width/height for PNGs.
+    """
+    key = (id(icon_data), namespace_key(root))
+    with _icon_fragments_lock:
+        cached = _icon_fragments.get(key)
+        if cached and cached[0] is icon_data:
+            _icon_fragments.move_to_end(key)
+            return cached[1]
+    
+    if icon_type == "svg":
+        def build(context):
+            icon_group = etree.SubElement(context, f"{{{SVG_NS}}}g")
+            icon_group.set("id", "injected_icon")
+            icon_group.set("transform", "{transform}")
+            for child in _icon_children(icon_data):
+                icon_group.append(copy.deepcopy(child))
+        fragment = FragmentTemplate(serialise_children(root, build), ("transform",))
+    else:
+        def build(context):
+            img_elem = etree.SubElement(context, f"{{{SVG_NS}}}image")
+            for attr in ("x", "y", "width", "height"):
+                img_elem.set(attr, "{" + attr + "}")
+            img_elem.set(f"{{{XLINK_NS}}}href", f"data:{icon_data[3]};base64,{icon_data[0]}")
+        fragment = FragmentTemplate(serialise_children(root, build), ("x", "y", "width", "height"))
+    
+    with _icon_fragments_lock:
+        _icon_fragments[key] = (icon_data, fragment)
+        while len(_icon_fragments) > ICON_FRAGMENT_CACHE_SIZE:
+            _icon_fragments.popitem(last=False)
+    return fragment
+
+
 def _add_text_element(root: etree._Element, text: str, x: float, y: float, font_size: float, 
                       anchor: str = "middle", font_family: str = "Arial", font_weight: str = "bold"):
     """Add a text element to the SVG."""
@@ -376,377 +665,850 @@ def _add_text_element(root: etree._Element, text: str, x: float, y: float, font_
     text_elem.text = text
 
 
-def generate_product_image(product: dict, template_type: str = "main") -> bytes:
+# Parsed templates: (path, compiled) -> (mtime, size, root). Templates are 0.5-1.5 MB,
+# mostly an embedded base64 texture, so parsing them on every render is expensive.
+_template_cache: dict[tuple[str, bool], tuple[float, int, etree._Element]] = {}
+_template_lock = threading.Lock()
+
+
+def _load_template(template_path: Path, compiled: bool = False) -> etree._Element:
     """
-    Generate a product image from template.
+    Return a private copy of a template's root element.
     
-    Args:
-        product: Product dict from database
-        template_type: 'main', 'dimensions', 'peel_and_stick', 'rear'
+    Each template is parsed once per process and re-parsed only when its file
+    changes (mtime/size). Callers get a deep copy they are free to modify.
     
-    Returns:
-        PNG image as bytes
+    Args:
+        template_path: Template SVG path
+        compiled: If True, embedded textures are externalised to the renderer's
+            asset store (see template_compiler) - use for rendering only, never
+            for SVGs that leave the process
     """
-    size = product.get("size", "saville").lower()
-    color = product.get("color", "silver").lower()
-    orientation = product.get("orientation", "landscape").lower()
-    layout_mode = product.get("layout_mode", "A").upper()
-    icon_files = (product.get("icon_files") or "").split(",")
-    icon_files = [f.strip() for f in icon_files if f.strip()]
-    
-    text_lines = [
-        product.get("text_line_1", ""),
-        product.get("text_line_2", ""),
-        product.get("text_line_3", ""),
-    ]
-    
-    icon_scale = float(product.get("icon_scale", 1.0) or 1.0)
-    text_scale = float(product.get("text_scale", 1.0) or 1.0)
-    icon_offset_x = float(product.get("icon_offset_x", 0.0) or 0.0)
-    icon_offset_y = float(product.get("icon_offset_y", 0.0) or 0.0)
-    font = product.get("font", "arial_heavy")
-    
-    # Build template filename
-    if size == "baby_jesus" and orientation == "portrait":
-        template_name = f"{color}_{size}_portrait_{template_type}.svg"
-    else:
-        template_name = f"{color}_{size}_{template_type}.svg"
-    
-    template_path = ASSETS_DIR / template_name
-    if not template_path.exists():
-        raise FileNotFoundError(f"Template not found: {template_path}")
-    
-    # Parse template
-    tree = etree.parse(str(template_path))
-    root = tree.getroot()
-    
-    # For 'rear' template type, do NOT inject icons or text - just render the template as-is
-    # The rear image shows the 3M adhesive backing without any product graphics
-    if template_type == "rear":
-        svg_content = etree.tostring(root, encoding="unicode")
-        png_bytes = render_svg_to_bytes(svg_content, scale=1)
-        return png_bytes
-    
-    # For 'peel_and_stick' template, render with transparency to show full template graphics
-    # (EASY text, arrow, PEEL & STICK text) - these are part of the SVG template
-    render_transparent = (template_type == "peel_and_stick")
-    
-    # Get bounds and calculate layout (pass template_type for proper bounds lookup)
-    bounds = _get_sign_bounds(size, orientation, template_type)
-    layout = _calculate_layout(
-        bounds, layout_mode, len(icon_files), text_lines,
-        icon_scale, text_scale, size, orientation, template_type
-    )
+    key = (str(template_path), compiled)
+    stat = template_path.stat()
+    with _template_lock:
+        cached = _template_cache.get(key)
+    if cached is None or cached[0] != stat.st_mtime or cached[1] != stat.st_size:
+        root = etree.parse(key[0]).getroot()
+        if compiled:
+            compile_template(root)
+        cached = (stat.st_mtime, stat.st_size, root)
+        with _template_lock:
+            _template_cache[key] = cached
+    return copy.deepcopy(cached[2])
+
+
+# Serialised product-independent templates: path -> (mtime, size, svg, root)
+_static_templates: dict[str, tuple[float, int, str, etree._Element]] = {}
+
+
+def _static_template(template_path: Path) -> tuple[str, etree._Element]:
+    """
+    Compiled SVG text and root of a template rendered without product changes.
     
-    # Apply QA position offsets to icon position
-    final_icon_x = layout.icon_x + icon_offset_x
-    final_icon_y = layout.icon_y + icon_offset_y
-    
-    # Inject icons
-    for icon_file in icon_files:
-        icon_type, icon_data = _load_icon(icon_file)
-        if icon_type == "svg":
-            _inject_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
-        elif icon_type == "png":
-            _inject_png_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
-    
-    # Add text elements
-    font_family, font_weight = FONTS.get(font, ("Arial", "bold"))
-    for text_elem in layout.text_elements:
-        _add_text_element(
-            root, text_elem["text"], text_elem["x"], text_elem["y"],
-            text_elem["font_size"], text_elem.get("anchor", "middle"),
-            font_family, font_weight
-        )
+    Compiled templates carry no editor metadata, so templates that render the
+    same serialise identically and share one render cache entry. The root is
+    shared - callers must not modify it.
+    """
+    key = str(template_path)
+    stat = template_path.stat()
+    cached = _static_templates.get(key)
+    if cached is None or cached[0] != stat.st_mtime or cached[1] != stat.st_size:
+        root = _load_template(template_path, compiled=True)
+        cached = (stat.st_mtime, stat.st_size, etree.tostring(root, encoding="unicode"), root)
+        _static_templates[key] = cached
+    return cached[2], cached[3]
+
+
+# Templates split for the splice engine: (path, full-page bbox) -> (mtime, size, head, tail, root)
+_splice_templates: dict[tuple, tuple[float, int, str, str, etree._Element]] = {}
+
+
+def _splice_template(template_path: Path, bbox: dict | None = None) -> tuple[str, str, etree._Element]:
+    """
+    Compiled template serialised once and split around the injection point.
+
+    Icons and text are appended after the template's own content, so a product
+    SVG is head + fragments + tail (see svg_splice). The root is shared and only
+    used for measurements - callers must not modify it.
+
+    Args:
+        template_path: Template SVG path
+        bbox: Full-page bbox to bake into the root (peel_and_stick), or None
+    """
+    key = (str(template_path), tuple(sorted(bbox.items())) if bbox else None)
+    stat = template_path.stat()
+    cached = _splice_templates.get(key)
+    if cached is None or cached[0] != stat.st_mtime or cached[1] != stat.st_size:
+        root = _load_template(template_path, compiled=True)
+        if bbox:
+            _apply_full_page_viewbox(root, bbox)
+        head, tail = split_root(root)
+        cached = (stat.st_mtime, stat.st_size, head, tail, root)
+        _splice_templates[key] = cached
+    return cached[2], cached[3], cached[4]
+
+
+def _parse_length_px(value: str | None) -> float | None:
+    """Convert an SVG length attribute (e.g. '159.4mm') to CSS pixels."""
+    if not value:
+        return None
+    value = value.strip()
+    number = value.rstrip("abcdefghijklmnopqrstuvwxyz%")
+    unit = value[len(number):]
+    if unit not in CSS_PX_PER_UNIT:
+        return None
+    try:
+        return float(number) * CSS_PX_PER_UNIT[unit]
+    except ValueError:
+        return None
+
+
+def _svg_pixel_size(root: etree._Element) -> tuple[float, float] | None:
+    """Rendered size of an SVG root in CSS pixels at scale=1, from width/height or viewBox."""
+    width = _parse_length_px(root.get("width"))
+    height = _parse_length_px(root.get("height"))
+    if width and height:
+        return width, height
+    viewbox = (root.get("viewBox") or "").replace(",", " ").split()
+    if len(viewbox) == 4:
+        return float(viewbox[2]), float(viewbox[3])
+    return None
+
+
+def _scale_for_size(size: tuple[float, float] | None, target_px: int | None) -> float:
+    """
+    Device scale factor that renders size (CSS pixels) with a longest side of target_px.
     
-    # Convert to string and render
-    svg_content = etree.tostring(root, encoding="unicode")
-    # For peel_and_stick, use full_page to capture elements outside viewBox (EASY, arrow, PEEL & STICK text)
-    use_full_page = (template_type == "peel_and_stick")
-    png_bytes = render_svg_to_bytes(svg_content, scale=1, transparent=render_transparent, full_page=use_full_page)
+    Element screenshots are clipped to whole CSS pixels, so the longest side is
+    rounded up before dividing. The scale may be fractional or below 1, so the
+    render comes out at the requested size without a resize pass.
+    """
+    if not target_px or not size:
+        return 1
+    return target_px / math.ceil(max(size))
+
+
+def _scale_for_target(root: etree._Element, target_px: int | None) -> float:
+    """Device scale factor whose render has a longest side of target_px (see _scale_for_size)."""
+    return _scale_for_size(_svg_pixel_size(root), target_px)
+
+
+_bbox_lock = threading.Lock()
+_bbox_index: dict | None = None
+# One lock per template filename, so each template is measured once even when
+# many renders ask for it at the same time
+_bbox_measure_locks: dict[str, threading.Lock] = {}
+# Templates that could not be measured: (path, mtime, size) -> monotonic time of
+# the failure. Not persisted; retried after BBOX_RETRY_INTERVAL seconds
+_bbox_failures: dict[tuple[str, float, int], float] = {}
+BBOX_RETRY_INTERVAL = 600
+
+
+def _px_per_user_unit(root: etree._Element) -> float:
+    """CSS pixels per SVG user unit at scale=1."""
+    size = _svg_pixel_size(root)
+    viewbox = (root.get("viewBox") or "").replace(",", " ").split()
+    if not size or len(viewbox) != 4 or not float(viewbox[2]):
+        return 1.0
+    return size[0] / float(viewbox[2])
+
+
+def _icon_render_px(root: etree._Element, layout: LayoutResult, scale: float) -> float:
+    """Longest side in device pixels of the icon box when root is rendered at scale."""
+    return max(layout.icon_width, layout.icon_height) * _px_per_user_unit(root) * scale
+
+
+_icon_max_px: int | None = None
+
+
+def icon_max_px() -> int:
+    """
+    Largest icon size in pixels any template needs at the highest export tier.
     
-    return png_bytes
+    An icon never renders larger than its sign, so this is the longest side of
+    the biggest template when rendered for the largest IMAGE_TIERS size.
+    """
+    global _icon_max_px
+    if _icon_max_px is None:
+        target_px = tier_max_dimension(IMAGE_TIERS)
+        largest = target_px
+        for info in template_registry():
+            if info.pixel_size:
+                scale = _scale_for_size(info.pixel_size, target_px)
+                largest = max(largest, round(math.ceil(max(info.pixel_size)) * scale))
+        _icon_max_px = largest
+    return _icon_max_px
+
+
+def build_icon_derivatives(icon_path: Path) -> dict:
+    """Generate render-ready derivatives for an uploaded icon (see icon_derivatives)."""
+    return build_derivatives(icon_path, icon_max_px())
 
 
-def generate_product_image_preview(product: dict) -> bytes:
+def _load_bbox_index() -> dict:
+    """Load the template bbox sidecar index (once per process)."""
+    global _bbox_index
+    if _bbox_index is None:
+        try:
+            with open(TEMPLATE_BBOX_INDEX, encoding="utf-8") as f:
+                _bbox_index = json.load(f)
+        except (OSError, ValueError):
+            _bbox_index = {}
+    return _bbox_index
+
+
+def _save_bbox_index():
+    """Write the template bbox sidecar index atomically."""
+    tmp_path = TEMPLATE_BBOX_INDEX.with_suffix(".json.tmp")
+    try:
+        TEMPLATE_BBOX_INDEX.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_bbox_index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, TEMPLATE_BBOX_INDEX)
+    except OSError as e:
+        logging.warning(f"Could not save template bbox index: {e}")
+
+
+def _get_template_bbox(template_path: Path) -> dict | None:
     """
-    Generate a low-resolution preview image for thumbnails.
-    Uses scale=1 instead of scale=4 for faster rendering.
+    Get the bounding box of all content in a template, measuring it once.
+    
+    The result is stored in the index keyed by filename and validated against
+    a hash of the template file, so it is only re-measured when the template
+    changes. Returns None (callers fall back to a full_page render) if the
+    template cannot be measured; the failure is remembered for the unchanged
+    file, so it is not re-read and re-measured on every compose.
     """
-    size = product.get("size", "saville").lower()
-    color = product.get("color", "silver").lower()
-    orientation = product.get("orientation", "landscape").lower()
-    layout_mode = product.get("layout_mode", "A").upper()
-    icon_files = (product.get("icon_files") or "").split(",")
-    icon_files = [f.strip() for f in icon_files if f.strip()]
-    
-    text_lines = [
-        product.get("text_line_1", ""),
-        product.get("text_line_2", ""),
-        product.get("text_line_3", ""),
-    ]
-    
-    icon_scale = float(product.get("icon_scale", 1.0) or 1.0)
-    text_scale = float(product.get("text_scale", 1.0) or 1.0)
-    icon_offset_x = float(product.get("icon_offset_x", 0.0) or 0.0)
-    icon_offset_y = float(product.get("icon_offset_y", 0.0) or 0.0)
-    font = product.get("font", "arial_heavy")
-    
-    # Build template filename
-    if size == "baby_jesus" and orientation == "portrait":
-        template_name = f"{color}_{size}_portrait_main.svg"
-    else:
-        template_name = f"{color}_{size}_main.svg"
+    with _bbox_lock:
+        measure_lock = _bbox_measure_locks.setdefault(template_path.name, threading.Lock())
+    
+    # Check and measure under the template's own lock: concurrent callers wait for
+    # the first measurement instead of repeating it, other templates are not blocked
+    with measure_lock:
+        with _bbox_lock:
+            index = _load_bbox_index()
+            entry = index.get(template_path.name)
+            stat = template_path.stat()
+            failure_key = (str(template_path), stat.st_mtime, stat.st_size)
+            failed_at = _bbox_failures.get(failure_key)
+            if failed_at is not None and time.monotonic() - failed_at < BBOX_RETRY_INTERVAL:
+                return None
+            if entry and entry.get("mtime") == stat.st_mtime and entry.get("bytes") == stat.st_size:
+                return entry["bbox"]
+            
+            template_bytes = template_path.read_bytes()
+            digest = hashlib.sha256(template_bytes).hexdigest()
+            if entry and entry.get("sha256") == digest:
+                # Same content, just touched (e.g. fresh checkout) - refresh the stat fields
+                entry.update(mtime=stat.st_mtime, bytes=stat.st_size)
+                _save_bbox_index()
+                return entry["bbox"]
+        
+        # A browser round trip - only this template's lock is held
+        try:
+            bbox = measure_svg_bbox(template_bytes.decode("utf-8"))
+        except Exception as e:
+            logging.warning(f"Could not measure bbox of {template_path.name}: {e}")
+            bbox = None
+        if not bbox or bbox["width"] <= 0 or bbox["height"] <= 0:
+            with _bbox_lock:
+                _bbox_failures[failure_key] = time.monotonic()
+            return None
+        
+        with _bbox_lock:
+            _bbox_failures.pop(failure_key, None)
+            _bbox_index[template_path.name] = {
+                "sha256": digest,
+                "mtime": stat.st_mtime,
+                "bytes": stat.st_size,
+                "bbox": bbox,
+            }
+            _save_bbox_index()
+        return bbox
+
+
+def _apply_full_page_viewbox(root: etree._Element, bbox: dict):
+    """Bake a full-page viewBox into the SVG root so it renders in a single pass."""
+    padding = FULL_PAGE_PADDING
+    aspect = bbox["width"] / bbox["height"] if bbox["height"] > 0 else 1
+    out_height = FULL_PAGE_HEIGHT_PX
+    out_width = out_height * aspect
+    root.set("viewBox", f"{bbox['x'] - padding} {bbox['y'] - padding} {bbox['width'] + padding * 2} {bbox['height'] + padding * 2}")
+    root.set("width", f"{out_width}px")
+    root.set("height", f"{out_height}px")
+
+
+@dataclass
+class ProductRenderPlan:
+    """
+    A product's artwork, resolved once and shared by every output.
     
-    template_path = ASSETS_DIR / template_name
-    if not template_path.exists():
-        raise FileNotFoundError(f"Template not found: {template_path}")
+    Product fields are parsed once, layouts are computed once per template type
+    and icons come from the icon cache, so main, dimensions, peel_and_stick,
+    rear, preview, transparent and master-SVG outputs are all produced from one
+    plan. Generator functions accept either a plan or a product dict.
+    """
+    m_number: str
+    size: str
+    color: str
+    orientation: str
+    layout_mode: str
+    icon_files: list[str]
+    text_lines: list[str]
+    icon_scale: float = 1.0
+    text_scale: float = 1.0
+    icon_offset_x: float = 0.0
+    icon_offset_y: float = 0.0
+    font: str = "arial_heavy"
+    _layouts: dict[str, LayoutResult] = field(default_factory=dict, repr=False)
+    
+    @classmethod
+    def from_product(cls, product: "dict | ProductRenderPlan") -> "ProductRenderPlan":
+        """Build a plan from a product dict (a plan is returned unchanged)."""
+        if isinstance(product, cls):
+            return product
+        icon_files = (product.get("icon_files") or "").split(",")
+        return cls(
+            m_number=product.get("m_number", ""),
+            size=product.get("size", "saville").lower(),
+            color=product.get("color", "silver").lower(),
+            orientation=product.get("orientation", "landscape").lower(),
+            layout_mode=product.get("layout_mode", "A").upper(),
+            icon_files=[f.strip() for f in icon_files if f.strip()],
+            text_lines=[
+                product.get("text_line_1", ""),
+                product.get("text_line_2", ""),
+                product.get("text_line_3", ""),
+            ],
+            icon_scale=float(product.get("icon_scale", 1.0) or 1.0),
+            text_scale=float(product.get("text_scale", 1.0) or 1.0),
+            icon_offset_x=float(product.get("icon_offset_x", 0.0) or 0.0),
+            icon_offset_y=float(product.get("icon_offset_y", 0.0) or 0.0),
+            font=product.get("font", "arial_heavy"),
+        )
     
-    # Parse template
-    tree = etree.parse(str(template_path))
-    root = tree.getroot()
+    def template_orientation(self) -> str:
+        """Orientation of the templates this product uses (only baby_jesus has portrait ones in use)."""
+        return "portrait" if self.size == "baby_jesus" and self.orientation == "portrait" else "landscape"
     
-    # Get bounds and calculate layout
-    bounds = _get_sign_bounds(size, orientation)
-    layout = _calculate_layout(
-        bounds, layout_mode, len(icon_files), text_lines,
-        icon_scale, text_scale, size, orientation, "main"
-    )
+    def template_path(self, template_type: str = "main") -> Path:
+        """Template file for this product's color/size/orientation."""
+        if self.template_orientation() == "portrait":
+            template_name = f"{self.color}_{self.size}_portrait_{template_type}.svg"
+        else:
+            template_name = f"{self.color}_{self.size}_{template_type}.svg"
+        return ASSETS_DIR / template_name
+    
+    def template(self, template_type: str = "main") -> TemplateInfo | None:
+        """Registered template for a template type, or None if there is none."""
+        return template_info(self.color, self.size, self.template_orientation(), template_type)
+    
+    def missing_templates(self, template_types=IMAGE_TEMPLATE_TYPES) -> list[str]:
+        """Filenames of templates this product needs that are not in assets/."""
+        return [self.template_path(t).name for t in template_types if self.template(t) is None]
+    
+    def layout(self, template_type: str = "main") -> LayoutResult:
+        """Icon and text layout for a template type (computed once per type)."""
+        layout = self._layouts.get(template_type)
+        if layout is None:
+            # Sign bounds are recorded per template (peel_and_stick has its own)
+            template = self.template(template_type)
+            if template is not None:
+                bounds = template.sign_bounds
+            else:
+                bounds = _get_sign_bounds(self.size, self.orientation, template_type)
+            layout = _calculate_layout(
+                bounds, self.layout_mode, len(self.icon_files), self.text_lines,
+                self.icon_scale, self.text_scale, self.size, self.orientation, template_type
+            )
+            self._layouts[template_type] = layout
+        return layout
     
-    # Apply QA position offsets to icon position
-    final_icon_x = layout.icon_x + icon_offset_x
-    final_icon_y = layout.icon_y + icon_offset_y
-    
-    # Inject icons
-    for icon_file in icon_files:
-        icon_type, icon_data = _load_icon(icon_file)
-        if icon_type == "svg":
-            _inject_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
-        elif icon_type == "png":
-            _inject_png_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
-    
-    # Add text elements
-    font_family, font_weight = FONTS.get(font, ("Arial", "bold"))
-    for text_elem in layout.text_elements:
-        _add_text_element(
-            root, text_elem["text"], text_elem["x"], text_elem["y"],
-            text_elem["font_size"], text_elem.get("anchor", "middle"),
-            font_family, font_weight
+    def decorate(self, root: etree._Element, template_type: str = "main",
+                 icon_px: float | None = None, derived: bool = True):
+        """
+        Inject the product's icons and text into a template root (in place).
+        
+        Args:
+            root: Template root element
+            template_type: Layout to use
+            icon_px: Pixel size the icon box renders at (picks the icon derivative)
+            derived: If False, embed the original icon uploads
+        """
+        layout = self.layout(template_type)
+        
+        # Apply QA position offsets to icon position
+        final_icon_x = layout.icon_x + self.icon_offset_x
+        final_icon_y = layout.icon_y + self.icon_offset_y
+        
+        # Inject icons
+        for icon_file in self.icon_files:
+            icon_type, icon_data = _load_icon(icon_file, icon_px, derived=derived)
+            if icon_type == "svg":
+                _inject_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
+            elif icon_type == "png":
+                _inject_png_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
+        
+        # Add text elements
+        font_family, font_weight = FONTS.get(self.font, ("Arial", "bold"))
+        for text_elem in layout.text_elements:
+            _add_text_element(
+                root, text_elem["text"], text_elem["x"], text_elem["y"],
+                text_elem["font_size"], text_elem.get("anchor", "middle"),
+                font_family, font_weight
+            )
+
+    def markup(self, root: etree._Element, template_type: str = "main", icon_px: float | None = None) -> list[str]:
+        """
+        Serialised icons and text that decorate() would append to root.
+        
+        Icon markup comes from the fragment cache; only placements are filled in
+        per product. Joined between split_root(root) they give the same SVG as
+        decorate() followed by etree.tostring().
+        """
+        layout = self.layout(template_type)
+        final_icon_x = layout.icon_x + self.icon_offset_x
+        final_icon_y = layout.icon_y + self.icon_offset_y
+        
+        pieces = []
+        for icon_file in self.icon_files:
+            icon_type, icon_data = _load_icon(icon_file, icon_px)
+            if icon_type == "svg":
+                offset_x, offset_y, scale, _, _ = _fit_box(
+                    *_svg_icon_size(icon_data), final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
+                pieces += _icon_fragment(root, icon_type, icon_data).fill(
+                    f"translate({offset_x},{offset_y}) scale({scale})")
+            elif icon_type == "png":
+                offset_x, offset_y, _, scaled_w, scaled_h = _fit_box(
+                    icon_data[1], icon_data[2], final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
+                pieces += _icon_fragment(root, icon_type, icon_data).fill(
+                    str(offset_x), str(offset_y), str(scaled_w), str(scaled_h))
+        
+        # Text elements are tiny - build them with lxml for exact escaping
+        if layout.text_elements:
+            font_family, font_weight = FONTS.get(self.font, ("Arial", "bold"))
+            
+            def build(context):
+                for text_elem in layout.text_elements:
+                    _add_text_element(
+                        context, text_elem["text"], text_elem["x"], text_elem["y"],
+                        text_elem["font_size"], text_elem.get("anchor", "middle"),
+                        font_family, font_weight
+                    )
+            pieces.append(serialise_children(root, build))
+        return pieces
+
+    def compose(self, template_type: str = "main", target_px: int = None, layered: bool = None,
+                engine: str = None, dpi: float = None) -> RenderJob:
+        """
+        Compose the product SVG for a template type, ready for rendering.
+        
+        Args:
+            template_type: 'main', 'dimensions', 'peel_and_stick', 'rear'
+            target_px: Longest side of the render in pixels (default: scale=1)
+            layered: Compose a layered job - the bare template as background plus an
+                icon/text overlay - instead of one SVG (default: RENDER_LAYERED)
+            engine: 'splice' or 'lxml' (default: SVG_COMPOSE_ENGINE); both produce
+                identical SVGs
+            dpi: Render at this print resolution of the template's physical size
+                instead of target_px
+        
+        Returns:
+            RenderJob with the composed SVG and its render options
+        """
+        template = self.template(template_type)
+        if template is None:
+            raise FileNotFoundError(f"Template not found: {self.template_path(template_type)}")
+        template_path = template.path
+        if dpi:
+            target_px = template.pixels_at_dpi(dpi)
+        
+        # For 'rear' template type, do NOT inject icons or text - just render the template as-is
+        # The rear image shows the 3M adhesive backing without any product graphics.
+        # It is the same for every product, so it is serialised and rendered once.
+        if template_type == "rear":
+            svg_content, root = _static_template(template_path)
+            return RenderJob(svg_content, scale=_scale_for_target(root, target_px), static=True)
+        
+        # For 'peel_and_stick' template, render with transparency to show full template graphics
+        # (EASY text, arrow, PEEL & STICK text) - these are part of the SVG template
+        render_transparent = (template_type == "peel_and_stick")
+        
+        # For peel_and_stick, capture elements outside viewBox (EASY, arrow, PEEL & STICK text).
+        # The template's full-page bbox is measured once and baked in here, falling back
+        # to the renderer's in-browser measurement if it could not be precomputed.
+        bbox = _get_template_bbox(template_path) if template_type == "peel_and_stick" else None
+        use_full_page = template_type == "peel_and_stick" and not bbox
+        
+        splice = (SVG_COMPOSE_ENGINE if engine is None else engine) == "splice"
+        if splice:
+            # Serialised once per template; the product's markup is joined in as strings
+            head, tail, root = _splice_template(template_path, bbox)
+        else:
+            # Load template (parsed once per process, copied per render)
+            root = _load_template(template_path, compiled=True)
+            if bbox:
+                _apply_full_page_viewbox(root, bbox)
+        
+        scale = _scale_for_target(root, target_px)
+        # Pixel size the icon box renders at, to pick the smallest sufficient icon derivative
+        icon_px = None if use_full_page else _icon_render_px(root, self.layout(template_type), scale)
+        
+        # Icons and text are drawn on top of everything in the template, so they can be
+        # rendered as a separate overlay and composited over the template's own render.
+        # Not for in-browser full-page measurement, where the overlay would change the bbox.
+        if (RENDER_LAYERED if layered is None else layered) and not use_full_page:
+            background = head + tail if splice else etree.tostring(root, encoding="unicode")
+            overlay = _overlay_root(root, self.text_lines)
+            pieces = self.markup(overlay, template_type, icon_px) if splice else None
+            if pieces:
+                overlay_head, overlay_tail = split_root(overlay)
+                svg_content = "".join([overlay_head, *pieces, overlay_tail])
+            else:
+                if not splice:
+                    self.decorate(overlay, template_type, icon_px)
+                svg_content = etree.tostring(overlay, encoding="unicode")
+            return RenderJob(svg_content, scale=scale, transparent=render_transparent, background=background)
+        
+        if splice:
+            svg_content = "".join([head, *self.markup(root, template_type, icon_px), tail])
+        else:
+            self.decorate(root, template_type, icon_px)
+            # Convert to string
+            svg_content = etree.tostring(root, encoding="unicode")
+        return RenderJob(svg_content, scale=scale, transparent=render_transparent, full_page=use_full_page,
+                         static=self.is_blank())
+    
+    def design_key(self) -> tuple:
+        """Everything that shapes the product overlay - equal for color variants of one design."""
+        return (
+            self.size, self.orientation, self.layout_mode, tuple(self.icon_files), tuple(self.text_lines),
+            self.icon_scale, self.text_scale, self.icon_offset_x, self.icon_offset_y, self.font,
         )
     
-    # Convert to string and render at LOW resolution (scale=1)
-    svg_content = etree.tostring(root, encoding="unicode")
-    png_bytes = render_svg_to_bytes(svg_content, scale=1, transparent=False, full_page=False)
+    def is_blank(self) -> bool:
+        """True if the product injects nothing (no icons or text) into its templates."""
+        return not self.icon_files and not any(self.text_lines)
     
-    return png_bytes
+    def master_svg(self) -> bytes:
+        """Master design SVG (embedded textures and original icons) for manufacturing."""
+        # Fall back to main template if master doesn't exist
+        template = self.template("master_design_file") or self.template("main")
+        if template is None:
+            raise FileNotFoundError(f"Template not found: {self.template_path('main')}")
+        
+        # Load template (parsed once per process, copied per render)
+        root = _load_template(template.path)
+        
+        # Full-resolution original icons - this file is used for manufacturing
+        self.decorate(root, "main", derived=False)
+        
+        # Return SVG as bytes
+        return etree.tostring(root, encoding="utf-8", xml_declaration=True)
 
 
-def generate_transparent_product_image(product: dict) -> bytes:
+# Root attributes that affect how a product overlay renders
+_OVERLAY_ROOT_ATTRS = ("width", "height", "viewBox", "preserveAspectRatio")
+_XML_SPACE = "{http://www.w3.org/XML/1998/namespace}space"
+
+
+def _overlay_root(root: etree._Element, text_lines: list[str]) -> etree._Element:
     """
-    Generate a transparent PNG of the main product image.
-    Used for lifestyle image compositing.
+    Empty root with a template's page geometry, to draw a product overlay on.
     
-    This uses the actual main template and renders it with transparency,
-    so the product looks exactly like the main image but with transparent background.
+    Icons and text never reference the template's defs, so only the size and
+    viewBox are carried over. That keeps the overlay independent of the template's
+    color: silver, gold and white variants of a design share one overlay render.
+    """
+    overlay = etree.Element(f"{{{SVG_NS}}}svg", nsmap=NSMAP)
+    for attr in _OVERLAY_ROOT_ATTRS:
+        if root.get(attr) is not None:
+            overlay.set(attr, root.get(attr))
+    # xml:space only changes text whose whitespace would otherwise be collapsed
+    if root.get(_XML_SPACE) and any(line != " ".join(line.split()) for line in text_lines):
+        overlay.set(_XML_SPACE, root.get(_XML_SPACE))
+    return overlay
+
+
+def _compose_product_svg(product: "dict | ProductRenderPlan", template_type: str = "main",
+                         target_px: int = None, layered: bool = None, dpi: float = None) -> RenderJob:
+    """Compose the product SVG for a template type (see ProductRenderPlan.compose)."""
+    return ProductRenderPlan.from_product(product).compose(template_type, target_px, layered, dpi=dpi)
+
+
+def generate_product_image(product: "dict | ProductRenderPlan", template_type: str = "main",
+                           target_px: int = None, dpi: float = None) -> bytes:
+    """
+    Generate a product image from template.
     
     Args:
-        product: Product dict from database
+        product: Product dict from database (or its ProductRenderPlan)
+        template_type: 'main', 'dimensions', 'peel_and_stick', 'rear'
+        target_px: Longest side of the image in pixels (default: the template's CSS size)
+        dpi: Render the template's physical size at this resolution instead
     
     Returns:
-        PNG image with transparency as bytes
+        PNG image as bytes
     """
-    # Use the main template but render with transparency
-    # This ensures the lifestyle image looks like the actual product
-    size = product.get("size", "saville").lower()
-    color = product.get("color", "silver").lower()
-    orientation = product.get("orientation", "landscape").lower()
-    layout_mode = product.get("layout_mode", "A").upper()
-    icon_files = (product.get("icon_files") or "").split(",")
-    icon_files = [f.strip() for f in icon_files if f.strip()]
-    
-    text_lines = [
-        product.get("text_line_1", ""),
-        product.get("text_line_2", ""),
-        product.get("text_line_3", ""),
-    ]
-    
-    icon_scale = float(product.get("icon_scale", 1.0) or 1.0)
-    text_scale = float(product.get("text_scale", 1.0) or 1.0)
-    icon_offset_x = float(product.get("icon_offset_x", 0.0) or 0.0)
-    icon_offset_y = float(product.get("icon_offset_y", 0.0) or 0.0)
-    font = product.get("font", "arial_heavy")
-    
-    # Load the main template (same as generate_product_image with template_type="main")
-    # Build template filename using same logic as generate_product_image
-    if size == "baby_jesus" and orientation == "portrait":
-        template_name = f"{color}_{size}_portrait_main.svg"
-    else:
-        template_name = f"{color}_{size}_main.svg"
+    job = _compose_product_svg(product, template_type, target_px, dpi=dpi)
+    return render_job(job)
+
+
+def generate_product_image_tiers(product: "dict | ProductRenderPlan", template_type: str = "main", tiers=("thumbnail", "web", "large"),
+                                 fmt: str = "PNG", quality: int = 95) -> dict[str, bytes]:
+    """
+    Render a product image once and derive several resolution tiers from it.
     
-    template_path = ASSETS_DIR / template_name
-    if not template_path.exists():
-        raise FileNotFoundError(f"Template not found: {template_path}")
+    The SVG is rendered directly at the largest requested tier's size; smaller
+    tiers are downscaled from that single render.
     
-    tree = etree.parse(str(template_path))
-    root = tree.getroot()
+    Args:
+        product: Product dict from database (or its ProductRenderPlan)
+        template_type: 'main', 'dimensions', 'peel_and_stick', 'rear'
+        tiers: Tier names from image_encoding.IMAGE_TIERS
+        fmt: Output format, 'PNG' or 'JPEG'
+        quality: JPEG quality
     
-    # Get bounds and calculate layout
-    bounds = _get_sign_bounds(size, orientation)
-    layout = _calculate_layout(
-        bounds, layout_mode, len(icon_files), text_lines,
-        icon_scale, text_scale, size, orientation, "main"
-    )
+    Returns:
+        Dict of tier name -> image bytes
+    """
+    job = _compose_product_svg(product, template_type, target_px=tier_max_dimension(tiers))
+    png_bytes = render_job(job)
+    return derive_tiers(png_bytes, tiers, fmt=fmt, quality=quality)
+
+
+async def generate_product_image_async(product: "dict | ProductRenderPlan", template_type: str, renderer: AsyncRenderer,
+                                      target_px: int = None, dpi: float = None) -> bytes:
+    """
+    Async counterpart of generate_product_image for streaming pipelines.
     
-    # Apply QA position offsets
-    final_icon_x = layout.icon_x + icon_offset_x
-    final_icon_y = layout.icon_y + icon_offset_y
-    
-    # Inject icons
-    for icon_file in icon_files:
-        icon_type, icon_data = _load_icon(icon_file)
-        if icon_type == "svg":
-            _inject_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
-        elif icon_type == "png":
-            _inject_png_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
-    
-    # Add text elements
-    font_family, font_weight = FONTS.get(font, ("Arial", "bold"))
-    for text_elem in layout.text_elements:
-        _add_text_element(
-            root, text_elem["text"], text_elem["x"], text_elem["y"],
-            text_elem["font_size"], text_elem.get("anchor", "middle"),
-            font_family, font_weight
-        )
+    Composition runs in a worker thread and rendering on the given AsyncRenderer,
+    so many products can be in flight on one event loop.
+    """
+    job = await asyncio.to_thread(_compose_product_svg, product, template_type, target_px, None, dpi)
+    return await renderer.render_job(job)
+
+
+async def generate_product_image_tiers_async(product: "dict | ProductRenderPlan", template_type: str, renderer: AsyncRenderer,
+                                             tiers=("thumbnail", "web", "large"),
+                                             fmt: str = "PNG", quality: int = 95) -> dict[str, bytes]:
+    """Async counterpart of generate_product_image_tiers (see generate_product_image_async)."""
+    job = await asyncio.to_thread(_compose_product_svg, product, template_type, tier_max_dimension(tiers))
+    png_bytes = await renderer.render_job(job)
+    return await derive_tiers_async(png_bytes, tiers, fmt, quality)
+
+
+def generate_product_image_preview(product: "dict | ProductRenderPlan") -> bytes:
+    """
+    Generate a low-resolution preview image for thumbnails.
+    Uses scale=1 instead of scale=4 for faster rendering.
+    Rendered at interactive priority, ahead of bulk exports.
+    """
+    job = _compose_product_svg(product, "main")
+    with priority_scope(Priority.INTERACTIVE):
+        return render_job(job)
+
+
+def generate_transparent_product_image(product: "dict | ProductRenderPlan", target_px: int = None) -> bytes:
+    """
+    Generate a transparent PNG of the main product image.
+    Used for lifestyle image compositing.
+    
+    This uses the actual main template and renders it with transparency,
+    so the product looks exactly like the main image but with transparent background.
     
-    # Render to PNG with transparency
-    svg_content = etree.tostring(root, encoding="unicode")
-    png_bytes = render_svg_to_bytes(svg_content, scale=1, transparent=True)
+    Args:
+        product: Product dict from database (or its ProductRenderPlan)
+        target_px: Longest side of the image in pixels (default: the template's CSS size)
     
-    return png_bytes
+    Returns:
+        PNG image with transparency as bytes
+    """
+    job = _compose_product_svg(product, "main", target_px)
+    job.transparent = True
+    return render_job(job)
 
 
-def generate_all_images_for_product(product: dict) -> dict[str, bytes]:
-    """Generate all image types for a product."""
+def generate_all_images_for_product(product: "dict | ProductRenderPlan", target_px: int = None,
+                                    dpi: float = None) -> dict[str, bytes]:
+    """
+    Generate all image types for a product in a single render batch, from one render plan.
+    
+    Each image is rendered at target_px (longest side) or at dpi of its template's
+    physical size; by default at the template's CSS size.
+    """
+    plan = ProductRenderPlan.from_product(product)
     images = {}
     template_types = ["main", "dimensions", "peel_and_stick", "rear"]
     
+    composed = []
     for template_type in template_types:
         try:
-            images[template_type] = generate_product_image(product, template_type)
+            composed.append((template_type, plan.compose(template_type, target_px, dpi=dpi)))
         except FileNotFoundError as e:
-            logging.warning(f"Template not found for {product['m_number']}: {e}")
+            logging.warning(f"Template not found for {plan.m_number}: {e}")
         except Exception as e:
-            logging.error(f"Error generating {template_type} for {product['m_number']}: {e}")
+            logging.error(f"Error generating {template_type} for {plan.m_number}: {e}")
+    
+    results = render_svgs_to_bytes([job for _, job in composed])
+    for (template_type, _), result in zip(composed, results):
+        if isinstance(result, Exception):
+            logging.error(f"Error generating {template_type} for {plan.m_number}: {result}")
+        else:
+            images[template_type] = result
     
     return images
 
 
-def generate_master_svg_for_product(product: dict) -> bytes:
+def generate_variant_images(products: list, template_types=("main", "dimensions", "peel_and_stick", "rear"),
+                            target_px: int = None) -> dict[str, dict[str, bytes]]:
     """
-    Generate the master design SVG file for a product.
-    This is the SVG with icons and text injected, used for manufacturing.
+    Render color variants of designs together in one layered batch.
+    
+    Products sharing a design (same artwork, size and orientation - e.g. the
+    silver/gold/white SKUs the QA "approve all colors" flow keeps in sync) get
+    identical overlays, so each overlay is rendered once per design family and
+    composited onto every color's cached template background.
     
     Args:
-        product: Product dict from database
+        products: Product dicts or ProductRenderPlans
+        template_types: Image types to render
+        target_px: Longest side of each render in pixels (default: scale=1)
     
     Returns:
-        SVG content as bytes
+        Dict of m_number -> {template_type: PNG bytes} (failed images are omitted)
     """
-    size = product.get("size", "saville").lower()
-    color = product.get("color", "silver").lower()
-    orientation = product.get("orientation", "landscape").lower()
-    layout_mode = product.get("layout_mode", "A").upper()
-    icon_files = (product.get("icon_files") or "").split(",")
-    icon_files = [f.strip() for f in icon_files if f.strip()]
-    
-    text_lines = [
-        product.get("text_line_1", ""),
-        product.get("text_line_2", ""),
-        product.get("text_line_3", ""),
-    ]
-    
-    icon_scale = float(product.get("icon_scale", 1.0) or 1.0)
-    text_scale = float(product.get("text_scale", 1.0) or 1.0)
-    icon_offset_x = float(product.get("icon_offset_x", 0.0) or 0.0)
-    icon_offset_y = float(product.get("icon_offset_y", 0.0) or 0.0)
-    font = product.get("font", "arial_heavy")
-    
-    # Use master_design_file template
-    if size == "baby_jesus" and orientation == "portrait":
-        template_name = f"{color}_{size}_portrait_master_design_file.svg"
-    else:
-        template_name = f"{color}_{size}_master_design_file.svg"
-    
-    template_path = ASSETS_DIR / template_name
-    if not template_path.exists():
-        # Fall back to main template if master doesn't exist
-        if size == "baby_jesus" and orientation == "portrait":
-            template_name = f"{color}_{size}_portrait_main.svg"
+    plans = [ProductRenderPlan.from_product(product) for product in products]
+    
+    composed = []
+    for plan in plans:
+        for template_type in template_types:
+            try:
+                composed.append((plan.m_number, template_type, plan.compose(template_type, target_px, layered=True)))
+            except FileNotFoundError as e:
+                logging.warning(f"Template not found for {plan.m_number}: {e}")
+            except Exception as e:
+                logging.error(f"Error generating {template_type} for {plan.m_number}: {e}")
+    
+    families = len({plan.design_key() for plan in plans})
+    overlays = len({job.svg_content for _, _, job in composed if job.background is not None})
+    logging.info(f"Variant batch: {len(plans)} products in {families} design families, "
+                 f"{overlays} distinct overlays for {len(composed)} images")
+    
+    images = {plan.m_number: {} for plan in plans}
+    results = render_svgs_to_bytes([job for _, _, job in composed])
+    for (m_number, template_type, _), result in zip(composed, results):
+        if isinstance(result, Exception):
+            logging.error(f"Error generating {template_type} for {m_number}: {result}")
         else:
-            template_name = f"{color}_{size}_main.svg"
-        template_path = ASSETS_DIR / template_name
+            images[m_number][template_type] = result
     
-    if not template_path.exists():
-        raise FileNotFoundError(f"Template not found: {template_path}")
+    return images
+
+
+def variant_families(products: list) -> list[list]:
+    """Group products into design families (color variants of one design), keeping input order."""
+    families: dict[tuple, list] = {}
+    for product in products:
+        families.setdefault(ProductRenderPlan.from_product(product).design_key(), []).append(product)
+    return list(families.values())
+
+
+def validate_products(products: list, template_types=IMAGE_TEMPLATE_TYPES) -> dict:
+    """
+    Check a batch against the template registry before rendering anything.
     
-    # Parse template
-    tree = etree.parse(str(template_path))
-    root = tree.getroot()
+    Args:
+        products: Product dicts or ProductRenderPlans
+        template_types: Template types the batch will render
     
-    # Get bounds and calculate layout
-    bounds = _get_sign_bounds(size, orientation)
-    layout = _calculate_layout(
-        bounds, layout_mode, len(icon_files), text_lines,
-        icon_scale, text_scale, size, orientation
-    )
+    Returns:
+        Dict with 'checked' and 'ok' counts, 'missing' (m_number -> missing template
+        filenames) and 'invalid' (m_number -> error, e.g. an unknown size or color)
+    """
+    report = {"checked": len(products), "ok": 0, "missing": {}, "invalid": {}}
+    for product in products:
+        m_number = product.m_number if isinstance(product, ProductRenderPlan) else product.get("m_number", "")
+        if not isinstance(product, ProductRenderPlan):
+            missing_fields = [name for name in ("size", "color") if name in product and not product[name]]
+            if missing_fields:
+                report["invalid"][m_number] = f"Missing {' and '.join(missing_fields)}"
+                continue
+        try:
+            plan = ProductRenderPlan.from_product(product)
+        except (AttributeError, TypeError, ValueError) as e:
+            # e.g. a non-string field (None has no .lower())
+            report["invalid"][m_number] = f"{type(e).__name__}: {e}"
+            continue
+        if plan.size not in SIZES:
+            report["invalid"][m_number] = f"Unknown size: {plan.size}"
+        elif plan.color not in COLORS:
+            report["invalid"][m_number] = f"Unknown color: {plan.color}"
+        elif missing := plan.missing_templates(template_types):
+            report["missing"][m_number] = missing
+        else:
+            report["ok"] += 1
+    return report
+
+
+def generate_product_image_previews(products: list[dict]) -> dict[str, bytes]:
+    """
+    Generate low-resolution preview images for many products in one render batch.
+    Used to fill the QA grid without one renderer round trip per thumbnail.
+    Rendered at interactive priority, ahead of bulk exports.
     
-    # Apply QA position offsets to icon position
-    final_icon_x = layout.icon_x + icon_offset_x
-    final_icon_y = layout.icon_y + icon_offset_y
-    
-    # Inject icons
-    for icon_file in icon_files:
-        icon_type, icon_data = _load_icon(icon_file)
-        if icon_type == "svg":
-            _inject_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
-        elif icon_type == "png":
-            _inject_png_icon(root, icon_data, final_icon_x, final_icon_y, layout.icon_width, layout.icon_height)
-    
-    # Add text elements
-    font_family, font_weight = FONTS.get(font, ("Arial", "bold"))
-    for text_elem in layout.text_elements:
-        _add_text_element(
-            root, text_elem["text"], text_elem["x"], text_elem["y"],
-            text_elem["font_size"], text_elem.get("anchor", "middle"),
-            font_family, font_weight
-        )
+    Args:
+        products: List of product dicts
+    
+    Returns:
+        Dict of m_number -> PNG bytes (products that failed are omitted)
+    """
+    composed = []
+    for product in products:
+        try:
+            composed.append((product["m_number"], _compose_product_svg(product, "main")))
+        except Exception as e:
+            logging.warning(f"Could not compose preview for {product.get('m_number')}: {e}")
+    
+    previews = {}
+    with priority_scope(Priority.INTERACTIVE):
+        results = render_svgs_to_bytes([job for _, job in composed])
+    for (m_number, _), result in zip(composed, results):
+        if isinstance(result, Exception):
+            logging.warning(f"Preview render failed for {m_number}: {result}")
+        else:
+            previews[m_number] = result
     
-    # Return SVG as bytes
-    return etree.tostring(root, encoding="utf-8", xml_declaration=True)
+    return previews
 
 
-def generate_images_job(job: Job, products: list[dict], upload_to_r2: bool = True) -> dict:
+def generate_master_svg_for_product(product: "dict | ProductRenderPlan") -> bytes:
     """
-    Background job to generate images for multiple products.
+    Generate the master design SVG file for a product.
+    This is the SVG with icons and text injected, used for manufacturing.
     
     Args:
-        job: Job object for progress updates
-        products: List of product dicts
-        upload_to_r2: Whether to upload to R2 storage
+        product: Product dict from database (or its ProductRenderPlan)
     
     Returns:
-        Dict with results per product
+        SVG content as bytes
     """
-    job.total = len(products)
-    results = {}
+    return ProductRenderPlan.from_product(product).master_svg()
+
+
+def _generate_batch_images(batch: list[dict], upload_to_r2: bool, missing_templates: dict) -> dict:
+    """Render (and optionally upload) one product, or one variant family in layered mode."""
+    if RENDER_LAYERED:
+        batch_images = generate_variant_images(batch)
+    else:
+        batch_images = {batch[0]["m_number"]: generate_all_images_for_product(batch[0])}
     
-    for i, product in enumerate(products):
+    results = {}
+    for product in batch:
         m_number = product["m_number"]
-        job.message = f"Generating images for {m_number}..."
-        job.progress = i
-        
         try:
-            images = generate_all_images_for_product(product)
+            images = batch_images.get(m_number, {})
             
             if upload_to_r2 and images:
                 urls = {}
@@ -757,10 +1519,72 @@ def generate_images_job(job: Job, products: list[dict], upload_to_r2: bool = Tru
                 results[m_number] = {"success": True, "urls": urls}
             else:
                 results[m_number] = {"success": True, "images": len(images)}
+            if m_number in missing_templates:
+                results[m_number]["missing_templates"] = missing_templates[m_number]
                 
         except Exception as e:
             logging.error(f"Failed to generate images for {m_number}: {e}")
             results[m_number] = {"success": False, "error": str(e)}
+    return results
+
+
+@resumable_job
+def generate_images_job(job: Job, products: list[dict], upload_to_r2: bool = True) -> dict:
+    """
+    Background job to generate images for multiple products.
+    
+    Each product (variant family in layered mode) is checkpointed once all its
+    images are generated, so a resumed job only redoes the rest.
+    
+    Args:
+        job: Job object for progress updates
+        products: List of product dicts
+        upload_to_r2: Whether to upload to R2 storage
+    
+    Returns:
+        Dict with results per product
+    """
+    job.total = len(products)
+    results = {}
+    
+    # Surface template problems for the whole batch up front. Products that cannot
+    # render anything are failed here; partially covered ones render what exists.
+    report = validate_products(products)
+    if report["missing"] or report["invalid"]:
+        logging.warning(f"Template check: {len(report['invalid'])} invalid products, "
+                        f"{len(report['missing'])} with missing templates: "
+                        f"{ {**report['invalid'], **report['missing']} }")
+    renderable = []
+    for product in products:
+        m_number = product["m_number"]
+        missing = report["missing"].get(m_number, [])
+        if m_number in report["invalid"]:
+            results[m_number] = {"success": False, "error": report["invalid"][m_number]}
+        elif len(missing) == len(IMAGE_TEMPLATE_TYPES):
+            results[m_number] = {"success": False, "error": f"Missing templates: {', '.join(missing)}"}
+        else:
+            renderable.append(product)
+    
+    # In layered mode, color variants of a design are rendered as one batch so they share overlays.
+    # Batches run as parallel subtasks, so every render slot is kept busy.
+    batches = variant_families(renderable) if RENDER_LAYERED else [[product] for product in renderable]
+    job.progress = len(products) - len(renderable)
+    
+    outcomes = run_subtasks(
+        job, batches,
+        lambda batch: _generate_batch_images(batch, upload_to_r2, report["missing"]),
+        weight=len,
+        describe=lambda batch: f"Generated images for {', '.join(p['m_number'] for p in batch)}",
+        key=lambda batch: ",".join(p["m_number"] for p in batch),
+        done=lambda outcome: all(result["success"] for result in outcome.values()),
+    )
+    for batch, outcome in zip(batches, outcomes):
+        if isinstance(outcome, Exception):
+            for product in batch:
+                logging.error(f"Failed to generate images for {product['m_number']}: {outcome}")
+                results[product["m_number"]] = {"success": False, "error": str(outcome)}
+        else:
+            results.update(outcome)
     
     job.progress = job.total
     job.message = f"Completed {len(products)} products"
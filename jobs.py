@@ -1,23 +1,75 @@
 """Background job system for long-running tasks.
 
 Uses threading with a job queue for multi-user support.
-Jobs are tracked in the database so users can see progress.
+Jobs are tracked in the database (the batches table) so users can see progress
+from any web worker or process, and after a restart.
+
+A job runs in the process that submitted it. While it runs, its progress,
+message and final result are written through to the database; processes that
+do not own a job read it from there. Each process heartbeats the jobs it owns,
+so jobs whose process died (restart, crash, OOM kill) are marked as failed
+instead of showing as running forever.
+
+Batch jobs checkpoint each item they finish in the job_items table (see
+run_subtasks). A job can be cancelled while pending or running - it stops
+between items - and a failed or cancelled job of a registered job function
+(see resumable_job) can be resumed: it runs again with the same arguments and
+skips the items that are already done.
+
+Jobs are queued by priority class (see priorities.py): interactive jobs run
+before queued bulk ones, and a job's subtasks and renders are queued at its
+priority.
 """
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import socket
 import threading
+import time
 import uuid
 import traceback
-from datetime import datetime
-from queue import Queue
+from concurrent.futures import Future, as_completed
+from datetime import datetime, timedelta
 from typing import Callable, Any
 from dataclasses import dataclass, field
 from enum import Enum
 
+from config import JOB_SUBTASK_WORKERS, JOB_WORKERS
+from models import Batch, JobItem
+from priorities import Priority, PriorityWorkQueue, priority_scope
+
 
 class JobStatus(Enum):
     PENDING = "pending"
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job whose cancellation was requested (see Job.check_cancelled)."""
+
+
+# Seconds between progress writes while a job runs (status changes are always written)
+PROGRESS_SAVE_INTERVAL = 1.0
+# Seconds between heartbeats for the jobs this process owns
+HEARTBEAT_INTERVAL = 30
+# An unfinished job without a heartbeat for this long belongs to a dead process
+JOB_STALE_AFTER = timedelta(minutes=3)
+# How many jobs the job list shows
+JOB_LIST_LIMIT = 100
+# Statuses a job can be resumed from
+RESUMABLE_STATUSES = (JobStatus.FAILED, JobStatus.CANCELLED)
+
+# job_items statuses
+ITEM_DONE = "done"
+ITEM_FAILED = "failed"
+
+# This process, as recorded on the jobs it runs
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
 
 
 @dataclass
@@ -33,13 +85,154 @@ class Job:
     created_at: datetime = field(default_factory=datetime.now)
     started_at: datetime = None
     completed_at: datetime = None
+    worker: str = None
+    func: str = None  # Registered job function reference, if the job can be resumed
+    cancel_requested: bool = False
+    priority: Priority = Priority.BULK
+    # Progress write-through, enabled while this process runs the job
+    _tracked: bool = field(default=False, repr=False, compare=False)
+    _saved_at: float = field(default=0.0, repr=False, compare=False)
+    _cancel_checked_at: float = field(default=0.0, repr=False, compare=False)
+    
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in ("progress", "total", "message") and getattr(self, "_tracked", False):
+            now = time.monotonic()
+            if now - self._saved_at >= PROGRESS_SAVE_INTERVAL:
+                self._saved_at = now
+                _save(self, "progress", "total", "message")
+    
+    def check_cancelled(self):
+        """
+        Raise JobCancelled if the job's cancellation was requested.
+        
+        Jobs call this between items. Requests made through another process are
+        picked up from the database (read at most every PROGRESS_SAVE_INTERVAL).
+        """
+        if not self.cancel_requested:
+            now = time.monotonic()
+            if now - self._cancel_checked_at >= PROGRESS_SAVE_INTERVAL:
+                self._cancel_checked_at = now
+                try:
+                    row = Batch.get(self.id)
+                    self.cancel_requested = bool(row and row.get("cancel_requested"))
+                except Exception as e:
+                    logging.warning(f"Could not check job {self.id} for cancellation: {e}")
+        if self.cancel_requested:
+            raise JobCancelled(f"Job {self.id} was cancelled")
 
 
-# In-memory job storage (for simplicity - could use Redis for production)
+# Jobs owned by this process (for simplicity - the database is the shared view)
 _jobs: dict[str, Job] = {}
-_job_queue: Queue = Queue()
+_job_queue = PriorityWorkQueue()
 _workers_started = False
-_num_workers = 2
+_num_workers = JOB_WORKERS
+
+# Per-item subtasks of batch jobs (see run_subtasks), shared by all jobs in the
+# process: items are (future, func, item)
+_subtask_queue = PriorityWorkQueue()
+_subtask_workers_started = False
+_subtask_workers_lock = threading.Lock()
+
+# Job functions whose jobs can be resumed, by reference ("module.function")
+_job_functions: dict[str, Callable] = {}
+
+
+def _timestamp(value: datetime | None) -> str | None:
+    return value.isoformat() if value else None
+
+
+def _parse_timestamp(value) -> datetime | None:
+    """Database timestamps come back as datetimes (PostgreSQL) or ISO strings (SQLite)."""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _column(job: Job, name: str):
+    """A job attribute as stored in its batches row."""
+    value = getattr(job, name)
+    if name == "status":
+        return value.value
+    if name == "result":
+        return json.dumps(value, default=str) if value is not None else None
+    if name.endswith("_at"):
+        return _timestamp(value)
+    return value
+
+
+def _save(job: Job, *fields: str):
+    """Write job fields to the database. Failures are logged, never raised into the job."""
+    data = {name: _column(job, name) for name in fields}
+    data["updated_at"] = _timestamp(datetime.now())
+    try:
+        Batch.update(job.id, data)
+    except Exception as e:
+        logging.warning(f"Could not save job {job.id}: {e}")
+
+
+def _job_from_row(row: dict) -> Job:
+    """Rebuild a Job from its batches row."""
+    result = row.get("result")
+    if result is not None:
+        try:
+            result = json.loads(result)
+        except ValueError:
+            pass
+    return Job(
+        id=row["job_id"],
+        name=row.get("name") or "",
+        status=JobStatus(row.get("status") or JobStatus.PENDING.value),
+        progress=row.get("progress") or 0,
+        total=row.get("total") or 0,
+        message=row.get("message") or "",
+        result=result,
+        error=row.get("error"),
+        created_at=_parse_timestamp(row.get("created_at")),
+        started_at=_parse_timestamp(row.get("started_at")),
+        completed_at=_parse_timestamp(row.get("completed_at")),
+        worker=row.get("worker"),
+        func=row.get("func"),
+        cancel_requested=bool(row.get("cancel_requested")),
+        priority=_parse_priority(row.get("priority")),
+    )
+
+
+def _parse_priority(value: str | None) -> Priority:
+    """Priority stored on a batches row (its lowercase name); rows without one are bulk."""
+    try:
+        return Priority[value.upper()] if value else Priority.BULK
+    except KeyError:
+        logging.warning(f"Unknown job priority {value!r}, using bulk")
+        return Priority.BULK
+
+
+def _function_ref(func: Callable) -> str:
+    return f"{func.__module__}.{func.__qualname__}"
+
+
+def resumable_job(func: Callable) -> Callable:
+    """
+    Register a job function so its failed or cancelled jobs can be resumed.
+    
+    The job's arguments are stored with it, so they must be JSON-serialisable.
+    A resumable job should checkpoint its items (see run_subtasks' key) so a
+    resumed run skips the work that is already done.
+    """
+    _job_functions[_function_ref(func)] = func
+    return func
+
+
+def _job_function(ref: str | None) -> Callable | None:
+    """A registered job function, importing its module if this process has not yet."""
+    if not ref:
+        return None
+    if ref not in _job_functions:
+        try:
+            importlib.import_module(ref.rsplit(".", 1)[0])
+        except ImportError as e:
+            logging.warning(f"Could not import job function {ref}: {e}")
+    return _job_functions.get(ref)
 
 
 def _worker():
@@ -51,21 +244,60 @@ def _worker():
             continue
         
         try:
+            # Cancelled while queued
+            job.check_cancelled()
+            
             job.status = JobStatus.RUNNING
             job.started_at = datetime.now()
+            _save(job, "status", "started_at")
+            job._tracked = True
             
             # Run the job function, passing the job for progress updates
-            result = func(job, *args, **kwargs)
+            with priority_scope(job.priority):
+                result = func(job, *args, **kwargs)
             
             job.result = result
             job.status = JobStatus.COMPLETED
             job.progress = job.total
+        except JobCancelled:
+            job.status = JobStatus.CANCELLED
+            job.message = f"Cancelled after {job.progress} of {job.total}"
         except Exception as e:
             job.status = JobStatus.FAILED
             job.error = f"{type(e).__name__}: {str(e)}\n{traceback.format_exc()}"
         finally:
+            job._tracked = False
             job.completed_at = datetime.now()
-            _job_queue.task_done()
+            _save(job, "status", "progress", "total", "message", "result", "error", "completed_at")
+
+
+def _fail_stale_jobs():
+    """Mark unfinished jobs whose owning process stopped heartbeating as failed."""
+    cutoff = datetime.now() - JOB_STALE_AFTER
+    for row in Batch.unfinished():
+        if row["job_id"] in _jobs:
+            continue
+        last_seen = _parse_timestamp(row.get("updated_at") or row.get("created_at"))
+        if last_seen and last_seen < cutoff:
+            Batch.update(row["job_id"], {
+                "status": JobStatus.FAILED.value,
+                "error": f"Interrupted: worker {row.get('worker')} stopped responding",
+                "completed_at": _timestamp(datetime.now()),
+            })
+            logging.warning(f"Job {row['job_id']} ({row.get('name')}) marked failed: worker {row.get('worker')} is gone")
+
+
+def _heartbeat():
+    """Keep this process's unfinished jobs marked alive, and reap other processes' dead ones."""
+    while True:
+        try:
+            owned = [job.id for job in list(_jobs.values())
+                     if job.status in (JobStatus.PENDING, JobStatus.RUNNING)]
+            Batch.touch(owned, _timestamp(datetime.now()))
+            _fail_stale_jobs()
+        except Exception as e:
+            logging.warning(f"Job heartbeat failed: {e}")
+        time.sleep(HEARTBEAT_INTERVAL)
 
 
 def start_workers():
@@ -73,15 +305,19 @@ def start_workers():
     global _workers_started
     if _workers_started:
         return
+    if multiprocessing.parent_process() is not None:
+        # An encode-stage process re-importing the app (spawn) - it never runs jobs
+        return
     
     for i in range(_num_workers):
         t = threading.Thread(target=_worker, daemon=True, name=f"job-worker-{i}")
         t.start()
+    threading.Thread(target=_heartbeat, daemon=True, name="job-heartbeat").start()
     
     _workers_started = True
 
 
-def submit_job(name: str, func: Callable, *args, **kwargs) -> str:
+def submit_job(name: str, func: Callable, *args, priority: Priority = Priority.BULK, **kwargs) -> str:
     """
     Submit a job to be processed in the background.
     
@@ -89,6 +325,7 @@ def submit_job(name: str, func: Callable, *args, **kwargs) -> str:
         name: Human-readable job name
         func: Function to call. First argument will be the Job object for progress updates.
         *args, **kwargs: Additional arguments to pass to func
+        priority: Priority class of the job and its renders (not passed to func)
     
     Returns:
         Job ID for tracking
@@ -96,30 +333,221 @@ def submit_job(name: str, func: Callable, *args, **kwargs) -> str:
     start_workers()
     
     job_id = str(uuid.uuid4())[:8]
-    job = Job(id=job_id, name=name)
+    func_ref = _function_ref(func) if _job_functions.get(_function_ref(func)) is func else None
+    job = Job(id=job_id, name=name, worker=WORKER_ID, func=func_ref, priority=priority)
     _jobs[job_id] = job
+    Batch.create({
+        "job_id": job_id,
+        "name": name,
+        "status": job.status.value,
+        "worker": WORKER_ID,
+        "created_at": _timestamp(job.created_at),
+        "updated_at": _timestamp(job.created_at),
+        "func": func_ref,
+        # Arguments are only kept for jobs that can be resumed
+        "params": json.dumps({"args": args, "kwargs": kwargs}, default=str) if func_ref else None,
+        "priority": priority.name.lower(),
+    })
     
-    _job_queue.put((job_id, func, args, kwargs))
+    _job_queue.put((job_id, func, args, kwargs), priority)
     
     return job_id
 
 
+def cancel_job(job_id: str) -> bool:
+    """
+    Request cancellation of a pending or running job.
+    
+    A queued job is dropped when it reaches a worker; a running job stops between
+    items, after its in-flight items finish (and are checkpointed).
+    
+    Returns:
+        False if the job is not pending or running
+    """
+    requested = Batch.update(job_id, {"cancel_requested": 1},
+                             statuses=(JobStatus.PENDING.value, JobStatus.RUNNING.value))
+    job = _jobs.get(job_id)
+    if job and job.status in (JobStatus.PENDING, JobStatus.RUNNING):
+        job.cancel_requested = True
+        return True
+    return bool(requested)
+
+
+def resume_job(job_id: str) -> Job:
+    """
+    Queue a failed or cancelled job again in this process.
+    
+    It keeps its ID and arguments; items it already finished are skipped.
+    
+    Raises:
+        ValueError: If the job does not exist or cannot be resumed
+    """
+    row = Batch.get(job_id)
+    if not row:
+        raise ValueError(f"Job {job_id} not found")
+    if row.get("status") not in [status.value for status in RESUMABLE_STATUSES]:
+        raise ValueError(f"Job {job_id} is {row.get('status')}; only failed or cancelled jobs can be resumed")
+    func = _job_function(row.get("func"))
+    if func is None or not row.get("params"):
+        raise ValueError(f"Job {job_id} ({row.get('name')}) cannot be resumed")
+    params = json.loads(row["params"])
+    
+    start_workers()
+    now = _timestamp(datetime.now())
+    claimed = Batch.update(job_id, {
+        "status": JobStatus.PENDING.value,
+        # Counted again as run_subtasks skips the checkpointed items
+        "progress": 0,
+        "message": "Resuming...",
+        "result": None,
+        "error": None,
+        "completed_at": None,
+        "cancel_requested": 0,
+        "worker": WORKER_ID,
+        "updated_at": now,
+    }, statuses=[status.value for status in RESUMABLE_STATUSES])
+    if not claimed:
+        raise ValueError(f"Job {job_id} is already being resumed")
+    
+    job = _job_from_row(Batch.get(job_id))
+    _jobs[job_id] = job
+    _job_queue.put((job_id, func, params["args"], params["kwargs"]), job.priority)
+    return job
+
+
+def _checkpoint(job: Job, item_key: str, outcome, done: Callable | None):
+    """Record one item's outcome. Failures are logged - the item is simply redone on resume."""
+    if isinstance(outcome, Exception):
+        status, result = ITEM_FAILED, json.dumps(f"{type(outcome).__name__}: {outcome}")
+    else:
+        status = ITEM_DONE if done is None or done(outcome) else ITEM_FAILED
+        result = json.dumps(outcome, default=str)
+    try:
+        JobItem.record(job.id, item_key, status, result, _timestamp(datetime.now()))
+    except Exception as e:
+        logging.warning(f"Could not checkpoint item {item_key} of job {job.id}: {e}")
+
+
+def _subtask_worker():
+    """Subtask thread - run queued job items until the process exits."""
+    while True:
+        future, func, item = _subtask_queue.get()
+        if not future.set_running_or_notify_cancel():
+            continue
+        try:
+            future.set_result(func(item))
+        except BaseException as e:
+            future.set_exception(e)
+
+
+def _submit_subtask(func: Callable, item, priority: Priority, order: int) -> Future:
+    """Queue func(item) on the subtask threads, starting them on first use."""
+    global _subtask_workers_started
+    with _subtask_workers_lock:
+        if not _subtask_workers_started:
+            for i in range(max(1, JOB_SUBTASK_WORKERS)):
+                threading.Thread(target=_subtask_worker, daemon=True, name=f"job-subtask-{i}").start()
+            _subtask_workers_started = True
+    future = Future()
+    _subtask_queue.put((future, func, item), priority, order)
+    return future
+
+
+def run_subtasks(job: Job, items: list, func: Callable, weight: Callable = None,
+                 describe: Callable = None, key: Callable = None, done: Callable = None) -> list:
+    """
+    Fan a batch job out into one subtask per item and wait for them all.
+    
+    Subtasks run on the process-wide subtask threads (JOB_SUBTASK_WORKERS),
+    which bound concurrency across every running job. They are queued at the
+    job's priority and, within a priority, by their position in the job, so
+    concurrent jobs share the threads instead of a later job waiting for all of
+    an earlier one's items. The parent job's progress advances as subtasks
+    finish.
+    
+    With key, each item's outcome is checkpointed in job_items. When the job is
+    resumed, items already done are skipped and their recorded results (as
+    decoded JSON) returned in their place.
+    
+    Subtasks that have not started when the job is cancelled are skipped; once
+    the in-flight ones finish, JobCancelled is raised.
+    
+    Args:
+        job: Parent job
+        items: One work item per subtask
+        func: Called with an item, in a subtask thread
+        weight: Progress units an item accounts for (default 1)
+        describe: Text for job.message once an item is done
+        key: Checkpoint key of an item, unique within the job
+        done: Whether a result completes its item (default: any result); other
+            items are retried on resume
+    
+    Returns:
+        Results in item order; a subtask that raised has its exception in its place
+    """
+    results = [None] * len(items)
+    todo = list(range(len(items)))
+    if key:
+        checkpoints = {row["item_key"]: row["result"] for row in JobItem.for_job(job.id, ITEM_DONE)}
+        todo = []
+        for index, item in enumerate(items):
+            if key(item) in checkpoints:
+                results[index] = json.loads(checkpoints[key(item)])
+                job.progress += weight(item) if weight else 1
+            else:
+                todo.append(index)
+        if len(todo) < len(items):
+            job.message = f"Resuming: {len(items) - len(todo)} of {len(items)} already done"
+    
+    def run(item):
+        job.check_cancelled()
+        with priority_scope(job.priority):
+            return func(item)
+    
+    futures = {_submit_subtask(run, items[index], job.priority, position): index
+               for position, index in enumerate(todo)}
+    cancelled = False
+    for finished, future in enumerate(as_completed(futures), len(items) - len(todo) + 1):
+        index = futures[future]
+        try:
+            results[index] = future.result()
+        except JobCancelled:
+            cancelled = True
+            continue
+        except Exception as e:
+            results[index] = e
+        if key:
+            _checkpoint(job, key(items[index]), results[index], done)
+        job.progress += weight(items[index]) if weight else 1
+        if describe:
+            job.message = f"{describe(items[index])} ({finished}/{len(items)})"
+    if cancelled:
+        raise JobCancelled(f"Job {job.id} was cancelled")
+    return results
+
+
 def get_job(job_id: str) -> Job | None:
-    """Get job by ID."""
-    return _jobs.get(job_id)
+    """Get job by ID (this process's live copy if it owns the job, else the database record)."""
+    job = _jobs.get(job_id)
+    if job:
+        return job
+    row = Batch.get(job_id)
+    return _job_from_row(row) if row else None
 
 
 def get_all_jobs() -> list[Job]:
-    """Get all jobs, most recent first."""
-    return sorted(_jobs.values(), key=lambda j: j.created_at, reverse=True)
+    """Get recent jobs from every process, most recent first."""
+    jobs = {row["job_id"]: _job_from_row(row) for row in Batch.recent(JOB_LIST_LIMIT)}
+    jobs.update(_jobs)
+    return sorted(jobs.values(), key=lambda j: j.created_at, reverse=True)[:JOB_LIST_LIMIT]
 
 
 def clear_completed_jobs():
-    """Remove completed/failed jobs older than 1 hour."""
+    """Drop finished jobs older than 1 hour from memory (their records stay in the database)."""
     now = datetime.now()
     to_remove = []
     for job_id, job in _jobs.items():
-        if job.status in (JobStatus.COMPLETED, JobStatus.FAILED):
+        if job.status in (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED):
             if job.completed_at and (now - job.completed_at).seconds > 3600:
                 to_remove.append(job_id)
     for job_id in to_remove:
@@ -136,6 +564,10 @@ def job_to_dict(job: Job) -> dict:
         "total": job.total,
         "message": job.message,
         "error": job.error,
+        "worker": job.worker,
+        "cancel_requested": job.cancel_requested,
+        "priority": job.priority.name.lower(),
+        "resumable": job.status in RESUMABLE_STATUSES and job.func is not None,
         "created_at": job.created_at.isoformat() if job.created_at else None,
         "started_at": job.started_at.isoformat() if job.started_at else None,
         "completed_at": job.completed_at.isoformat() if job.completed_at else None,
@@ -123,6 +123,28 @@ def init_db():
         )
     """)
     
+    # Background job columns (see jobs.py) - batches rows are the persistent job store
+    for column in ("job_id TEXT", "progress INTEGER DEFAULT 0", "total INTEGER DEFAULT 0", "message TEXT",
+                   "result TEXT", "error TEXT", "worker TEXT", "started_at TIMESTAMP", "updated_at TIMESTAMP",
+                   "func TEXT", "params TEXT", "cancel_requested INTEGER DEFAULT 0", "priority TEXT"):
+        try:
+            cur.execute(f"ALTER TABLE batches ADD COLUMN {column}")
+        except:
+            pass
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_batches_job_id ON batches (job_id)")
+    
+    # Per-item checkpoints of batch jobs, so a resumed job skips finished items
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS job_items (
+            job_id TEXT NOT NULL,
+            item_key TEXT NOT NULL,
+            status TEXT,
+            result TEXT,
+            completed_at TIMESTAMP,
+            PRIMARY KEY (job_id, item_key)
+        )
+    """)
+    
     conn.commit()
     conn.close()
 
@@ -235,6 +257,133 @@ class Product:
         conn.close()
 
 
+class Batch:
+    """Background job records - one batches row per job (see jobs.py)."""
+    
+    COLUMNS = ("job_id", "name", "status", "progress", "total", "message", "result", "error",
+               "worker", "created_at", "started_at", "updated_at", "completed_at",
+               "func", "params", "cancel_requested", "priority")
+    
+    @staticmethod
+    def create(data):
+        conn = get_db()
+        cur = conn.cursor()
+        is_postgres = DATABASE_URL.startswith("postgres")
+        placeholder = "%s" if is_postgres else "?"
+        columns = [c for c in Batch.COLUMNS if c in data]
+        cur.execute(
+            f"INSERT INTO batches ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})",
+            [data[c] for c in columns]
+        )
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def update(job_id, data, statuses=None):
+        """Update a job's row (only while its status is one of statuses, if given). Returns rows updated."""
+        conn = get_db()
+        cur = conn.cursor()
+        is_postgres = DATABASE_URL.startswith("postgres")
+        placeholder = "%s" if is_postgres else "?"
+        fields = [f"{key} = {placeholder}" for key in data]
+        query = f"UPDATE batches SET {', '.join(fields)} WHERE job_id = {placeholder}"
+        params = list(data.values()) + [job_id]
+        if statuses:
+            query += f" AND status IN ({', '.join([placeholder] * len(statuses))})"
+            params += list(statuses)
+        cur.execute(query, params)
+        updated = cur.rowcount
+        conn.commit()
+        conn.close()
+        return updated
+    
+    @staticmethod
+    def get(job_id):
+        conn = get_db()
+        cur = dict_cursor(conn)
+        is_postgres = DATABASE_URL.startswith("postgres")
+        placeholder = "%s" if is_postgres else "?"
+        cur.execute(f"SELECT * FROM batches WHERE job_id = {placeholder}", (job_id,))
+        row = cur.fetchone()
+        conn.close()
+        return dict(row) if row else None
+    
+    @staticmethod
+    def recent(limit=100):
+        """Most recently created jobs first."""
+        conn = get_db()
+        cur = dict_cursor(conn)
+        is_postgres = DATABASE_URL.startswith("postgres")
+        placeholder = "%s" if is_postgres else "?"
+        cur.execute(f"SELECT * FROM batches WHERE job_id IS NOT NULL ORDER BY created_at DESC LIMIT {placeholder}",
+                    (limit,))
+        rows = cur.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+    
+    @staticmethod
+    def unfinished():
+        """Jobs that are pending or running."""
+        conn = get_db()
+        cur = dict_cursor(conn)
+        cur.execute("SELECT * FROM batches WHERE job_id IS NOT NULL AND status IN ('pending', 'running')")
+        rows = cur.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+    
+    @staticmethod
+    def touch(job_ids, timestamp):
+        """Record a heartbeat for jobs owned by a live worker."""
+        if not job_ids:
+            return
+        conn = get_db()
+        cur = conn.cursor()
+        is_postgres = DATABASE_URL.startswith("postgres")
+        placeholder = "%s" if is_postgres else "?"
+        cur.execute(
+            f"UPDATE batches SET updated_at = {placeholder} WHERE job_id IN ({', '.join([placeholder] * len(job_ids))})",
+            [timestamp] + list(job_ids)
+        )
+        conn.commit()
+        conn.close()
+
+
+class JobItem:
+    """Per-item checkpoints of batch jobs (see jobs.run_subtasks)."""
+    
+    @staticmethod
+    def record(job_id, item_key, status, result, completed_at):
+        """Record (or overwrite) the outcome of one item of a job."""
+        conn = get_db()
+        cur = conn.cursor()
+        is_postgres = DATABASE_URL.startswith("postgres")
+        placeholder = "%s" if is_postgres else "?"
+        cur.execute(f"""
+            INSERT INTO job_items (job_id, item_key, status, result, completed_at)
+            VALUES ({placeholder}, {placeholder}, {placeholder}, {placeholder}, {placeholder})
+            ON CONFLICT (job_id, item_key) DO UPDATE SET
+                status = excluded.status, result = excluded.result, completed_at = excluded.completed_at
+        """, (job_id, item_key, status, result, completed_at))
+        conn.commit()
+        conn.close()
+    
+    @staticmethod
+    def for_job(job_id, status=None):
+        """A job's item records, optionally only those with the given status."""
+        conn = get_db()
+        cur = dict_cursor(conn)
+        is_postgres = DATABASE_URL.startswith("postgres")
+        placeholder = "%s" if is_postgres else "?"
+        if status:
+            cur.execute(f"SELECT * FROM job_items WHERE job_id = {placeholder} AND status = {placeholder}",
+                        (job_id, status))
+        else:
+            cur.execute(f"SELECT * FROM job_items WHERE job_id = {placeholder}", (job_id,))
+        rows = cur.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+
 def init_all():
     """Initialize all database tables including users."""
     init_db()
@@ -0,0 +1,93 @@
+"""Priority classes for background jobs and renders.
+
+Interactive work (QA previews, a user waiting on a page) is served before bulk
+work (catalog exports, batch image jobs) wherever the two share capacity: the
+job and job subtask queues (see jobs.py) and the render slot queue (see
+svg_renderer.py). Render slots can also be reserved for interactive work only,
+so a preview never waits behind a long-running bulk render even when every
+shared slot is busy.
+
+The priority of renders is taken from the render_priority context variable at
+the point they are queued; code that renders on behalf of a user sets it with
+
+    with priority_scope(Priority.INTERACTIVE):
+        ...
+"""
+import contextvars
+import heapq
+import itertools
+import math
+import threading
+from contextlib import contextmanager
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """Lower values are served first."""
+    INTERACTIVE = 0
+    BULK = 1
+
+
+# Priority of renders queued from the current context (thread or task)
+render_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("render_priority", default=Priority.BULK)
+
+
+@contextmanager
+def priority_scope(priority: Priority):
+    """Queue renders made inside the block at the given priority."""
+    token = render_priority.set(priority)
+    try:
+        yield
+    finally:
+        render_priority.reset(token)
+
+
+class PriorityWorkQueue:
+    """
+    Blocking work queue served in priority order, then by order (if given), then
+    arrival order.
+
+    Consumers reserved for interactive work call get(Priority.INTERACTIVE) and
+    only take items of that class. Items put with priority None are control
+    items (e.g. stop markers): they queue behind all work and any consumer
+    takes them.
+    """
+
+    def __init__(self):
+        self._items = []
+        self._sequence = itertools.count()
+        self._ready = threading.Condition()
+
+    def put(self, item, priority: Priority | None, order: int = 0):
+        with self._ready:
+            rank = math.inf if priority is None else int(priority)
+            heapq.heappush(self._items, (rank, order, next(self._sequence), item))
+            self._ready.notify_all()
+
+    def get(self, max_priority: Priority | None = None):
+        """Remove and return the first item, waiting for one at max_priority or higher."""
+        with self._ready:
+            while not self._items or not self._allowed(self._items[0][0], max_priority):
+                self._ready.wait()
+            item = heapq.heappop(self._items)[-1]
+            if self._items:
+                # The new head may suit a consumer that skipped the old one
+                self._ready.notify_all()
+            return item
+
+    @staticmethod
+    def _allowed(rank: float, max_priority: Priority | None) -> bool:
+        return max_priority is None or rank <= max_priority or rank == math.inf
+
+    def qsize(self) -> int:
+        with self._ready:
+            return len(self._items)
+
+    def counts(self) -> dict[str, int]:
+        """Queued items per priority class."""
+        with self._ready:
+            counts = {priority.name.lower(): 0 for priority in Priority}
+            for rank, *_ in self._items:
+                if rank != math.inf:
+                    counts[Priority(rank).name.lower()] += 1
+            return counts
@@ -1,16 +1,14 @@
 """Cloudflare R2 storage utilities."""
-import os
-from io import BytesIO
 from pathlib import Path
 
 import boto3
 from botocore.config import Config
-from PIL import Image
 
 from config import (
     R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY,
-    R2_BUCKET_NAME, R2_PUBLIC_URL
+    R2_BUCKET_NAME, R2_PUBLIC_URL, ENCODE_TIMEOUT
 )
+from image_encoding import EncodeSpec, submit_encode
 
 
 def get_r2_client():
@@ -78,24 +76,16 @@ def upload_png_and_jpeg(png_bytes: bytes, base_key: str) -> tuple[str, str]:
     Returns:
         Tuple of (png_url, jpeg_url)
     """
+    # Convert to JPEG (white background for transparency) on the encode stage
+    # while the PNG uploads
+    jpeg_future = submit_encode(png_bytes, {"jpeg": EncodeSpec("JPEG", quality=95)})
+    
     # Upload PNG
     png_key = f"{base_key}.png"
     png_url = upload_image(png_bytes, png_key, "image/png")
     
-    # Convert to JPEG and upload
-    img = Image.open(BytesIO(png_bytes))
-    if img.mode == "RGBA":
-        # Create white background for transparency
-        background = Image.new("RGB", img.size, (255, 255, 255))
-        background.paste(img, mask=img.split()[3])
-        img = background
-    elif img.mode != "RGB":
-        img = img.convert("RGB")
-    
-    jpeg_buffer = BytesIO()
-    img.save(jpeg_buffer, format="JPEG", quality=95)
-    jpeg_bytes = jpeg_buffer.getvalue()
-    
+    # Upload JPEG
+    jpeg_bytes = jpeg_future.result(timeout=ENCODE_TIMEOUT)["jpeg"]
     jpeg_key = f"{base_key}.jpg"
     jpeg_url = upload_image(jpeg_bytes, jpeg_key, "image/jpeg")
     
@@ -0,0 +1,151 @@
+"""Content-addressed on-disk cache for rendered PNGs.
+
+Renders are keyed by a SHA-256 of the composed SVG plus its render options,
+so re-rendering an unchanged product (previews, ZIP exports, R2/Drive uploads,
+lifestyle images) is served from disk without touching Chromium.
+
+The cache has a size budget and evicts least-recently-used entries. Recency
+is tracked in memory and mirrored to file mtimes so it survives restarts.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from config import RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES
+
+_lock = threading.Lock()
+_index: OrderedDict[str, int] = OrderedDict()  # key -> size in bytes, oldest first
+_total_bytes = 0
+_loaded = False
+_hits = 0
+_misses = 0
+
+
+def is_enabled() -> bool:
+    """The cache is disabled by setting RENDER_CACHE_MAX_BYTES=0."""
+    return RENDER_CACHE_MAX_BYTES > 0
+
+
+def cache_key(svg_content: str, scale: float, transparent: bool = False, full_page: bool = False) -> str:
+    """Build the cache key for a render request."""
+    h = hashlib.sha256()
+    h.update(f"{scale}|{int(transparent)}|{int(full_page)}|".encode("ascii"))
+    h.update(svg_content.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _path_for(key: str) -> Path:
+    return RENDER_CACHE_DIR / key[:2] / f"{key}.png"
+
+
+def _load_index():
+    """Scan the cache directory once, ordering entries by last use (mtime)."""
+    global _loaded, _total_bytes
+    if _loaded:
+        return
+    entries = []
+    if RENDER_CACHE_DIR.exists():
+        for path in RENDER_CACHE_DIR.glob("*/*.png"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, path.stem, st.st_size))
+    entries.sort()
+    for _, key, size in entries:
+        _index[key] = size
+        _total_bytes += size
+    _loaded = True
+
+
+def _evict():
+    """Drop least-recently-used entries until the cache fits its budget (lock held)."""
+    global _total_bytes
+    while _total_bytes > RENDER_CACHE_MAX_BYTES and _index:
+        key, size = _index.popitem(last=False)
+        _total_bytes -= size
+        _path_for(key).unlink(missing_ok=True)
+
+
+def get(key: str) -> bytes | None:
+    """Return cached PNG bytes for key, or None on a miss."""
+    global _hits, _misses, _total_bytes
+    if not is_enabled():
+        return None
+    with _lock:
+        _load_index()
+        if key not in _index:
+            _misses += 1
+            return None
+        _index.move_to_end(key)
+    
+    # Read outside the lock so cache hits on different render slots do not queue up
+    path = _path_for(key)
+    try:
+        data = path.read_bytes()
+        os.utime(path)
+    except OSError:
+        # Removed behind our back (evicted meanwhile, or by another worker or a purge)
+        with _lock:
+            _total_bytes -= _index.pop(key, 0)
+            _misses += 1
+        return None
+    with _lock:
+        _hits += 1
+    return data
+
+
+def put(key: str, png_bytes: bytes):
+    """Store PNG bytes under key, evicting old entries if over budget."""
+    global _total_bytes
+    if not is_enabled():
+        return
+    path = _path_for(key)
+    tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_bytes(png_bytes)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Render cache write failed for {key[:12]}: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return
+    with _lock:
+        _load_index()
+        _total_bytes -= _index.pop(key, 0)
+        _index[key] = len(png_bytes)
+        _total_bytes += len(png_bytes)
+        _evict()
+
+
+def purge() -> int:
+    """Delete every cached render. Returns the number of entries removed."""
+    global _total_bytes
+    with _lock:
+        _load_index()
+        removed = len(_index)
+        for key in list(_index):
+            _path_for(key).unlink(missing_ok=True)
+        _index.clear()
+        _total_bytes = 0
+    return removed
+
+
+def stats() -> dict:
+    """Cache size and hit/miss counters for this process."""
+    with _lock:
+        _load_index()
+        lookups = _hits + _misses
+        return {
+            "enabled": is_enabled(),
+            "directory": str(RENDER_CACHE_DIR),
+            "entries": len(_index),
+            "bytes": _total_bytes,
+            "max_bytes": RENDER_CACHE_MAX_BYTES,
+            "hits": _hits,
+            "misses": _misses,
+            "hit_rate": round(_hits / lookups, 3) if lookups else None,
+        }
@@ -1,126 +1,607 @@
 """SVG to PNG renderer using Playwright (headless Chromium).
 
-Thread-safe implementation using a dedicated rendering thread.
-All Playwright operations run on a single thread to avoid cross-thread issues.
+Thread-safe implementation using a pool of dedicated rendering threads.
+Playwright's sync API is bound to the thread that started it, so each render
+slot owns its own thread, Playwright instance and browser. Slots pull work from
+a single shared queue by priority class (see priorities.py), then in arrival
+order, so QA previews go ahead of queued bulk renders. The first
+RENDER_RESERVED_SLOTS slots only take interactive renders.
+
+A watchdog thread supervises the slots: a render that hangs past
+RENDER_TIMEOUT gets its browser killed (and the slot replaced if the thread
+stays stuck), and browsers are recycled after RENDER_RECYCLE_AFTER renders or
+once their process tree exceeds RENDER_MAX_RSS_MB. A render that fails
+because its browser died is retried once on a fresh browser.
+
+AsyncRenderer queues renders on the same slots for asyncio pipelines.
 """
-import tempfile
+import asyncio
+import hashlib
+import itertools
+import logging
+import math
+import os
+import signal
 import threading
-import queue
+import time
+from collections import OrderedDict
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, Future
+from urllib.parse import urlparse
+from concurrent.futures import Future
+from dataclasses import dataclass
+from weakref import WeakKeyDictionary
 from playwright.sync_api import sync_playwright
 
-# Single-threaded executor for all Playwright operations
-_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playwright")
-_browser = None
-_playwright_instance = None
-_initialized = False
+import render_cache
+from image_encoding import composite_layers
+from config import RENDER_POOL_SIZE, RENDER_RESERVED_SLOTS, RENDER_TIMEOUT, RENDER_RECYCLE_AFTER, RENDER_MAX_RSS_MB
+from priorities import Priority, PriorityWorkQueue, render_priority
+
+# A slot whose browser fails this many renders in a row is relaunched
+MAX_CONSECUTIVE_FAILURES = 3
+
+# Seconds between watchdog checks, and renders between browser RSS checks
+WATCHDOG_INTERVAL = 5
+RSS_CHECK_EVERY = 10
+
+# Browser contexts kept alive per slot, keyed by (device_scale_factor, transparent).
+# Target-size renders use one exact scale per template size.
+MAX_CONTEXTS_PER_SLOT = 8
+
+# SVG documents are served to the browser from memory under this origin
+# (intercepted by Playwright routing - nothing is written to disk)
+RENDER_ORIGIN = "http://signmaker.render"
+
+# Resolves once the SVG document has loaded, web fonts are ready and layout
+# has been flushed (two animation frames) - deterministic, no network-idle wait
+_WAIT_FOR_LAYOUT_JS = """async () => {
+    if (document.fonts) {
+        await document.fonts.ready;
+    }
+    await new Promise(resolve => requestAnimationFrame(() => requestAnimationFrame(resolve)));
+}"""
+
+# Shared raster assets (e.g. template textures) served to the browser from memory
+# under RENDER_ORIGIN/assets/, keyed by content hash: path -> (mime type, bytes)
+_assets: dict[str, tuple[str, bytes]] = {}
+_assets_lock = threading.Lock()
+
+# Renders of static jobs (see RenderJob.static): render cache key -> PNG bytes.
+# The same bytes object is handed to every product, so downstream encoders can reuse work.
+STATIC_RENDER_CACHE_SIZE = 64
+_static_renders: OrderedDict[str, bytes] = OrderedDict()
+_static_lock = threading.Lock()
+
+# Bounding box of everything drawn in the root <svg>, in user units
+_BBOX_JS = """() => {
+    const svg = document.querySelector('svg');
+    const bbox = svg.getBBox();
+    return {x: bbox.x, y: bbox.y, width: bbox.width, height: bbox.height};
+}"""
+
+# Shared work queue: items are (future, func, args) or None to stop a slot
+_queue = PriorityWorkQueue()
+# At least one slot always takes bulk renders
+_reserved_slots = max(0, min(RENDER_RESERVED_SLOTS, RENDER_POOL_SIZE - 1))
+_slots: list["_RenderSlot"] = []
 _init_lock = threading.Lock()
+_watchdog_thread = None
+# Serialises Playwright driver start-up so each slot can tell which new process is its driver
+_launch_lock = threading.Lock()
+
+
+@dataclass
+class RenderJob:
+    """
+    One SVG to render as part of a batch (see render_svgs_to_bytes).
+    
+    A layered job also sets background: svg_content is then a transparent
+    overlay composited over the background's render, so a background shared by
+    many jobs is rasterised once and served from the render cache after that.
+    """
+    svg_content: str
+    scale: float = 4
+    transparent: bool = False
+    full_page: bool = False
+    background: str | None = None
+    # Product-independent render (e.g. a rear template): kept in memory once rendered
+    static: bool = False
+    
+    def layers(self) -> list["RenderJob"]:
+        """The plain renders this job needs: itself, or its background and overlay."""
+        if self.background is None:
+            return [self]
+        return [
+            RenderJob(self.background, self.scale, self.transparent, self.full_page),
+            RenderJob(self.svg_content, self.scale, True, self.full_page),
+        ]
+
+
+class _RenderSlot:
+    """A single render slot: one thread driving one Chromium browser."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.name = f"playwright-{index}"
+        self.reserved = index < _reserved_slots  # Interactive renders only
+        self.browser = None
+        self.playwright = None
+        self.renders = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = None
+        self.busy_since = None
+        self.launches = 0
+        self.renders_since_launch = 0
+        self.driver_pid = None
+        self.killed_at = None
+        self.retired = False
+        self.pages: OrderedDict[tuple, object] = OrderedDict()
+        self.documents: dict[str, str] = {}
+        self._doc_ids = itertools.count()
+        self.thread = threading.Thread(target=self._run, daemon=True, name=self.name)
+
+    def ensure_browser(self):
+        """Ensure browser is running (called within the slot thread)."""
+        if self.browser is not None and not self.browser.is_connected():
+            logging.warning(f"Render slot {self.name}: browser disconnected, relaunching")
+            self.close()
+        if self.browser is None:
+            with _launch_lock:
+                known_pids = set(_process_tree(os.getpid()))
+                self.playwright = sync_playwright().start()
+                self.driver_pid = _driver_pid(self.playwright, known_pids)
+            if self.driver_pid is None:
+                logging.warning(f"Render slot {self.name}: Playwright driver process not found - "
+                                f"a hung render will retire the slot instead of killing its browser")
+            try:
+                self.browser = self.playwright.chromium.launch()
+            except Exception:
+                # Stop the driver too, or the next attempt finds this thread's event loop still running
+                self.close()
+                raise
+            self.launches += 1
+            self.renders_since_launch = 0
+        return self.browser
+
+    def browser_lost(self) -> bool:
+        """True if the browser crashed or was killed by the watchdog."""
+        try:
+            return self.browser is not None and not self.browser.is_connected()
+        except Exception:
+            return True
+
+    def kill_browser(self) -> bool:
+        """
+        Hard-kill the Playwright driver and browser processes (safe from any thread).
+
+        Returns:
+            False if the driver process is unknown, so nothing could be killed
+        """
+        if not self.driver_pid:
+            return False
+        for pid in reversed(_process_tree(self.driver_pid)):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        return True
+
+    def rss_mb(self) -> float | None:
+        """Resident memory of the driver and browser process tree, in MB (Linux only)."""
+        if not self.driver_pid:
+            return None
+        return _tree_rss_mb(self.driver_pid)
+
+    def get_page(self, scale: float, transparent: bool):
+        """Return the long-lived page for (scale, transparent), creating its context if needed."""
+        browser = self.ensure_browser()
+        key = (scale, transparent)
+        page = self.pages.get(key)
+        if page is not None and not page.is_closed():
+            self.pages.move_to_end(key)
+            return page
+
+        context = browser.new_context(device_scale_factor=scale)
+        context.route(f"{RENDER_ORIGIN}/**", self._serve_document)
+        page = context.new_page()
+        self.pages[key] = page
+
+        while len(self.pages) > MAX_CONTEXTS_PER_SLOT:
+            _, old_page = self.pages.popitem(last=False)
+            try:
+                old_page.context.close()
+            except Exception:
+                pass
+        return page
+
+    def _serve_document(self, route):
+        """Playwright route handler - fulfil render URLs (documents and assets) from memory."""
+        path = urlparse(route.request.url).path
+        asset = _assets.get(path)
+        if asset is not None:
+            route.fulfill(status=200, content_type=asset[0], body=asset[1])
+            return
+        body = self.documents.get(path)
+        if body is None:
+            route.fulfill(status=404, body="")
+        else:
+            route.fulfill(status=200, content_type="image/svg+xml", body=body)
+
+    def load_svg(self, page, svg_content: str):
+        """Load SVG content into a page and wait until it is laid out."""
+        path = f"/doc/{next(self._doc_ids)}.svg"
+        self.documents[path] = svg_content
+        try:
+            page.goto(f"{RENDER_ORIGIN}{path}", wait_until="load", timeout=60000)
+            page.evaluate(_WAIT_FOR_LAYOUT_JS)
+        finally:
+            self.documents.pop(path, None)
+
+    def close(self):
+        """Close the browser and Playwright instance (called within the slot thread)."""
+        self.pages.clear()
+        self.documents.clear()
+        try:
+            if self.browser:
+                self.browser.close()
+        except Exception as e:
+            logging.warning(f"Render slot {self.name}: error closing browser: {e}")
+        try:
+            if self.playwright:
+                self.playwright.stop()
+        except Exception as e:
+            logging.warning(f"Render slot {self.name}: error stopping Playwright: {e}")
+        self.browser = None
+        self.playwright = None
+        self.driver_pid = None
+
+    def _run(self):
+        """Slot thread main loop - process queued renders until told to stop."""
+        while True:
+            if self.retired:
+                # Replaced by the watchdog while stuck - let the new slot take over
+                self.close()
+                return
+
+            item = _queue.get(Priority.INTERACTIVE if self.reserved else None)
+            if item is None:
+                self.close()
+                return
+
+            future, func, args = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            self.busy_since = time.monotonic()
+            try:
+                result = self._call_with_retry(func, args)
+            except BaseException as e:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                if self.consecutive_failures >= MAX_CONSECUTIVE_FAILURES:
+                    # Assume the browser is wedged - start fresh on the next render
+                    logging.warning(f"Render slot {self.name}: {self.consecutive_failures} failures in a row, restarting browser")
+                    self.close()
+                    self.consecutive_failures = 0
+                future.set_exception(e)
+            else:
+                self.renders += 1
+                self.renders_since_launch += 1
+                self.consecutive_failures = 0
+                future.set_result(result)
+            finally:
+                self.busy_since = None
+                self.killed_at = None
+
+            self._maybe_recycle()
+
+    def _call_with_retry(self, func, args):
+        """Run func on this slot, retrying once on a fresh browser if the browser died."""
+        try:
+            return func(self, *args)
+        except Exception as e:
+            if not self.browser_lost():
+                raise
+            logging.warning(f"Render slot {self.name}: browser lost ({e}), relaunching and retrying once")
+            self.close()
+            self.busy_since = time.monotonic()
+            self.killed_at = None
+            return func(self, *args)
 
+    def _maybe_recycle(self):
+        """Restart the browser after too many renders or when it uses too much memory."""
+        if self.browser is None:
+            return
+        reason = None
+        if RENDER_RECYCLE_AFTER and self.renders_since_launch >= RENDER_RECYCLE_AFTER:
+            reason = f"{self.renders_since_launch} renders"
+        elif RENDER_MAX_RSS_MB and self.renders_since_launch % RSS_CHECK_EVERY == 0:
+            rss = self.rss_mb()
+            if rss and rss > RENDER_MAX_RSS_MB:
+                reason = f"RSS {rss:.0f} MB"
+        if reason:
+            logging.info(f"Render slot {self.name}: recycling browser after {reason}")
+            self.close()
 
-def _ensure_browser():
-    """Ensure browser is initialized (called within executor thread)."""
-    global _browser, _playwright_instance, _initialized
-    if not _initialized:
-        _playwright_instance = sync_playwright().start()
-        _browser = _playwright_instance.chromium.launch()
-        _initialized = True
-    return _browser
+    def status(self) -> dict:
+        """Health snapshot for this slot."""
+        return {
+            "name": self.name,
+            "reserved": self.reserved,
+            "alive": self.thread.is_alive(),
+            "browser_connected": bool(self.browser and self.browser.is_connected()),
+            "busy_seconds": round(time.monotonic() - self.busy_since, 1) if self.busy_since else None,
+            "renders": self.renders,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "driver_pid": self.driver_pid,
+            "launches": self.launches,
+            "renders_since_launch": self.renders_since_launch,
+            "rss_mb": self.rss_mb(),
+        }
 
 
-def _render_svg_impl(svg_content: str, scale: int, transparent: bool = False, full_page: bool = False) -> bytes:
-    """Internal render function - runs on executor thread.
+def register_asset(data: bytes, mime_type: str, extension: str = "") -> str:
+    """
+    Register a raster asset to be served to the browser from memory.
+    
+    Assets are content-addressed, so registering the same bytes twice returns
+    the same URL. SVGs can reference the returned URL instead of embedding the
+    data inline.
+    
+    Args:
+        data: Raw asset bytes
+        mime_type: MIME type to serve it with
+        extension: Optional file extension for the URL (e.g. 'jpg')
+    
+    Returns:
+        URL under RENDER_ORIGIN
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = f"/assets/{digest}" + (f".{extension}" if extension else "")
+    with _assets_lock:
+        if path not in _assets:
+            _assets[path] = (mime_type, data)
+    return f"{RENDER_ORIGIN}{path}"
+
+
+def _driver_pid(playwright, known_pids: set[int]) -> int | None:
+    """
+    PID of the Playwright driver process (parent of the browser processes).
+
+    Playwright does not expose it publicly: it is read from the driver transport
+    (checked against Playwright 1.63 by benchmarks/check_playwright_driver.py).
+    If that private path changes, the driver is found as the one new Playwright
+    process among this process's descendants (known_pids were there before it
+    started).
+    """
+    try:
+        return playwright._impl_obj._connection._transport._proc.pid
+    except AttributeError:
+        pass
+    candidates = []
+    for pid in _process_tree(os.getpid()):
+        if pid in known_pids:
+            continue
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if b"playwright" in f.read():
+                    candidates.append(pid)
+        except OSError:
+            continue
+    # Parents come first, so the driver precedes anything it started
+    return candidates[0] if candidates else None
+
+
+def _process_tree(root_pid: int) -> list[int]:
+    """root_pid and all its descendants, parents first (Linux /proc only)."""
+    children: dict[int, list[int]] = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return [root_pid]
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", encoding="ascii", errors="replace") as f:
+                # Format: pid (comm) state ppid ... - comm may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree = [root_pid]
+    for pid in tree:
+        tree.extend(children.get(pid, []))
+    return tree
+
+
+def _tree_rss_mb(root_pid: int) -> float | None:
+    """Total resident memory of a process tree in MB (Linux /proc only)."""
+    total_kb = 0
+    for pid in _process_tree(root_pid):
+        try:
+            with open(f"/proc/{pid}/status", encoding="ascii", errors="replace") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total_kb += int(line.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024 if total_kb else None
+
+
+def _watchdog():
+    """Supervise render slots: kill hung browsers and replace dead or stuck slots."""
+    while True:
+        time.sleep(WATCHDOG_INTERVAL)
+        now = time.monotonic()
+        with _init_lock:
+            for i, slot in enumerate(_slots):
+                if not slot.thread.is_alive():
+                    logging.error(f"Render slot {slot.name}: thread died, replacing")
+                    _slots[i] = _start_slot(slot.index)
+                elif slot.busy_since and now - slot.busy_since > RENDER_TIMEOUT:
+                    if slot.killed_at is None:
+                        logging.error(f"Render slot {slot.name}: render hung for {now - slot.busy_since:.0f}s, killing browser")
+                        slot.last_error = "Render hung - browser killed by watchdog"
+                        slot.killed_at = now
+                        if not slot.kill_browser():
+                            # Driver process unknown - abandon the slot straight away
+                            logging.error(f"Render slot {slot.name}: cannot kill browser, replacing slot")
+                            slot.retired = True
+                            _slots[i] = _start_slot(slot.index)
+                    elif now - slot.killed_at > RENDER_TIMEOUT:
+                        # Thread did not recover after the kill - abandon it
+                        logging.error(f"Render slot {slot.name}: still stuck after kill, replacing slot")
+                        slot.retired = True
+                        _slots[i] = _start_slot(slot.index)
+
+
+def _start_slot(index: int) -> _RenderSlot:
+    slot = _RenderSlot(index)
+    slot.thread.start()
+    return slot
+
+
+def _ensure_pool():
+    """Start the render slots (and their watchdog) on first use."""
+    global _watchdog_thread
+    if _slots:
+        return
+    with _init_lock:
+        if _slots:
+            return
+        for i in range(max(1, RENDER_POOL_SIZE)):
+            _slots.append(_start_slot(i))
+        if _watchdog_thread is None:
+            _watchdog_thread = threading.Thread(target=_watchdog, daemon=True, name="playwright-watchdog")
+            _watchdog_thread.start()
+
+
+def _submit(func, *args) -> Future:
+    """
+    Queue a render function; it is called as func(slot, *args) on a free slot.
+
+    It is queued at the caller's render_priority.
+    """
+    _ensure_pool()
+    future = Future()
+    _queue.put((future, func, args), render_priority.get())
+    return future
+
+
+def get_render_pool_status() -> dict:
+    """Return queue depth and per-slot health for the render pool."""
+    return {
+        "pool_size": len(_slots),
+        "reserved_slots": _reserved_slots,
+        "queued": _queue.qsize(),
+        "queued_by_priority": _queue.counts(),
+        "slots": [slot.status() for slot in _slots],
+    }
+
+
+def _full_page_script(bbox: dict | None) -> str | None:
+    """JS that resizes the root <svg> so its viewBox covers bbox (None if bbox is empty)."""
+    if not bbox or bbox['width'] <= 0 or bbox['height'] <= 0:
+        return None
+    # Update viewBox to include all content with small padding
+    padding = 5
+    new_viewbox = f"{bbox['x'] - padding} {bbox['y'] - padding} {bbox['width'] + padding * 2} {bbox['height'] + padding * 2}"
+    # Calculate aspect ratio to set proper dimensions
+    aspect = bbox['width'] / bbox['height'] if bbox['height'] > 0 else 1
+    # Use a reasonable output size
+    out_height = 800
+    out_width = out_height * aspect
+    return f'''() => {{
+        const svg = document.querySelector('svg');
+        svg.setAttribute('viewBox', '{new_viewbox}');
+        svg.removeAttribute('width');
+        svg.removeAttribute('height');
+        svg.style.width = '{out_width}px';
+        svg.style.height = '{out_height}px';
+    }}'''
+
+
+def _render_svg_impl(slot: _RenderSlot, svg_content: str, scale: int, transparent: bool = False, full_page: bool = False) -> bytes:
+    """Internal render function - runs on a render slot thread.
     
     Args:
+        slot: Render slot providing the browser
         svg_content: SVG XML string
         scale: Device scale factor
         transparent: If True, omit background for transparency
         full_page: If True, capture full page bounds (for SVGs with elements outside viewBox)
     """
-    browser = _ensure_browser()
-    context = browser.new_context(device_scale_factor=scale)
-    page = context.new_page()
+    page = slot.get_page(scale, transparent)
+    slot.load_svg(page, svg_content)
     
-    with tempfile.NamedTemporaryFile(mode='w', suffix='.svg', delete=False, encoding='utf-8') as f:
-        f.write(svg_content)
-        temp_svg = Path(f.name)
+    svg_element = page.locator('svg')
     
-    try:
-        page.goto(f'file:///{temp_svg.as_posix()}', timeout=60000)
-        page.wait_for_load_state('networkidle', timeout=10000)
-        
-        svg_element = page.locator('svg')
-        
-        if full_page:
-            # For peel_and_stick: get the bounding box and set viewBox to capture all content
-            # The peel_and_stick templates have content outside the original viewBox
-            bbox = page.evaluate('''() => {
-                const svg = document.querySelector('svg');
-                const bbox = svg.getBBox();
-                return {x: bbox.x, y: bbox.y, width: bbox.width, height: bbox.height};
-            }''')
-            
-            if bbox and bbox['width'] > 0 and bbox['height'] > 0:
-                # Update viewBox to include all content with small padding
-                padding = 5
-                new_viewbox = f"{bbox['x'] - padding} {bbox['y'] - padding} {bbox['width'] + padding * 2} {bbox['height'] + padding * 2}"
-                # Calculate aspect ratio to set proper dimensions
-                aspect = bbox['width'] / bbox['height'] if bbox['height'] > 0 else 1
-                # Use a reasonable output size
-                out_height = 800
-                out_width = out_height * aspect
-                page.evaluate(f'''() => {{
-                    const svg = document.querySelector('svg');
-                    svg.setAttribute('viewBox', '{new_viewbox}');
-                    svg.removeAttribute('width');
-                    svg.removeAttribute('height');
-                    svg.style.width = '{out_width}px';
-                    svg.style.height = '{out_height}px';
-                }}''')
-                # Re-locate after modification
-                svg_element = page.locator('svg')
-        
-        png_bytes = svg_element.screenshot(type='png', omit_background=transparent, timeout=60000)
-    finally:
-        page.close()
-        context.close()
-        temp_svg.unlink(missing_ok=True)
+    if full_page:
+        # For peel_and_stick: get the bounding box and set viewBox to capture all content
+        # The peel_and_stick templates have content outside the original viewBox
+        bbox = page.evaluate(_BBOX_JS)
+        script = _full_page_script(bbox)
+        if script:
+            page.evaluate(script)
+            # Re-locate after modification
+            svg_element = page.locator('svg')
     
-    return png_bytes
+    return svg_element.screenshot(type='png', omit_background=transparent, timeout=60000)
 
 
-def _render_svg_file_impl(svg_path: Path, scale: int) -> bytes:
-    """Internal file render function - runs on executor thread."""
-    browser = _ensure_browser()
-    context = browser.new_context(device_scale_factor=scale)
-    page = context.new_page()
-    
-    try:
-        page.goto(f'file:///{svg_path.as_posix()}')
-        svg_element = page.locator('svg')
-        png_bytes = svg_element.screenshot(type='png')
-    finally:
-        page.close()
-        context.close()
+def _measure_bbox_impl(slot: _RenderSlot, svg_content: str) -> dict | None:
+    """Internal bbox function - lays out the SVG and returns the root's getBBox()."""
+    page = slot.get_page(1, False)
+    slot.load_svg(page, svg_content)
+    return page.evaluate(_BBOX_JS)
+
+
+def _render_batch_impl(slot: _RenderSlot, jobs: list[RenderJob]) -> list:
+    """Internal batch render function - renders every job on one slot's pages.
     
-    return png_bytes
+    Failures are returned in place of the PNG bytes so one bad SVG does not
+    abort the rest of the batch.
+    """
+    results = []
+    for job in jobs:
+        # Per-item timing so the watchdog judges each render, not the whole batch
+        slot.busy_since = time.monotonic()
+        slot.killed_at = None
+        try:
+            results.append(slot._call_with_retry(_render_svg_impl, (job.svg_content, job.scale, job.transparent, job.full_page)))
+        except Exception as e:
+            logging.warning(f"Render slot {slot.name}: batch item failed: {e}")
+            results.append(e)
+    return results
+
+
+def _render_svg_file_impl(slot: _RenderSlot, svg_path: Path, scale: int) -> bytes:
+    """Internal file render function - runs on a render slot thread."""
+    page = slot.get_page(scale, False)
+    page.goto(f'file:///{svg_path.as_posix()}', wait_until="load")
+    page.evaluate(_WAIT_FOR_LAYOUT_JS)
+    svg_element = page.locator('svg')
+    return svg_element.screenshot(type='png')
 
 
 def close_browser():
-    """Close browser and shutdown executor."""
-    global _browser, _playwright_instance, _initialized
-    
-    def _shutdown():
-        global _browser, _playwright_instance, _initialized
-        if _browser:
-            _browser.close()
-            _browser = None
-        if _playwright_instance:
-            _playwright_instance.stop()
-            _playwright_instance = None
-        _initialized = False
+    """Close all browsers and stop the render slots.
     
-    _executor.submit(_shutdown).result(timeout=10)
+    The pool is started again lazily by the next render.
+    """
+    with _init_lock:
+        slots = list(_slots)
+        _slots.clear()
+        for _ in slots:
+            _queue.put(None, None)
+    for slot in slots:
+        slot.thread.join(timeout=10)
 
 
 def render_svg_to_png(svg_content: str, output_path: Path, scale: int = 4) -> Path:
@@ -135,7 +616,7 @@ def render_svg_to_png(svg_content: str, output_path: Path, scale: int = 4) -> Pa
     Returns:
         Path to output PNG file
     """
-    png_bytes = _executor.submit(_render_svg_impl, svg_content, scale).result(timeout=60)
+    png_bytes = render_svg_to_bytes(svg_content, scale)
     with open(output_path, 'wb') as f:
         f.write(png_bytes)
     return output_path
@@ -153,7 +634,7 @@ def render_svg_file_to_png(svg_path: Path, output_path: Path, scale: int = 4) ->
     Returns:
         Path to output PNG file
     """
-    png_bytes = _executor.submit(_render_svg_file_impl, svg_path, scale).result(timeout=60)
+    png_bytes = _submit(_render_svg_file_impl, svg_path, scale).result(timeout=RENDER_TIMEOUT)
     with open(output_path, 'wb') as f:
         f.write(png_bytes)
     return output_path
@@ -163,6 +644,9 @@ def render_svg_to_bytes(svg_content: str, scale: int = 4, transparent: bool = Fa
     """
     Render SVG content to PNG bytes (thread-safe, for streaming/API responses).
     
+    Results are served from the on-disk render cache when the same SVG has
+    already been rendered with the same options.
+    
     Args:
         svg_content: SVG XML string
         scale: Device scale factor
@@ -172,7 +656,238 @@ def render_svg_to_bytes(svg_content: str, scale: int = 4, transparent: bool = Fa
     Returns:
         PNG image as bytes
     """
-    return _executor.submit(_render_svg_impl, svg_content, scale, transparent, full_page).result(timeout=60)
+    key = render_cache.cache_key(svg_content, scale, transparent, full_page)
+    png_bytes = render_cache.get(key)
+    if png_bytes is None:
+        png_bytes = _submit(_render_svg_impl, svg_content, scale, transparent, full_page).result(timeout=RENDER_TIMEOUT)
+        render_cache.put(key, png_bytes)
+    return png_bytes
+
+
+def measure_svg_bbox(svg_content: str) -> dict | None:
+    """
+    Measure the bounding box of all content in an SVG (thread-safe).
+    
+    Used to precompute full-page viewBoxes for templates with content outside
+    their declared viewBox, so they can be rendered in a single pass.
+    
+    Args:
+        svg_content: SVG XML string
+    
+    Returns:
+        Dict with x, y, width, height in SVG user units
+    """
+    return _submit(_measure_bbox_impl, svg_content).result(timeout=RENDER_TIMEOUT)
+
+
+def _static_get(key: str) -> bytes | None:
+    with _static_lock:
+        png_bytes = _static_renders.get(key)
+        if png_bytes is not None:
+            _static_renders.move_to_end(key)
+        return png_bytes
+
+
+def _static_put(key: str, png_bytes: bytes) -> bytes:
+    """Remember a static render; returns the canonical bytes object for key."""
+    with _static_lock:
+        png_bytes = _static_renders.setdefault(key, png_bytes)
+        while len(_static_renders) > STATIC_RENDER_CACHE_SIZE:
+            _static_renders.popitem(last=False)
+        return png_bytes
+
+
+def render_svgs_to_bytes(jobs: list) -> list:
+    """
+    Render a batch of SVGs in render slot sessions (thread-safe).
+    
+    Amortises the queue round trip and page setup across the batch, e.g. all
+    template types of one product or a page of QA thumbnails. Large batches
+    are split into one chunk per render slot so the slots render in parallel.
+    Layered jobs are split into background and overlay renders; identical
+    renders in the batch (such as a shared background) are done once.
+    
+    Args:
+        jobs: List of RenderJob (or dicts with the same fields)
+    
+    Returns:
+        List in the same order as jobs; each entry is PNG bytes, or the
+        Exception raised while rendering that item
+    """
+    jobs = [job if isinstance(job, RenderJob) else RenderJob(**job) for job in jobs]
+    layers = [layer for job in jobs for layer in job.layers()]
+    keys = [render_cache.cache_key(j.svg_content, j.scale, j.transparent, j.full_page) for j in layers]
+    static_keys = {key for key, layer in zip(keys, layers) if layer.static}
+    rendered = {}
+    for key in dict.fromkeys(keys):
+        png_bytes = (_static_get(key) if key in static_keys else None) or render_cache.get(key)
+        if png_bytes is not None:
+            rendered[key] = _static_put(key, png_bytes) if key in static_keys else png_bytes
+    
+    # Only send cache misses to the browser, once each
+    misses = {key: layer for key, layer in zip(keys, layers) if key not in rendered}
+    if misses:
+        pending = list(misses.values())
+        chunk_size = math.ceil(len(pending) / max(1, RENDER_POOL_SIZE))
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        futures = [(_submit(_render_batch_impl, chunk), len(chunk)) for chunk in chunks]
+        results = []
+        for future, count in futures:
+            results.extend(future.result(timeout=RENDER_TIMEOUT * count))
+        for key, result in zip(misses, results):
+            rendered[key] = result
+            if not isinstance(result, Exception):
+                render_cache.put(key, result)
+                if key in static_keys:
+                    rendered[key] = _static_put(key, result)
+    
+    results = []
+    layer_results = iter(rendered[key] for key in keys)
+    for job in jobs:
+        if job.background is None:
+            results.append(next(layer_results))
+            continue
+        background, overlay = next(layer_results), next(layer_results)
+        if isinstance(background, Exception):
+            results.append(background)
+        elif isinstance(overlay, Exception):
+            results.append(overlay)
+        else:
+            try:
+                results.append(composite_layers(background, overlay))
+            except Exception as e:
+                results.append(e)
+    return results
+
+
+def render_job(job: RenderJob) -> bytes:
+    """Render one RenderJob (plain or layered) to PNG bytes (thread-safe)."""
+    result = render_svgs_to_bytes([job])[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+class AsyncRenderer:
+    """
+    Asyncio front end to the render slot pool.
+    
+    Lets streaming pipelines overlap render, encode and upload work for many
+    products inside one event loop. Renders are queued on the shared render
+    slots - so they reuse the slots' browsers and pages, are supervised by the
+    watchdog and served by priority (at the caller's render_priority) - and
+    awaited without blocking the loop. Shares the on-disk render cache, and
+    runs at most `concurrency` renders at once.
+    
+    Usage:
+        async with AsyncRenderer() as renderer:
+            png_bytes = await renderer.render_svg_to_bytes(svg_content, scale=1)
+    """
+    
+    def __init__(self, concurrency: int = RENDER_POOL_SIZE):
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._in_flight: dict[str, asyncio.Future] = {}
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    async def start(self):
+        """Start the render slots if they are not running yet."""
+        await asyncio.to_thread(_ensure_pool)
+    
+    async def close(self):
+        """Nothing to release - the render slots are shared by the whole process."""
+    
+    async def render_svg_to_bytes(self, svg_content: str, scale: float = 4, transparent: bool = False, full_page: bool = False) -> bytes:
+        """
+        Render SVG content to PNG bytes without blocking the event loop.
+        
+        Args:
+            svg_content: SVG XML string
+            scale: Device scale factor
+            transparent: If True, omit background for transparency
+            full_page: If True, capture full page bounds (for SVGs with elements outside viewBox)
+        
+        Returns:
+            PNG image as bytes
+        """
+        key = render_cache.cache_key(svg_content, scale, transparent, full_page)
+        png_bytes = await asyncio.to_thread(render_cache.get, key)
+        if png_bytes is not None:
+            return png_bytes
+        
+        # The same SVG is already rendering (e.g. a shared layer background) - wait for it
+        pending = self._in_flight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = pending
+        
+        try:
+            async with self._semaphore:
+                # A timed-out or cancelled render that has not started is dropped from the queue;
+                # one that hangs in the browser is reaped by the watchdog
+                future = _submit(_render_svg_impl, svg_content, scale, transparent, full_page)
+                png_bytes = await asyncio.wait_for(asyncio.wrap_future(future), RENDER_TIMEOUT)
+            
+            await asyncio.to_thread(render_cache.put, key, png_bytes)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                pending.cancel()
+            else:
+                pending.set_exception(e)
+                pending.exception()  # Waiters re-raise it; don't log it as never retrieved
+            raise
+        finally:
+            del self._in_flight[key]
+        
+        pending.set_result(png_bytes)
+        return png_bytes
+    
+    async def render_job(self, job: RenderJob) -> bytes:
+        """Render a RenderJob (plain or layered) without blocking the event loop."""
+        if job.static:
+            key = render_cache.cache_key(job.svg_content, job.scale, job.transparent, job.full_page)
+            png_bytes = _static_get(key)
+            if png_bytes is None:
+                png_bytes = _static_put(key, await self.render_svg_to_bytes(
+                    job.svg_content, job.scale, job.transparent, job.full_page))
+            return png_bytes
+        
+        layers = await asyncio.gather(*(
+            self.render_svg_to_bytes(layer.svg_content, layer.scale, layer.transparent, layer.full_page)
+            for layer in job.layers()
+        ))
+        if job.background is None:
+            return layers[0]
+        return await asyncio.to_thread(composite_layers, *layers)
+
+
+# One default AsyncRenderer per running event loop
+_async_renderers: "WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRenderer]" = WeakKeyDictionary()
+
+
+async def render_svg_to_bytes_async(svg_content: str, scale: float = 4, transparent: bool = False, full_page: bool = False) -> bytes:
+    """
+    Async counterpart of render_svg_to_bytes, using a default AsyncRenderer for
+    the running event loop. Call close_async_renderer() before the loop ends.
+    """
+    loop = asyncio.get_running_loop()
+    renderer = _async_renderers.get(loop)
+    if renderer is None:
+        renderer = _async_renderers[loop] = AsyncRenderer()
+    return await renderer.render_svg_to_bytes(svg_content, scale, transparent, full_page)
+
+
+async def close_async_renderer():
+    """Close the default AsyncRenderer of the running event loop, if any."""
+    renderer = _async_renderers.pop(asyncio.get_running_loop(), None)
+    if renderer is not None:
+        await renderer.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+"""String-splice SVG composition - build product SVGs without re-serialising templates.
+
+Composing a product SVG with lxml means copying the template tree, appending
+icons and text, and serialising the whole document again for every render.
+Everything product-specific is appended as the last children of the root, so
+the serialised template splits into a fixed head (everything up to the root's
+closing tag) and tail (the closing tag). A product SVG is then
+
+    head + icon/text fragments + tail
+
+where each fragment is the exact markup lxml would have produced for that
+element inside the template. Fragments are serialised once inside an empty
+root carrying the template's namespace declarations, so namespace handling
+(e.g. which prefixes get declared locally) matches the lxml path byte for
+byte. Per-product values - icon positions and scales - are left as named
+placeholders in the cached markup and filled in with plain string joins.
+"""
+from lxml import etree
+
+
+def split_root(root: etree._Element) -> tuple[str, str]:
+    """
+    Serialise a root element and split it before its closing tag.
+
+    Returns:
+        (head, tail): children appended to root would be serialised between them
+    """
+    svg = etree.tostring(root, encoding="unicode")
+    if svg.endswith("/>"):
+        # No children: open the element so fragments have somewhere to go
+        name = svg[1:-2].split(None, 1)[0]
+        return svg[:-2] + ">", f"</{name}>"
+    cut = svg.rindex("</")
+    return svg[:cut], svg[cut:]
+
+
+def namespace_key(root: etree._Element) -> tuple:
+    """Hashable identity of the namespace context fragments are serialised in."""
+    return root.tag, tuple(sorted((prefix or "", uri) for prefix, uri in root.nsmap.items()))
+
+
+def serialise_children(root: etree._Element, build) -> str:
+    """
+    Markup of the elements build() appends to a root with root's namespaces.
+
+    Args:
+        root: Element whose tag and namespace declarations form the context
+        build: Called with an empty stand-in root to append elements to
+    """
+    context = etree.Element(root.tag, nsmap=root.nsmap)
+    build(context)
+    if len(context) == 0:
+        return ""
+    markup = etree.tostring(context, encoding="unicode")
+    # The stand-in root only carries namespace URIs, which never contain '>'
+    return markup[markup.index(">") + 1:markup.rindex("</")]
+
+
+class FragmentTemplate:
+    """
+    Serialised element markup with named placeholders for per-use values.
+
+    Placeholders are written as '{name}' into attribute values when the
+    element is built, and must appear in the markup in the order of fields.
+    Only the first occurrence of each is replaced, so content after the
+    placeholders (icon paths, base64 payloads) is never scanned.
+    """
+
+    def __init__(self, markup: str, fields: tuple[str, ...]):
+        self.fields = fields
+        self.parts = []
+        rest = markup
+        for name in fields:
+            before, marker, rest = rest.partition("{" + name + "}")
+            if not marker:
+                raise ValueError(f"Placeholder {name!r} not found in fragment")
+            self.parts.append(before)
+        self.parts.append(rest)
+
+    def fill(self, *values: str) -> list[str]:
+        """Fragment pieces with values substituted, ready to join."""
+        pieces = [self.parts[0]]
+        for value, part in zip(values, self.parts[1:]):
+            pieces.append(value)
+            pieces.append(part)
+        return pieces
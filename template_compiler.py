@@ -0,0 +1,99 @@
+"""Template compiler - externalise embedded raster textures from SVG templates.
+
+The brushed-metal templates in assets/ each embed the same few textures inline
+as data:image/jpeg;base64 URIs. Serialising those blobs for every render and
+shipping them to Chromium again dominates the SVG payload.
+
+compile_template() replaces each embedded raster with a URL into the renderer's
+in-memory asset store (deduplicated by content hash), so composed SVGs shrink
+to a few KB and the browser is served the texture from memory via request
+interception. It also strips editor metadata, so templates that render the
+same (e.g. the rear of every color of a size) compile to identical SVGs and
+share one cached render. Compiled templates are for rendering only - the
+master design SVG keeps its textures embedded.
+"""
+import base64
+import binascii
+import logging
+
+from lxml import etree
+
+from svg_renderer import register_asset
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+
+HREF_ATTRS = (f"{{{XLINK_NS}}}href", "href")
+
+# Editor namespaces whose elements and attributes never affect rendering
+EDITOR_NAMESPACES = (
+    "http://www.inkscape.org/namespaces/inkscape",
+    "http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd",
+)
+
+# MIME type -> URL extension for externalised assets
+EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+}
+
+
+def _externalise(data_uri: str) -> str | None:
+    """Register a base64 data URI with the asset store and return its URL."""
+    header, sep, payload = data_uri.partition(",")
+    if not sep or not header.endswith(";base64"):
+        return None
+    mime_type = header[len("data:"):-len(";base64")]
+    if mime_type not in EXTENSIONS:
+        return None
+    try:
+        # Inkscape wraps base64 across lines - b64decode skips the whitespace
+        data = base64.b64decode(payload)
+    except (binascii.Error, ValueError):
+        logging.warning(f"Template compiler: could not decode embedded {mime_type}")
+        return None
+    return register_asset(data, mime_type, EXTENSIONS[mime_type])
+
+
+def strip_editor_metadata(root: etree._Element) -> etree._Element:
+    """Remove editor metadata (Inkscape/Sodipodi elements and attributes, comments, <metadata>) in place."""
+    for elem in list(root.iter()):
+        if not isinstance(elem.tag, str):
+            if elem.getparent() is not None:
+                elem.getparent().remove(elem)
+            continue
+        qname = etree.QName(elem)
+        if qname.namespace in EDITOR_NAMESPACES or (qname.namespace == SVG_NS and qname.localname == "metadata"):
+            elem.getparent().remove(elem)
+            continue
+        for attr in list(elem.attrib):
+            if etree.QName(attr).namespace in EDITOR_NAMESPACES:
+                del elem.attrib[attr]
+    etree.cleanup_namespaces(root)
+    return root
+
+
+def compile_template(root: etree._Element) -> int:
+    """
+    Prepare a template for rendering (in place): replace embedded raster images
+    with asset store URLs and strip editor metadata.
+
+    Args:
+        root: Template root element
+
+    Returns:
+        Number of images externalised
+    """
+    count = 0
+    for image in root.iter(f"{{{SVG_NS}}}image"):
+        for attr in HREF_ATTRS:
+            href = image.get(attr)
+            if href and href.startswith("data:"):
+                url = _externalise(href)
+                if url:
+                    image.set(attr, url)
+                    count += 1
+    strip_editor_metadata(root)
+    return count